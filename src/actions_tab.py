@@ -1,13 +1,11 @@
 from PySide6.QtWidgets import QPushButton, QSizePolicy, QVBoxLayout, QWidget
 
-from add_client_dialog import AddClientDialog
-from add_food_dialog import AddFoodDialog
-from delete_client_dialog import DeleteClientDialog
-from delete_food_dialog import DeleteFoodDialog
+# Dialogs are imported when they're opened for the first time, so that they don't slow down
+# startup
 
 
 class ActionsTab(QWidget):
-    """An extra tab that prompts the user to add or delete client/food."""
+    """An extra tab that prompts the user to add or delete client/food, to import them, to generate reports or to restore archived orders."""
 
     def __init__(self):
         super().__init__()
@@ -16,14 +14,22 @@ class ActionsTab(QWidget):
 
         self._add_client = QPushButton("Ajouter un client")
         self._delete_client = QPushButton("Supprimer le client")
+        self._merge_clients = QPushButton("Fusionner des clients")
         self._add_food = QPushButton("Ajouter de la nourriture")
         self._delete_food = QPushButton("Supprimer la nourriture")
+        self._import = QPushButton("Importer un fichier CSV")
+        self._report = QPushButton("Générer un rapport")
+        self._restore = QPushButton("Restaurer des commandes archivées")
 
         layout = QVBoxLayout(self)
         layout.addWidget(self._add_client)
         layout.addWidget(self._delete_client)
+        layout.addWidget(self._merge_clients)
         layout.addWidget(self._add_food)
         layout.addWidget(self._delete_food)
+        layout.addWidget(self._import)
+        layout.addWidget(self._report)
+        layout.addWidget(self._restore)
 
         self.setLayout(layout)
 
@@ -33,35 +39,87 @@ class ActionsTab(QWidget):
         self._delete_client.setSizePolicy(
             QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred
         )
+        self._merge_clients.setSizePolicy(
+            QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred
+        )
         self._add_food.setSizePolicy(
             QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred
         )
         self._delete_food.setSizePolicy(
             QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred
         )
+        self._import.setSizePolicy(
+            QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred
+        )
+        self._report.setSizePolicy(
+            QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred
+        )
+        self._restore.setSizePolicy(
+            QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred
+        )
         self.update_fonts()
 
         self._add_client.clicked.connect(self.add_client)
         self._delete_client.clicked.connect(self.delete_client)
+        self._merge_clients.clicked.connect(self.merge_clients)
         self._add_food.clicked.connect(self.add_food)
         self._delete_food.clicked.connect(self.delete_food)
+        self._import.clicked.connect(self.import_file)
+        self._report.clicked.connect(self.report)
+        self._restore.clicked.connect(self.restore)
 
     def add_client(self):
+        from add_client_dialog import AddClientDialog
+
         add_dialog = AddClientDialog()
         add_dialog.exec()
 
     def delete_client(self):
-        delete_dialog = DeleteClientDialog(self._profiles)
+        from delete_client_dialog import DeleteClientDialog
+
+        delete_dialog = DeleteClientDialog()
         delete_dialog.exec()
 
+    def merge_clients(self):
+        from merge_clients_dialog import MergeClientsDialog
+
+        merge_dialog = MergeClientsDialog()
+        merge_dialog.exec()
+
     def add_food(self):
+        from add_food_dialog import AddFoodDialog
+
         add_dialog = AddFoodDialog()
         add_dialog.exec()
 
     def delete_food(self):
-        delete_dialog = DeleteFoodDialog(self._profiles)
+        from delete_food_dialog import DeleteFoodDialog
+
+        delete_dialog = DeleteFoodDialog()
         delete_dialog.exec()
 
+    def import_file(self):
+        from import_dialog import ImportDialog
+
+        import_dialog = ImportDialog(self._profiles)
+        import_dialog.exec()
+
+    def report(self):
+        from report_dialog import ReportDialog
+
+        report_dialog = ReportDialog(
+            [profile._profile_name for profile in self._profiles]
+        )
+        report_dialog.exec()
+
+    def restore(self):
+        from restore_dialog import RestoreDialog
+
+        restore_dialog = RestoreDialog(
+            [profile._profile_name for profile in self._profiles]
+        )
+        restore_dialog.exec()
+
     def update_fonts(self):
         font = self._add_client.font()
 
@@ -73,8 +131,12 @@ class ActionsTab(QWidget):
 
         self._add_client.setFont(font)
         self._delete_client.setFont(font)
+        self._merge_clients.setFont(font)
         self._add_food.setFont(font)
         self._delete_food.setFont(font)
+        self._import.setFont(font)
+        self._report.setFont(font)
+        self._restore.setFont(font)
 
     def resizeEvent(self, event):
         self.update_fonts()
@@ -1,16 +1,19 @@
-import asyncio
-
-import aiosqlite as sql
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import (
     QDialog,
     QDialogButtonBox,
     QFormLayout,
+    QLabel,
     QLineEdit,
     QMessageBox,
     QVBoxLayout,
 )
 
+from duplicates import find_similar_clients
 from logger import get_logger
+from operations import add_client, make
+from repository import get_clients
+from tasks import information, run_in_background, run_task, warning
 
 
 class AddClientDialog(QDialog):
@@ -37,58 +40,89 @@ class AddClientDialog(QDialog):
         self._phone_number_line_edit.setMaxLength(128)
         form_layout.addRow("&Numéro de téléphone:", self._phone_number_line_edit)
 
+        # Clients that might be the one being added, under another spelling
+        self._similar_label = QLabel("Aucun client semblable.")
+
+        # Look for them once typing pauses, rather than for every single keystroke
+        self._similar_timer = QTimer(self)
+        self._similar_timer.setSingleShot(True)
+        self._similar_timer.setInterval(200)
+        self._similar_task = None
+
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
 
         layout = QVBoxLayout(self)
         layout.addLayout(form_layout)
+        layout.addWidget(self._similar_label)
         layout.addWidget(button_box)
 
         height = layout.totalMinimumSize().height()
         self.setFixedHeight(height)
         self.setFixedWidth(512)
 
+        for line_edit in (
+            self._first_name_line_edit,
+            self._last_name_line_edit,
+            self._address_line_edit,
+            self._phone_number_line_edit,
+        ):
+            line_edit.textChanged.connect(self._similar_timer.start)
+        self._similar_timer.timeout.connect(self.find_similar)
+
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
 
+    def find_similar(self):
+        """Look for clients similar to the one being typed, dropping a search that's still running."""
+        if self._similar_task is not None:
+            self._similar_task.cancel()
+        self._similar_task = run_in_background(self.show_similar())
+
+    async def show_similar(self):
+        """Show clients similar to the one being typed."""
+        client = (
+            self._first_name_line_edit.text().strip(),
+            self._last_name_line_edit.text().strip(),
+            self._address_line_edit.text().strip(),
+            self._phone_number_line_edit.text().strip(),
+        )
+        similar = await find_similar_clients(client)
+        if not similar:
+            self._similar_label.setText("Aucun client semblable.")
+            self._similar_label.setToolTip("")
+            return
+
+        clients = [
+            f"{first_name} {last_name}, {address}, {phone_number}"
+            for (_, (_, first_name, last_name, address, phone_number)) in similar
+        ]
+        text = f"Client semblable: {clients[0]}"
+        if len(clients) > 1:
+            text += f" (+{len(clients) - 1})"
+        self._similar_label.setText(text)
+        self._similar_label.setToolTip("\n".join(clients))
+
     async def add_client_to_database(self, logger, data):
         """Add client to the database."""
         (first_name, last_name, address, phone_number) = data
 
-        async with sql.connect("data.db") as db:
-            # Check if a client with the exact first and last name already exists in the database
-            operation = """
-                        SELECT
-                            first_name, last_name
-                        FROM
-                            clients
-                        WHERE
-                            first_name = (?)
-                            AND last_name = (?);"""
-
-            # Try to find client with the same first and last name
-            async with db.execute(operation, (first_name, last_name)) as cursor:
-                async for row in cursor:
-                    # When found, don't do anything
-                    QMessageBox.warning(
-                        self,
-                        "Une erreur s'est produite!",
-                        f"Le client avec le prénom ({first_name}) et le nom ({last_name}) donné existe déjà dans la base de données.",
-                        QMessageBox.Ok,
-                    )
-                    logger.warn(
-                        f"A client with the given first ({first_name}) and last name ({last_name}) already exists in the database."
-                    )
-                    return
-
-            operation = """
-                        INSERT INTO clients (
-                            first_name, last_name, address, phone_number
-                        )
-                        VALUES
-                            (?, ?, ?, ?);"""
-            await db.execute(operation, data)
-            await db.commit()
-        QMessageBox.information(
+        client_id = await make(add_client, data)
+        if client_id is not None:
+            get_clients().put((client_id, *data))
+
+        if client_id is None:
+            # When found, don't do anything
+            await warning(
+                self,
+                "Une erreur s'est produite!",
+                f"Le client avec le prénom ({first_name}) et le nom ({last_name}) donné existe déjà dans la base de données.",
+            )
+            logger.warn(
+                f"A client with the given first ({first_name}) and last name ({last_name}) already exists in the database."
+            )
+            return
+
+        await information(
             self,
             "Succès!",
             f"Le client ({first_name} {last_name}, {address}, {phone_number}) a été ajouté à la base de données.",
@@ -118,4 +152,4 @@ class AddClientDialog(QDialog):
             logger.warn("One or more fields are empty; please fill them.")
             return
 
-        asyncio.run(self.add_client_to_database(logger, user_data), debug=False)
+        run_task(self.add_client_to_database(logger, user_data), busy_widget=self)
@@ -1,6 +1,3 @@
-import asyncio
-
-import aiosqlite as sql
 from PySide6.QtWidgets import (
     QColorDialog,
     QDialog,
@@ -14,6 +11,9 @@ from PySide6.QtWidgets import (
 )
 
 from logger import get_logger
+from operations import add_food, make
+from repository import get_food
+from tasks import information, run_task, warning
 
 
 class AddFoodDialog(QDialog):
@@ -65,55 +65,23 @@ class AddFoodDialog(QDialog):
         """Add food to the database."""
         (food_name, color) = data
 
-        async with sql.connect("data.db") as db:
-            # Check if food with the exact name already exists in the database
-            operation = """
-                        SELECT
-                            food_name
-                        FROM
-                            food
-                        WHERE
-                            food_name = (?);"""
-
-            # Try to find food with the same name
-            async with db.execute(operation, (food_name,)) as cursor:
-                async for row in cursor:
-                    # When found, don't do anything
-                    QMessageBox.warning(
-                        self,
-                        "Une erreur s'est produite!",
-                        f"La nourriture portant le nom donné ({food_name}) existe déjà dans la base de données.",
-                        QMessageBox.Ok,
-                    )
-                    logger.warn(
-                        f"The food with given name ({food_name}) already exists in the database."
-                    )
-                    return
-
-            if color is None:
-                (operation, values) = (
-                    """
-                    INSERT INTO food (food_name)
-                    VALUES
-                        (?);""",
-                    (food_name,),
-                )
-            else:
-                # color[0] = red; color[1] = green; color[2] = blue
-                (operation, values) = (
-                    """
-                    INSERT INTO food (
-                        food_name, red_color, green_color,
-                        blue_color
-                    ) 
-                    VALUES
-                        (?, ?, ?, ?);""",
-                    (food_name, color[0], color[1], color[2]),
-                )
-
-            await db.execute(operation, values)
-            await db.commit()
-        QMessageBox.information(
+        food_id = await make(add_food, food_name, color)
+        if food_id is not None:
+            get_food().put((food_id, food_name, *(color or (None, None, None))))
+
+        if food_id is None:
+            # When found, don't do anything
+            await warning(
+                self,
+                "Une erreur s'est produite!",
+                f"La nourriture portant le nom donné ({food_name}) existe déjà dans la base de données.",
+            )
+            logger.warn(
+                f"The food with given name ({food_name}) already exists in the database."
+            )
+            return
+
+        await information(
             self,
             "Succès!",
             f"La nourriture ({food_name}) a été ajoutée à la base de données.",
@@ -146,7 +114,7 @@ class AddFoodDialog(QDialog):
             return
 
         user_data = (food_name, self.get_color())
-        asyncio.run(self.add_food_to_database(logger, user_data), debug=False)
+        run_task(self.add_food_to_database(logger, user_data), busy_widget=self)
 
 
 class ChooseColorDialog(QColorDialog):
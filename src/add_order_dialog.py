@@ -1,6 +1,3 @@
-import asyncio
-
-import aiosqlite as sql
 from PySide6.QtCore import QDate, Qt
 from PySide6.QtWidgets import (
     QDateEdit,
@@ -14,9 +11,12 @@ from PySide6.QtWidgets import (
     QVBoxLayout,
 )
 
+from changes import get_changes
 from logger import get_logger
+from operations import add_order, make
 from select_client_dialog import SelectClientDialog
 from select_food_dialog import SelectFoodDialog
+from tasks import information, run_task
 
 
 class AddOrderDialog(QDialog):
@@ -100,48 +100,8 @@ class AddOrderDialog(QDialog):
         client = self.client_label.text().split(": ")[1]
         food = self.food_label.text().split(": ")[1]
 
-        async with sql.connect("data.db") as db:
-            operation = f"""SELECT
-                                id
-                            FROM
-                                {self._profile_name}
-                            WHERE
-                                client_id = (?)
-                                AND food_id = (?)
-                                AND date = (?);"""
-            # Try to find existing order
-            async with db.execute(operation, (client_id, food_id, date)) as cursor:
-                async for row in cursor:
-                    # When found, update the food quantity
-                    operation = f"""UPDATE
-                                        {self._profile_name}
-                                    SET
-                                        food_quantity = food_quantity + {food_quantity}
-                                    WHERE
-                                        id = (?);"""
-                    await db.execute(operation, (row[0],))
-                    await db.commit()
-
-                    QMessageBox.information(
-                        self,
-                        "Succès!",
-                        f"La commande de {client} pour {food_quantity}x {food} à {date} a été ajoutée au profil ({self._profile_name}).",
-                    )
-                    logger.info(
-                        f"Added values ({client_id}, {food_id}, {food_quantity}, {date}) into the '{self._profile_name}' table."
-                    )
-                    self.close()
-                    return
-
-            operation = f"""INSERT INTO {self._profile_name} (
-                                client_id, food_id, food_quantity,
-                                date
-                            )
-                            VALUES
-                                (?, ?, ?, ?);"""
-            await db.execute(operation, data)
-            await db.commit()
-        QMessageBox.information(
+        order_id = await make(add_order, self._profile_name, data)
+        await information(
             self,
             "Succès!",
             f"La commande de {client} pour {food_quantity}x {food} à {date} a été ajoutée au profil ({self._profile_name}).",
@@ -150,6 +110,7 @@ class AddOrderDialog(QDialog):
             f"Added values ({client_id}, {food_id}, {food_quantity}, {date}) into the '{self._profile_name}' table."
         )
         self.close()
+        get_changes().changed.emit(self._profile_name, [order_id])
 
     def accept(self):
         logger = get_logger("add_order_dialog.py")
@@ -170,5 +131,4 @@ class AddOrderDialog(QDialog):
             self.date_edit.date().toString(Qt.DateFormat.ISODate),
         )
 
-        asyncio.run(self.add_order_to_database(logger, user_data))
-        self._parent.update_table()
+        run_task(self.add_order_to_database(logger, user_data), busy_widget=self)
@@ -1,6 +1,3 @@
-import asyncio
-
-import aiosqlite as sql
 from PySide6.QtWidgets import (
     QDialog,
     QDialogButtonBox,
@@ -11,6 +8,8 @@ from PySide6.QtWidgets import (
 )
 
 from logger import get_logger
+from operations import add_profile, make, scrub
+from tasks import information, run_task
 
 
 class AddProfileDialog(QDialog):
@@ -40,30 +39,10 @@ class AddProfileDialog(QDialog):
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
 
-    def scrub(self, text):
-        """Return a string with only alphanumerics, stripped of all punctuation (except underscores) and whitespace."""
-        sanitized_text = ""
-        for ch in text:
-            if not ch.isalnum() and ch != "_":
-                raise ValueError
-            sanitized_text += ch
-        return sanitized_text
-
     async def add_profile_to_database(self, logger, profile_name):
         """Add new profile to the database."""
-        async with sql.connect("data.db") as db:
-            operation = f"""
-                        CREATE TABLE IF NOT EXISTS {profile_name} (
-                            id INTEGER PRIMARY KEY,
-                            client_id INTEGER NOT NULL,
-                            food_id INTEGER NOT NULL,
-                            food_quantity INTEGER NOT NULL,
-                            date INTEGER NOT NULL,
-                            FOREIGN KEY (client_id) REFERENCES clients(id),
-                            FOREIGN KEY (food_id) REFERENCES food(id)
-                        );"""
-            await db.execute(operation)
-        QMessageBox.information(
+        await make(add_profile, profile_name)
+        await information(
             self,
             "Succès!",
             f"Le profil ({profile_name}) a été ajouté à la base de données.",
@@ -71,6 +50,9 @@ class AddProfileDialog(QDialog):
         logger.info(f"Added '{profile_name}' table to the database.")
         self.close()
 
+        # Add new tab in the main widget
+        self._parent.add_profile_tab(profile_name)
+
     def accept(self):
         logger = get_logger("add_profile_dialog.py")
 
@@ -97,7 +79,7 @@ class AddProfileDialog(QDialog):
             return
 
         try:
-            sanitized_profile_name = self.scrub(profile_name).title()
+            sanitized_profile_name = scrub(profile_name).title()
         except ValueError:
             QMessageBox.warning(
                 self,
@@ -109,10 +91,7 @@ class AddProfileDialog(QDialog):
             )
             return
 
-        asyncio.run(
-            self.add_profile_to_database(logger, sanitized_profile_name), debug=False
+        run_task(
+            self.add_profile_to_database(logger, sanitized_profile_name),
+            busy_widget=self,
         )
-
-        # Add new tab in the main widget and update _profiles variable
-        self._parent.add_profile_tab(sanitized_profile_name)
-        self._parent._profiles = asyncio.run(self._parent.get_profiles(), debug=False)
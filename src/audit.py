@@ -0,0 +1,232 @@
+import asyncio
+import getpass
+import json
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+
+from config import get_config, get_directory
+from database import get_database
+from logger import get_logger
+
+# Every change to the database is recorded in the audit table, in the same transaction as the
+# change itself. Events older than [audit] days are moved into segment files:
+# audit/
+#   audit-2024-01.jsonl.zst
+#   audit-2024-02.jsonl.zst
+#   ...
+
+# Event type: (entity, names of its data)
+EVENTS = {
+    "client_added": ("client", ("first_name", "last_name", "address", "phone_number")),
+    "client_deleted": ("client", ("first_name", "last_name", "address", "phone_number", "orders")),
+    "clients_merged": ("client", ("merged", "orders", "combined")),
+    "food_added": ("food", ("food_name", "red_color", "green_color", "blue_color")),
+    "food_deleted": ("food", ("food_name", "red_color", "green_color", "blue_color", "orders")),
+    "order_added": ("order", ("client_id", "food_id", "food_quantity", "date")),
+    "order_merged": ("order", ("client_id", "food_id", "food_quantity", "date")),
+    "order_deleted": ("order", ("client_id", "food_id", "food_quantity", "date")),
+    "profile_added": ("profile", ()),
+    "profile_deleted": ("profile", ("orders",)),
+    "imported": ("import", ("kind", "path", "imported", "updated")),
+    "orders_archived": ("archive", ("orders", "first_date", "last_date")),
+    "orders_restored": ("archive", ("orders", "start", "end")),
+    "orders_renumbered": ("profile", ("offset",)),
+}
+
+# Columns of an audit event, in the database and in segment files
+AUDIT_COLUMNS = ("id", "time", "event", "entity", "entity_id", "profile", "actor", "data")
+
+_actor = None
+
+
+def get_actor():
+    """Return who makes the changes: the user of the operating system and their station."""
+    global _actor
+    if _actor is None:
+        try:
+            user = getpass.getuser()
+        except (ImportError, KeyError, OSError):
+            user = "unknown"
+        _actor = f"{user}@{socket.gethostname()}"
+    return _actor
+
+
+async def create_audit_table(db):
+    """Create the audit table and its indexes."""
+    operation = """
+                CREATE TABLE IF NOT EXISTS audit (
+                    id INTEGER PRIMARY KEY,
+                    time TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    entity_id INTEGER,
+                    profile TEXT,
+                    actor TEXT NOT NULL,
+                    data TEXT NOT NULL
+                );"""
+    await db.execute(operation)
+
+    # Looking up what happened to something, and sealing old events
+    operation = "CREATE INDEX IF NOT EXISTS audit_entity_idx ON audit(entity, entity_id, time);"
+    await db.execute(operation)
+    operation = "CREATE INDEX IF NOT EXISTS audit_time_idx ON audit(time);"
+    await db.execute(operation)
+
+
+async def record(db, event, entity_id=None, profile=None, **data):
+    """Record an event in the audit table, as part of the transaction that's open on db."""
+    (entity, names) = EVENTS[event]
+    if set(data) != set(names):
+        raise ValueError(f"Event ({event}) has data ({', '.join(names)}), not ({', '.join(data)}).")
+
+    operation = """
+                INSERT INTO audit (time, event, entity, entity_id, profile, actor, data)
+                VALUES
+                    (?, ?, ?, ?, ?, ?, ?);"""
+    values = (
+        datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        event,
+        entity,
+        entity_id,
+        profile,
+        get_actor(),
+        json.dumps(data, ensure_ascii=False),
+    )
+    await db.execute(operation, values)
+
+
+def event_from_row(row):
+    """Return an event (as a dict) from a row of the audit table."""
+    event = dict(zip(AUDIT_COLUMNS, row))
+    event["data"] = json.loads(event["data"])
+    return event
+
+
+async def find_events(entity, entity_id=None, profile=None, start=None, end=None):
+    """Return events of an entity (of every one, unless an id is given) in the audit table."""
+    conditions = ["entity = (?)"]
+    values = [entity]
+    if entity_id is not None:
+        conditions.append("entity_id = (?)")
+        values.append(entity_id)
+    if profile is not None:
+        conditions.append("profile = (?)")
+        values.append(profile)
+    if start is not None:
+        conditions.append("time >= (?)")
+        values.append(start)
+    if end is not None:
+        conditions.append("time < (?)")
+        values.append(end)
+
+    operation = f"""SELECT
+                        {', '.join(AUDIT_COLUMNS)}
+                    FROM
+                        audit
+                    WHERE
+                        {' AND '.join(conditions)}
+                    ORDER BY
+                        time, id;"""
+    async with get_database().reader() as db:
+        async with db.execute(operation, values) as cursor:
+            return [event_from_row(row) async for row in cursor]
+
+
+def segment_path(directory, month):
+    """Return path of the segment file of events from a month (YYYY-MM)."""
+    return os.path.join(directory, f"audit-{month}.jsonl.zst")
+
+
+def append_to_segments(directory, events):
+    """Append events to the segment files of their months, and make sure they're on disk."""
+    import zstandard
+
+    os.makedirs(directory, exist_ok=True)
+
+    months = {}
+    for event in events:
+        months.setdefault(event["time"][:7], []).append(event)
+
+    compressor = zstandard.ZstdCompressor(level=10)
+    for month, month_events in months.items():
+        lines = "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in month_events)
+        # Like archive files, segments are only ever appended to, a frame per batch
+        with open(segment_path(directory, month), "ab") as file:
+            file.write(compressor.compress(lines.encode("utf-8")))
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def read_segments(directory, entity, entity_id=None, profile=None):
+    """Return events of an entity from the segment files."""
+    from retention import read_frames
+
+    if not os.path.isdir(directory):
+        return []
+
+    events = {}
+    for file in sorted(os.listdir(directory)):
+        if not file.endswith(".jsonl.zst"):
+            continue
+        for frame in read_frames(os.path.join(directory, file)):
+            for line in frame.decode("utf-8").splitlines():
+                event = json.loads(line)
+                if event["entity"] != entity:
+                    continue
+                if entity_id is not None and event["entity_id"] != entity_id:
+                    continue
+                if profile is not None and event["profile"] != profile:
+                    continue
+                # A batch whose deletion failed is written again by the next sealing
+                events[event["id"]] = event
+    return sorted(events.values(), key=lambda event: (event["time"], event["id"]))
+
+
+async def seal_batch(days, batch_size, directory):
+    """Move the oldest batch of events older than so many days into segments, return its size."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat(timespec="milliseconds")
+    async with get_database().writer() as db:
+        operation = f"""SELECT
+                            {', '.join(AUDIT_COLUMNS)}
+                        FROM
+                            audit
+                        WHERE
+                            time < (?)
+                        ORDER BY
+                            time
+                        LIMIT
+                            {batch_size};"""
+        async with db.execute(operation, (cutoff,)) as cursor:
+            events = [event_from_row(row) for row in await cursor.fetchall()]
+        if not events:
+            return 0
+
+        # Events are deleted only once they're safely on disk
+        await asyncio.to_thread(append_to_segments, directory, events)
+
+        ids = [event["id"] for event in events]
+        operation = f"DELETE FROM audit WHERE id IN ({', '.join('?' * len(ids))});"
+        await db.execute(operation, ids)
+        await db.commit()
+    return len(events)
+
+
+async def seal_audit():
+    """Move events older than [audit] days from the audit table into segments."""
+    config = get_config()
+    days = config.getint("audit", "days")
+    batch_size = config.getint("audit", "batch_size")
+    directory = get_directory("audit")
+
+    sealed = 0
+    while True:
+        count = await seal_batch(days, batch_size, directory)
+        sealed += count
+        if count < batch_size:
+            break
+        # Let everyone else write between batches
+        await asyncio.sleep(0.1)
+    if sealed:
+        get_logger("audit.py").info(f"Sealed {sealed} audit events into '{directory}'.")
+    return sealed
@@ -0,0 +1,202 @@
+from PySide6.QtCore import QDate, QStringListModel, Qt
+from PySide6.QtGui import QBrush, QColor
+from PySide6.QtWidgets import (
+    QCompleter,
+    QDialog,
+    QDialogButtonBox,
+    QHeaderView,
+    QLineEdit,
+    QMessageBox,
+    QPushButton,
+    QStyledItemDelegate,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+)
+
+from changes import get_changes
+from logger import get_logger
+from operations import add_orders, make
+from repository import get_clients, get_food
+from tasks import information, run_task
+
+CLIENT_COLUMN = 0
+FOOD_COLUMN = 1
+QUANTITY_COLUMN = 2
+DATE_COLUMN = 3
+
+
+class ChoiceDelegate(QStyledItemDelegate):
+    """Edits a cell by typing (part of) one of the choices of a completer."""
+
+    def __init__(self, completer, parent=None):
+        super().__init__(parent)
+        self._completer = completer
+
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        editor.setCompleter(self._completer)
+        return editor
+
+
+class BatchOrderDialog(QDialog):
+    """A dialog to add many orders to a profile at once, a line per order."""
+
+    ROWS = 10
+
+    def __init__(self, parent):
+        super().__init__()
+        self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
+        self._parent = parent
+        self._profile_name = parent._profile_name
+
+        # Label shown in the table: id
+        self._clients = {}
+        self._food = {}
+        self._client_completer = self.make_completer()
+        self._food_completer = self.make_completer()
+
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["Client", "Nourriture", "Quantité", "Date"])
+        self.table.setItemDelegateForColumn(
+            CLIENT_COLUMN, ChoiceDelegate(self._client_completer, self)
+        )
+        self.table.setItemDelegateForColumn(
+            FOOD_COLUMN, ChoiceDelegate(self._food_completer, self)
+        )
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(CLIENT_COLUMN, QHeaderView.Stretch)
+        header.setSectionResizeMode(FOOD_COLUMN, QHeaderView.Stretch)
+
+        _add_rows = QPushButton("Ajouter des lignes")
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+        layout.addWidget(_add_rows)
+        layout.addWidget(button_box)
+        self.setMinimumWidth(768)
+
+        self.add_rows()
+
+        _add_rows.clicked.connect(self.add_rows)
+        self.table.currentCellChanged.connect(self.extend_rows)
+        self.table.itemChanged.connect(self.check_item)
+
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+        run_task(self.load_choices(), busy_widget=self)
+
+    def make_completer(self):
+        """Return a completer that finds choices containing what's been typed."""
+        completer = QCompleter(QStringListModel(self), self)
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        completer.setFilterMode(Qt.MatchContains)
+        return completer
+
+    async def load_choices(self):
+        """Load clients and food that orders can be made of."""
+        for (client_id, first_name, last_name, address, phone_number) in (
+            await get_clients().rows()
+        ):
+            self._clients.setdefault(
+                f"{first_name} {last_name}, {address}, {phone_number}", client_id
+            )
+        for (food_id, food_name, _, _, _) in await get_food().rows():
+            self._food[food_name] = food_id
+        self._client_completer.model().setStringList(list(self._clients))
+        self._food_completer.model().setStringList(list(self._food))
+
+    def add_rows(self):
+        """Add empty lines at the bottom of the table."""
+        start = self.table.rowCount()
+        self.table.setRowCount(start + self.ROWS)
+        for row in range(start, start + self.ROWS):
+            self.table.setItem(row, CLIENT_COLUMN, QTableWidgetItem())
+            self.table.setItem(row, FOOD_COLUMN, QTableWidgetItem())
+            quantity = QTableWidgetItem()
+            # Numbers and dates get a spin box and a date edit as editors
+            quantity.setData(Qt.EditRole, 1)
+            self.table.setItem(row, QUANTITY_COLUMN, quantity)
+            date = QTableWidgetItem()
+            date.setData(Qt.EditRole, QDate.currentDate())
+            self.table.setItem(row, DATE_COLUMN, date)
+
+    def extend_rows(self, row):
+        """Add lines once the last one is reached, so they keep coming as long as typing goes on."""
+        if row == self.table.rowCount() - 1:
+            self.add_rows()
+
+    def check_item(self, item):
+        """Show a client or food that doesn't exist in red."""
+        choices = {CLIENT_COLUMN: self._clients, FOOD_COLUMN: self._food}.get(item.column())
+        if choices is None:
+            return
+        known = not item.text() or item.text() in choices
+        # Setting the foreground changes the item again, so only set it when it's different
+        if known != (item.data(Qt.ForegroundRole) is None):
+            item.setData(Qt.ForegroundRole, None if known else QBrush(QColor(255, 0, 0)))
+
+    def get_orders(self):
+        """Return orders of the filled lines, and numbers of the lines that can't be added."""
+        orders = []
+        invalid = []
+        for row in range(self.table.rowCount()):
+            client = self.table.item(row, CLIENT_COLUMN).text()
+            food = self.table.item(row, FOOD_COLUMN).text()
+            if not client and not food:
+                continue
+            food_quantity = self.table.item(row, QUANTITY_COLUMN).data(Qt.EditRole)
+            date = self.table.item(row, DATE_COLUMN).data(Qt.EditRole)
+            if client not in self._clients or food not in self._food or food_quantity < 1:
+                invalid.append(row + 1)
+                continue
+            orders.append(
+                (
+                    self._clients[client],
+                    self._food[food],
+                    food_quantity,
+                    date.toString(Qt.DateFormat.ISODate),
+                )
+            )
+        return (orders, invalid)
+
+    async def add_orders_to_database(self, logger, orders):
+        """Add orders to the database, all of them or none."""
+        ids = await make(add_orders, self._profile_name, orders)
+        await information(
+            self,
+            "Succès!",
+            f"Les commandes ({len(orders)}) ont été ajoutées au profil ({self._profile_name}).",
+        )
+        logger.info(f"Added {len(orders)} orders into the '{self._profile_name}' table.")
+        self.close()
+        get_changes().changed.emit(self._profile_name, ids)
+
+    def accept(self):
+        logger = get_logger("batch_order_dialog.py")
+
+        (orders, invalid) = self.get_orders()
+        if invalid:
+            QMessageBox.warning(
+                self,
+                "Une erreur s'est produite!",
+                f"Les lignes ({', '.join(map(str, invalid))}) n'ont pas de client/nourriture existant ou de quantité valide; merci de les corriger.",
+            )
+            logger.warn(f"Lines ({', '.join(map(str, invalid))}) of the orders are invalid.")
+            return
+        if not orders:
+            QMessageBox.warning(
+                self,
+                "Une erreur s'est produite!",
+                "Veuillez remplir au moins une ligne pour créer des commandes.",
+            )
+            logger.warn("No line of the orders has been filled; fill one.")
+            return
+
+        run_task(
+            self.add_orders_to_database(logger, orders),
+            busy_widget=self,
+            label=f"Ajout des commandes ({len(orders)})...",
+        )
@@ -0,0 +1,465 @@
+# Runs the hot code paths of the application headless (on Qt's offscreen platform) against a
+# scratch database made by generate_data.py, and compares wall time, query count and peak RSS
+# with a stored baseline. Every scenario runs in a process of its own, on a copy of the
+# database, so that peak RSS is its own and destructive scenarios don't affect the others.
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+BASELINE_PATH = "benchmark_baseline.json"
+# Slowdowns shorter than this (in seconds) are noise, however big they are relatively
+NOISE = 0.005
+
+
+def peak_rss():
+    """Return peak resident memory of this process in bytes."""
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            ctypes.windll.kernel32.GetCurrentProcess(),
+            ctypes.byref(counters),
+            counters.cb,
+        )
+        return counters.PeakWorkingSetSize
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Measurement:
+    """Wall time and number of queries of the measured part of a scenario."""
+
+    def __init__(self):
+        self.time = 0.0
+        self.queries = 0
+
+    def count(self, statement):
+        # Steps of triggers and of the search index are counted too, since they cost as much
+        self.queries += 1
+
+    @asynccontextmanager
+    async def __call__(self):
+        """Measure the code run inside of the block (setting up a scenario isn't measured)."""
+        from database import get_database
+
+        database = get_database()
+        await database.trace(self.count)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.time += time.perf_counter() - start
+            await database.trace(None)
+
+
+async def list_profiles():
+    """Return all profiles."""
+    from database import get_database
+
+    database = get_database()
+    async with database.reader() as db:
+        return await database.storage.list_profiles(db)
+
+
+async def biggest_profile():
+    """Return the profile with the most orders."""
+    from database import get_database
+
+    database = get_database()
+    counts = {}
+    async with database.reader() as db:
+        for profile in await database.storage.list_profiles(db):
+            source = database.storage.source(profile)
+            operation = f"SELECT count(*) FROM {source.table} {source.where()};"
+            async with db.execute(operation, source.bind()) as cursor:
+                (counts[profile],) = await cursor.fetchone()
+    return max(counts, key=counts.get)
+
+
+async def get_profiles(measure):
+    """MainWidget.get_profiles()"""
+    from main_widget import MainWidget
+
+    main_widget = MainWidget()
+    async with measure():
+        await main_widget.get_profiles()
+
+
+async def load_profiles(measure):
+    """MainWidget.load_profiles(), which adds a tab for every profile"""
+    from main_widget import MainWidget
+
+    main_widget = MainWidget()
+    async with measure():
+        await main_widget.load_profiles()
+
+
+async def show_tab(measure):
+    """ProfileTab.load() of the last tab, until it shows its first page"""
+    from main_widget import MainWidget
+
+    main_widget = MainWidget()
+    await main_widget.load_profiles()
+    # Let prefetching of the first tabs finish
+    for profile_tab in main_widget.actions_tab._profiles[: main_widget.PREFETCH_DISTANCE]:
+        await profile_tab.load(prefetch=True)
+    async with measure():
+        main_widget.setCurrentIndex(main_widget.count() - 1)
+        await main_widget.currentWidget()._initialize_task
+
+
+async def get_orders(measure):
+    """OrdersModel.get_orders() of the first 20 pages of the biggest profile"""
+    from orders_model import OrdersModel
+
+    model = OrdersModel(await biggest_profile())
+    async with measure():
+        await model.refresh()
+        for _ in range(19):
+            await model.fetch_page()
+
+
+async def sort_orders(measure):
+    """OrdersModel.get_orders() of the first page, sorted by every column"""
+    from PySide6.QtCore import Qt
+
+    from orders_model import COLUMNS, OrdersModel
+
+    model = OrdersModel(await biggest_profile())
+    async with measure():
+        for column in range(len(COLUMNS)):
+            model._sort_column = column
+            model._sort_order = Qt.AscendingOrder
+            await model.refresh()
+
+
+async def search_orders(measure):
+    """OrdersModel.get_found_orders() of a few searches in the biggest profile"""
+    from orders_model import OrdersModel
+
+    model = OrdersModel(await biggest_profile())
+    async with measure():
+        for text in ("hélène", "dupont 1", "rue voltaire", "baguette", "lefèvre 42"):
+            model.set_search(text)
+            model.apply_changes()
+            await model._reload_task
+
+
+async def update_table(measure):
+    """ProfileTab.update_table() of every (loaded) profile"""
+    from main_widget import MainWidget
+
+    main_widget = MainWidget()
+    await main_widget.load_profiles()
+    profile_tabs = main_widget.actions_tab._profiles
+    for profile_tab in profile_tabs:
+        await profile_tab.load()
+    async with measure():
+        for profile_tab in profile_tabs:
+            profile_tab.update_table()
+            profile_tab.model.apply_changes()
+            await profile_tab.model._reload_task
+
+
+async def archive_orders(measure):
+    """RetentionService.archive_batch() of one batch of expired orders of every profile"""
+    from config import get_config
+    from retention import RetentionService
+
+    config = get_config()
+    with tempfile.TemporaryDirectory() as directory:
+        service = RetentionService(
+            config.getint("retention", "days"),
+            config.getint("retention", "batch_size"),
+            directory,
+        )
+        profiles = await list_profiles()
+        async with measure():
+            for profile in profiles:
+                await service.archive_batch(profile)
+
+
+async def delete_client(measure):
+    """DeleteClientDialog.delete_client_from_database() of the first client, with orders"""
+    from database import get_database
+    from delete_client_dialog import DeleteClientDialog
+    from logger import get_logger
+    from tasks import wait_for_tasks
+
+    async with get_database().reader() as db:
+        operation = "SELECT id, first_name, last_name, address, phone_number FROM clients WHERE id = 1;"
+        async with db.execute(operation) as cursor:
+            client = await cursor.fetchone()
+    dialog = DeleteClientDialog()
+    # The dialog fills its table in the background
+    await wait_for_tasks()
+    async with measure():
+        await dialog.delete_client_from_database(get_logger("benchmark.py"), client)
+
+
+async def delete_food(measure):
+    """DeleteFoodDialog.delete_food_from_database() of the first food, with orders"""
+    from database import get_database
+    from delete_food_dialog import DeleteFoodDialog
+    from logger import get_logger
+    from tasks import wait_for_tasks
+
+    async with get_database().reader() as db:
+        operation = "SELECT id, food_name, red_color, green_color, blue_color FROM food WHERE id = 1;"
+        async with db.execute(operation) as cursor:
+            food = await cursor.fetchone()
+    dialog = DeleteFoodDialog()
+    # The dialog fills its table in the background
+    await wait_for_tasks()
+    async with measure():
+        await dialog.delete_food_from_database(get_logger("benchmark.py"), food)
+
+
+async def delete_profile(measure):
+    """Storage.drop_profile() of the biggest profile"""
+    from database import get_database
+
+    profile = await biggest_profile()
+    database = get_database()
+    async with measure():
+        async with database.writer() as db:
+            await database.storage.drop_profile(db, profile)
+            await db.commit()
+
+
+SCENARIOS = {
+    scenario.__name__: scenario
+    for scenario in (
+        get_profiles,
+        load_profiles,
+        show_tab,
+        get_orders,
+        sort_orders,
+        search_orders,
+        update_table,
+        archive_orders,
+        delete_client,
+        delete_food,
+        delete_profile,
+    )
+}
+
+
+def run_scenario(name, path):
+    """Run a scenario in this process and return its measurement."""
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+
+    from PySide6 import QtAsyncio
+    from PySide6.QtWidgets import QApplication, QMessageBox
+
+    import tasks
+    from config import get_config
+    from database import get_database
+
+    get_config().set("database", "path", path)
+
+    async def answer(box):
+        # Nobody is there to close message boxes
+        box.deleteLater()
+        return QMessageBox.Yes
+
+    tasks.show_message_box = answer
+
+    async def run():
+        measure = Measurement()
+        try:
+            await SCENARIOS[name](measure)
+        finally:
+            await get_database().close()
+        return measure
+
+    app = QApplication([])
+    measure = QtAsyncio.run(run(), keep_running=False)
+    # Let events posted while the scenario ran (e.g. deferred deletions) be handled
+    app.processEvents()
+    return {"time": measure.time, "queries": measure.queries, "peak_rss": peak_rss()}
+
+
+def describe_database(path):
+    """Return how many profiles, clients, food and orders a database holds."""
+    import asyncio
+
+    from database import Database
+
+    async def count():
+        database = Database(path, readers=1)
+        try:
+            async with database.reader() as db:
+                profiles = await database.storage.list_profiles(db)
+                sizes = {"profiles": len(profiles), "orders": 0}
+                for table in ("clients", "food"):
+                    async with db.execute(f"SELECT count(*) FROM {table};") as cursor:
+                        (sizes[table],) = await cursor.fetchone()
+                for source in await database.storage.sources(db):
+                    async with db.execute(f"SELECT count(*) FROM {source.table};") as cursor:
+                        (orders,) = await cursor.fetchone()
+                    sizes["orders"] += orders
+                return sizes
+        finally:
+            await database.close()
+
+    return asyncio.run(count())
+
+
+def measure_scenario(name, path):
+    """Run a scenario in a process of its own, on a copy of the database."""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+        copy = os.path.join(directory, "benchmark.db")
+        shutil.copyfile(path, copy)
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run", name, copy],
+            capture_output=True,
+            text=True,
+        )
+    if process.returncode != 0:
+        raise RuntimeError(f"Scenario ({name}) failed:\n{process.stderr}")
+    # The measurement is the last line, anything before it was printed by the application
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def measure_startup(path):
+    """Start the application on a copy of the database, return timings of startup phases."""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(path))) as directory:
+        # The application opens data.db in its working directory, unless config.ini says otherwise
+        shutil.copyfile(path, os.path.join(directory, "data.db"))
+        trace_path = os.path.join(directory, "startup.json")
+        main = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+        process = subprocess.run(
+            [sys.executable, main, "--startup-trace", trace_path, "--quit-after-startup"],
+            cwd=directory,
+            env={**os.environ, "QT_QPA_PLATFORM": "offscreen"},
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            raise RuntimeError(f"The application failed to start:\n{process.stderr}")
+        with open(trace_path, encoding="utf-8") as file:
+            return json.load(file)
+
+
+def first_window(trace):
+    """Return the time (in seconds) it took the window to appear."""
+    elapsed = 0.0
+    for phase, milliseconds in trace["phases"].items():
+        elapsed += milliseconds
+        if phase == "first paint":
+            break
+    return elapsed / 1000
+
+
+def compare(results, baseline, tolerance):
+    """Print results next to the baseline, return names of scenarios that got slower."""
+    regressions = []
+    print(
+        f"{'scenario':<16}{'time':>10}{'baseline':>10}{'change':>9}"
+        f"{'queries':>9}{'baseline':>10}{'peak RSS':>11}"
+    )
+    for name, result in results.items():
+        line = f"{name:<16}{result['time'] * 1000:>8.1f}ms"
+        base = baseline.get(name)
+        if base is None:
+            line += f"{'-':>10}{'-':>9}{result['queries']:>9}{'-':>10}"
+        else:
+            change = result["time"] / base["time"] - 1 if base["time"] else 0.0
+            line += f"{base['time'] * 1000:>8.1f}ms{change:>+9.0%}{result['queries']:>9}{base['queries']:>10}"
+            # More queries is a regression, whatever the time says
+            slower = change > tolerance and result["time"] - base["time"] > NOISE
+            if slower or result["queries"] > base["queries"]:
+                regressions.append(name)
+        line += f"{result['peak_rss'] / 2**20:>9.0f}MB"
+        print(f"{line}  SLOWER" if name in regressions else line)
+    return regressions
+
+
+if __name__ == "__main__":
+    """Benchmark the hot code paths against a scratch database."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the application headless.")
+    parser.add_argument("path", nargs="?", default="scratch.db", help="made by generate_data.py")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="run only these")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="save results as the new baseline")
+    parser.add_argument("--repeat", type=int, default=3, help="keep the fastest of so many runs")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown (0.2 is 20%%)")
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="only time startup phases (tests/test_startup.py keeps them within a budget)",
+    )
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_scenario(args.run, args.path)))
+        raise SystemExit(0)
+
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} doesn't exist, generate it with generate_data.py first.")
+
+    if args.startup:
+        traces = [measure_startup(args.path) for _ in range(args.repeat)]
+        trace = min(traces, key=first_window)
+        for phase, milliseconds in trace["phases"].items():
+            print(f"{phase:<16}{milliseconds:>8.1f}ms")
+        print(f"The window appeared after {first_window(trace):.3f}s.")
+        raise SystemExit(0)
+
+    data = describe_database(args.path)
+    print(", ".join(f"{count} {name}" for name, count in data.items()))
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        runs = [measure_scenario(name, args.path) for _ in range(args.repeat)]
+        results[name] = min(runs, key=lambda result: result["time"])
+
+    baseline = {"data": data, "results": {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline["data"] != data:
+            print(f"The baseline was measured on different data ({baseline['data']}).")
+
+    regressions = compare(results, baseline["results"], args.tolerance)
+
+    if args.save:
+        baseline = {"data": data, "results": {**baseline["results"], **results}}
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=4)
+        print(f"Saved the baseline into {args.baseline}.")
+    elif regressions:
+        print(f"Slower than the baseline: {', '.join(regressions)}.")
+        raise SystemExit(1)
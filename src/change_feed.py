@@ -0,0 +1,101 @@
+import asyncio
+import http.client
+import sqlite3
+
+from changes import get_changes
+from config import get_config
+from database import get_database
+from logger import get_logger
+from repository import get_clients, get_food
+
+# Stations sharing the database of a server (see server.py) only hear about their own changes.
+# Every change is recorded in the audit journal (see audit.py) in the same transaction as the
+# change itself, so the id of its last event is the sequence of changes of the database:
+# stations poll it, and pass events that came after the last one they've seen on to the views,
+# as if the changes had been made by the station itself.
+
+# Most events read by one poll, when more have come in everything is reloaded instead
+MAX_EVENTS = 1000
+
+
+async def follow_changes(main_widget):
+    """Poll the audit journal of the database for changes made at other stations, forever."""
+    logger = get_logger("change_feed.py")
+    interval = get_config().getfloat("database", "poll_interval")
+    database = get_database()
+    # The last event also comes along, so that a journal that went back (once every event has
+    # been sealed, ids start over) is noticed
+    operation = """SELECT
+                       id, event, entity_id, profile
+                   FROM
+                       audit
+                   WHERE
+                       id > (?)
+                       OR id = (SELECT max(id) FROM audit)
+                   ORDER BY
+                       id
+                   LIMIT
+                       (?);"""
+
+    # Changes made before the station started are shown already
+    sequence = None
+    while sequence is None:
+        try:
+            async with database.reader() as db:
+                async with db.execute("SELECT coalesce(max(id), 0) FROM audit;") as cursor:
+                    (sequence,) = await cursor.fetchone()
+        except (OSError, http.client.HTTPException, sqlite3.Error) as error:
+            logger.warning(f"Couldn't read changes from the server ({error}).")
+            await asyncio.sleep(interval)
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with database.reader() as db:
+                async with db.execute(operation, (sequence, MAX_EVENTS)) as cursor:
+                    events = await cursor.fetchall()
+        except (OSError, http.client.HTTPException, sqlite3.Error) as error:
+            # The server might only be restarting, try again with the next poll
+            logger.warning(f"Couldn't read changes from the server ({error}).")
+            continue
+
+        last = events[-1][0] if events else 0
+        if last < sequence or len(events) == MAX_EVENTS:
+            logger.info("Changes made elsewhere can't be told one by one, reloading everything.")
+            await reload_everything(main_widget)
+        else:
+            await apply_events(main_widget, [event for event in events if event[0] > sequence])
+        sequence = last
+
+
+async def apply_events(main_widget, events):
+    """Pass changes (as events of the audit journal) on to the repositories and the views."""
+    changes = get_changes()
+    repositories = {"client": get_clients(), "food": get_food()}
+    for _, event, entity_id, profile in events:
+        if event in ("order_added", "order_merged"):
+            changes.changed.emit(profile, [entity_id])
+        elif event == "order_deleted":
+            changes.removed.emit(profile, [entity_id])
+        elif event in ("client_added", "food_added"):
+            await repositories[event.split("_")[0]].reload_row(entity_id)
+        elif event in ("client_deleted", "food_deleted"):
+            # Views drop orders of the client or the food along with it
+            repositories[event.split("_")[0]].remove(entity_id)
+        elif event in ("profile_added", "profile_deleted"):
+            await main_widget.update_profiles()
+        elif event in ("orders_archived", "orders_restored", "orders_renumbered"):
+            changes.reset.emit(profile)
+        else:
+            # Merges and imports change clients, food and orders of many profiles at once
+            get_clients().invalidate()
+            get_food().invalidate()
+            changes.reset.emit(None)
+
+
+async def reload_everything(main_widget):
+    """Forget clients and food, and reload profiles and their orders."""
+    get_clients().invalidate()
+    get_food().invalidate()
+    await main_widget.update_profiles()
+    get_changes().reset.emit(None)
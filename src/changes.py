@@ -0,0 +1,24 @@
+from PySide6.QtCore import QObject, Signal
+
+_changes = None
+
+
+class OrderChanges(QObject):
+    """Tells the views of orders what has changed, once it's been committed to the database.
+
+    Changes to clients and food come from their repositories, see repository.py.
+    """
+
+    # Orders (a list of ids) of a profile have been added or changed, or removed
+    changed = Signal(str, object)
+    removed = Signal(str, object)
+    # Too many orders of a profile (of every profile, if it's None) have changed to tell which
+    reset = Signal(object)
+
+
+def get_changes():
+    """Return the changes to orders."""
+    global _changes
+    if _changes is None:
+        _changes = OrderChanges()
+    return _changes
@@ -0,0 +1,125 @@
+from database import get_database
+from duplicates import phone_digits
+from search_index import PHONE_DIGITS
+
+# Clients are found by the beginning of their first name, last name or phone number, with range
+# queries ("last_name >= 'dup' AND last_name < 'duq'") that the indexes of clients answer without
+# reading the whole table. Every index gets a query of its own, which reads clients in the order
+# of the index, and pages of all of them are merged; the next page starts after the last client
+# seen (its name and id), rather than skipping the clients that came before. Names are indexed
+# regardless of case (of ASCII letters), phone numbers with digits only, so "0123" finds
+# "01 23 45 67 89".
+
+FIRST_NAME = "first_name COLLATE NOCASE"
+LAST_NAME = "last_name COLLATE NOCASE"
+PHONE = PHONE_DIGITS.format(phone="phone_number")
+
+
+async def create_prefix_indexes(db):
+    """(Re)create the indexes of clients on names and phone number, the way they're searched."""
+    await db.execute("DROP INDEX IF EXISTS first_name_idx;")
+    await db.execute(f"CREATE INDEX first_name_idx ON clients({FIRST_NAME});")
+    await db.execute("DROP INDEX IF EXISTS last_name_idx;")
+    await db.execute(f"CREATE INDEX last_name_idx ON clients({LAST_NAME});")
+    await db.execute("DROP INDEX IF EXISTS phone_number_idx;")
+    await db.execute(f"CREATE INDEX phone_number_idx ON clients({PHONE});")
+
+
+def fold(text):
+    """Return the text the way NOCASE compares it, that is with ASCII letters lowered."""
+    # NOCASE only ignores the case of ASCII letters, so only those are lowered
+    return "".join(letter.lower() if letter.isascii() else letter for letter in text)
+
+
+def prefix_range(prefix):
+    """Return the range (start and end) of values starting with the prefix."""
+    # The end of the range has to be lowered as well, or "Z" would end at "[", which comes
+    # before "z"
+    prefix = fold(prefix)
+    return (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def search_queries(text):
+    """Return range queries of clients matching the text, one per index that answers it.
+
+    A query is the indexed expression, its range (start and end, if any), and a condition (along
+    with its values) that the clients in the range have to meet as well. A text made of digits
+    (and the characters phone numbers are written with) is the beginning of a phone number,
+    otherwise every word begins the first or the last name.
+    """
+    digits = phone_digits(text.strip())
+    if digits.isdigit():
+        return [(PHONE, prefix_range(digits), "true", [])]
+
+    words = text.split()
+    if not words:
+        return [(LAST_NAME, ("", None), "true", [])]
+
+    # The first word finds clients through the indexes, the other ones only filter them
+    conditions = []
+    values = []
+    for word in words[1:]:
+        (start, end) = prefix_range(word)
+        conditions.append(
+            f"""({FIRST_NAME} >= (?) AND {FIRST_NAME} < (?)
+                OR {LAST_NAME} >= (?) AND {LAST_NAME} < (?))"""
+        )
+        values += [start, end, start, end]
+    condition = " AND ".join(conditions) if conditions else "true"
+    (start, end) = prefix_range(words[0])
+    # A client whose both names begin with the word is found by the last name only
+    return [
+        (LAST_NAME, (start, end), condition, values),
+        (
+            FIRST_NAME,
+            (start, end),
+            f"NOT ({LAST_NAME} >= (?) AND {LAST_NAME} < (?)) AND {condition}",
+            [start, end, *values],
+        ),
+    ]
+
+
+async def search_range(db, expression, start, end, condition, values, after, limit):
+    """Return a page of clients in a range of an indexed expression, along with their keys."""
+    conditions = [f"{expression} >= (?)", condition]
+    values = [start, *values]
+    if end is not None:
+        conditions.append(f"{expression} < (?)")
+        values.append(end)
+    if after is not None:
+        conditions.append(f"({expression}, id) > (?, ?)")
+        values += after
+    # Clients come in the order of the index, so neither the table nor a sort is needed
+    operation = f"""SELECT
+                        {expression}, id, first_name, last_name, address, phone_number
+                    FROM
+                        clients
+                    WHERE
+                        {' AND '.join(conditions)}
+                    ORDER BY
+                        {expression}, id
+                    LIMIT
+                        {limit};"""
+    async with db.execute(operation, values) as cursor:
+        return [((fold(key), id), (id, *client)) async for (key, id, *client) in cursor]
+
+
+async def search_clients(text, after=None, limit=100):
+    """Return a page of clients (id, first name, last name, address, phone number) matching the text.
+
+    Clients are sorted by the name (or phone number) that matched; a page starts after the given
+    key, and the key of its last client (or None, if it's empty) is returned along with it.
+    """
+    found = []
+    async with get_database().reader() as db:
+        for expression, (start, end), condition, values in search_queries(text):
+            # The range starts after the last client that was seen, rather than at the prefix
+            if after is not None:
+                start = max(start, after[0])
+            found += await search_range(
+                db, expression, start, end, condition, values, after, limit
+            )
+
+    # Every query found a page of its own, the first clients of all of them make the page
+    found = sorted(found, key=lambda client: client[0])[:limit]
+    return ([client for (_, client) in found], found[-1][0] if found else None)
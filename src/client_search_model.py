@@ -0,0 +1,100 @@
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+from client_search import search_clients
+from repository import get_clients
+from tasks import run_in_background, run_task
+
+
+class ClientSearchModel(QAbstractTableModel):
+    """A table model showing clients matching a search, loaded page by page while the view scrolls."""
+
+    PAGE_SIZE = 100
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._headers = ["Prénom", "Nom de famille", "Addresse", "Numéro de téléphone"]
+        self._clients = []
+        # Key of the last client shown, where the next page starts
+        self._after = None
+        self._search = ""
+        self._exhausted = True
+        self._reload_task = None
+        self._fetch_task = None
+
+        # Which page a changed client belongs to isn't known, so the search is run again
+        clients = get_clients()
+        clients.added.connect(lambda row: self.reload())
+        clients.removed.connect(lambda id: self.reload())
+        clients.reset.connect(self.reload)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._clients)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        # The id comes first in a row, but isn't shown
+        if role == Qt.DisplayRole:
+            return self._clients[index.row()][index.column() + 1]
+        return None
+
+    def row(self, row):
+        """Return the client shown in the given row."""
+        return self._clients[row]
+
+    def set_search(self, text):
+        """Show only clients matching the searched text (or all of them, if it's empty)."""
+        text = " ".join(text.split())
+        if text == self._search:
+            return
+        self._search = text
+        self.reload()
+
+    async def refresh(self):
+        """Reload the model from the first page."""
+        if self._fetch_task is not None:
+            self._fetch_task.cancel()
+
+        (clients, after) = await search_clients(self._search, limit=self.PAGE_SIZE)
+        self.beginResetModel()
+        self._clients = clients
+        self._after = after
+        self._exhausted = len(clients) < self.PAGE_SIZE
+        self.endResetModel()
+
+    def reload(self):
+        """Run the search again in the background, dropping one that's still running."""
+        if self._reload_task is not None:
+            self._reload_task.cancel()
+        self._reload_task = run_in_background(self.refresh())
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        if self._fetch_task is not None and not self._fetch_task.done():
+            return
+        self._fetch_task = run_task(self.fetch_page())
+
+    async def fetch_page(self):
+        """Append the next page of clients."""
+        (clients, after) = await search_clients(
+            self._search, after=self._after, limit=self.PAGE_SIZE
+        )
+        self._exhausted = len(clients) < self.PAGE_SIZE
+        if clients:
+            start = len(self._clients)
+            self.beginInsertRows(QModelIndex(), start, start + len(clients) - 1)
+            self._clients.extend(clients)
+            self._after = after
+            self.endInsertRows()
@@ -0,0 +1,70 @@
+import configparser
+import os
+
+CONFIG_PATH = "config.ini"
+
+# Every setting has a default, so config.ini only needs to contain what differs
+DEFAULTS = {
+    "database": {
+        "path": "data.db",
+        "readers": "2",
+        # "tables" keeps orders of every profile in a table of its own, "partitioned" keeps
+        # them all in one table (existing databases are converted on the next start)
+        "storage": "tables",
+        # "safe", "balanced" or "fast", see storage_profiles.py
+        "storage_profile": "balanced",
+        # URL of a server (see server.py) that owns the database, e.g. http://cuisine:8650,
+        # used instead of opening the file at path when stations share the database
+        "server": "",
+        # Seconds between two looks for changes made at other stations to the database of the
+        # server, see change_feed.py
+        "poll_interval": "2",
+    },
+    "server": {
+        # Where "pyfncm serve" listens
+        "host": "127.0.0.1",
+        "port": "8650",
+        # Shared by the server and its stations, which aren't answered without it; the server
+        # doesn't start without one
+        "token": "",
+    },
+    "retention": {
+        # Orders older than this are moved from the database into the archive
+        "days": "365",
+        "batch_size": "500",
+        # Relative to the directory of the database, like that of [audit]
+        "directory": "archive",
+        # Seconds to wait after startup, so that archiving doesn't slow it down
+        "delay": "30",
+    },
+    "audit": {
+        # Audit events older than this are moved from the database into segment files
+        "days": "365",
+        "batch_size": "500",
+        "directory": "audit",
+    },
+    # Pragmas that override those of the storage profile
+    "pragmas": {},
+}
+
+_config = None
+
+
+def get_config():
+    """Return the application configuration (read once from config.ini)."""
+    global _config
+    if _config is None:
+        _config = configparser.ConfigParser()
+        _config.read_dict(DEFAULTS)
+        # Missing file is fine, the defaults are used instead
+        _config.read(CONFIG_PATH, encoding="utf-8")
+    return _config
+
+
+def get_directory(section):
+    """Return the directory of a section (e.g. "retention"), relative to that of the database."""
+    config = get_config()
+    # os.path.join() keeps absolute directories as they are
+    return os.path.join(
+        os.path.dirname(config.get("database", "path")), config.get(section, "directory")
+    )
@@ -0,0 +1,131 @@
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+
+import aiosqlite as sql
+
+from config import get_config
+from storage import detect_storage
+from storage_profiles import get_pragmas
+
+
+class Database:
+    """A small pool of persistent connections: one writer and a few readers."""
+
+    # A RemoteDatabase (see remote.py) is served by another process instead
+    remote = False
+
+    def __init__(self, path, readers=2, pragmas=None):
+        self.path = path
+        self.pragmas = pragmas or {}
+        self._reader_count = max(readers, 1)
+        self._writer = None
+        self._readers = []
+        self._next_reader = None
+        self._write_lock = asyncio.Lock()
+        # How orders are laid out in the database, known once it's open
+        self.storage = None
+
+    async def _connect(self, read_only):
+        """Open a new connection to the database and apply the pragmas."""
+        connection = sql.connect(self.path)
+        # Don't let a connection that wasn't closed keep the application alive on exit
+        connection.daemon = True
+        await connection
+
+        for pragma, value in self.pragmas.items():
+            await connection.execute(f"PRAGMA {pragma} = {value};")
+        # Orders of deleted clients, food and profiles are deleted along with them
+        await connection.execute("PRAGMA foreign_keys = ON;")
+        if read_only:
+            await connection.execute("PRAGMA query_only = ON;")
+        return connection
+
+    async def open(self):
+        """Open the connections if they aren't open yet."""
+        if self._writer is not None:
+            return
+
+        async with self._write_lock:
+            # Someone else might have opened them while we were waiting
+            if self._writer is not None:
+                return
+
+            writer = await self._connect(read_only=False)
+            self._readers = [
+                await self._connect(read_only=True) for _ in range(self._reader_count)
+            ]
+            self._next_reader = itertools.cycle(self._readers)
+            self.storage = await detect_storage(writer)
+            self._writer = writer
+
+    async def close(self):
+        """Close all connections."""
+        if self._writer is None:
+            return
+
+        for connection in (self._writer, *self._readers):
+            await connection.close()
+        self._writer = None
+        self._readers = []
+        self._next_reader = None
+
+    async def trace(self, callback):
+        """Call back with every SQL statement run on any connection (or stop, given None)."""
+        await self.open()
+        for connection in (self._writer, *self._readers):
+            await connection.set_trace_callback(callback)
+
+    async def vacuum(self):
+        """Rebuild the database file without the space left by deleted rows, and refresh statistics of the indexes."""
+        async with self.writer() as db:
+            # VACUUM can't run inside a transaction, so one mustn't be left open
+            await db.commit()
+            await db.execute("VACUUM;")
+            await db.execute("PRAGMA optimize;")
+
+    @asynccontextmanager
+    async def reader(self):
+        """Yield a read-only connection."""
+        await self.open()
+        # aiosqlite queues every call on the connection's own thread, so readers can be shared
+        yield next(self._next_reader)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Yield the only connection that is allowed to write, one caller at a time."""
+        await self.open()
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                # Don't leave a half-done transaction behind for the next caller
+                await self._writer.rollback()
+                raise
+
+
+_database = None
+
+
+def get_database():
+    """Return the shared database of the application."""
+    global _database
+    if _database is None:
+        config = get_config()
+        if config.get("database", "server"):
+            # Only stations sharing a server make requests to it
+            from remote import RemoteDatabase
+
+            _database = RemoteDatabase(
+                config.get("database", "server"),
+                config.get("server", "token"),
+                readers=config.getint("database", "readers"),
+            )
+        else:
+            _database = Database(
+                config.get("database", "path"),
+                readers=config.getint("database", "readers"),
+                pragmas=get_pragmas(config),
+            )
+    return _database
+
@@ -1,70 +1,64 @@
-import asyncio
-
-import aiosqlite as sql
 from PySide6.QtWidgets import (
     QAbstractItemView,
     QDialog,
     QDialogButtonBox,
     QHeaderView,
     QMessageBox,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
 )
 
+from database import get_database
 from logger import get_logger
+from operations import delete_client, make
+from repository import ClientsModel, get_clients
+from storage import count_orders
+from tasks import information, question, run_task
 
 
 class DeleteClientDialog(QDialog):
     """A dialog to delete a client from the database."""
 
-    def __init__(self, profiles):
+    def __init__(self):
         super().__init__()
         self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
-        # List that will contain instances of profile tabs
-        self._profiles = profiles
 
-        table = QTableWidget()
-        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.model = ClientsModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
 
-        self._clients = asyncio.run(self.get_clients())
         self.__client_idx = None
+        self.table.clicked.connect(lambda index: self.set_client_idx(index.row()))
+        # Rows move when clients are deleted, so the chosen one has to be chosen again
+        self.model.rowsRemoved.connect(lambda: self.set_client_idx(None))
+        self.model.modelReset.connect(lambda: self.set_client_idx(None))
 
-        # Populate a table if there are any clients
-        if self._clients:
-            table.setColumnCount(len(self._clients[0]) - 1)
-            table.setRowCount(len(self._clients))
-            table.setHorizontalHeaderLabels(
-                ["Prénom", "Nom de famille", "Addresse", "Numéro de téléphone"]
-            )
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+        layout.addWidget(button_box)
 
-            for row, (_, first_name, last_name, address, phone_number) in enumerate(
-                self._clients
-            ):
-                table.setItem(row, 0, QTableWidgetItem(first_name))
-                table.setItem(row, 1, QTableWidgetItem(last_name))
-                table.setItem(row, 2, QTableWidgetItem(address))
-                table.setItem(row, 3, QTableWidgetItem(phone_number))
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+        run_task(self.fill_table())
 
-            table.cellClicked.connect(lambda row, _: self.set_client_idx(row))
+    async def fill_table(self):
+        """Fill the table with clients (from memory, once they've been loaded)."""
+        await self.model.load()
 
-            header = table.horizontalHeader()
+        # Size the table if there are any clients
+        if self.model.rowCount():
+            header = self.table.horizontalHeader()
             header.setSectionResizeMode(QHeaderView.ResizeToContents)
             # Add 35, lest part of the last section gets swallowed
             self.setMinimumWidth(header.length() + 35)
 
             header.setSectionResizeMode(2, QHeaderView.Stretch)
 
-        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-
-        layout = QVBoxLayout(self)
-        layout.addWidget(table)
-        layout.addWidget(button_box)
-
-        button_box.accepted.connect(self.accept)
-        button_box.rejected.connect(self.reject)
-
     def set_client_idx(self, row):
         """Set client row index (through clicking table item)."""
         self.__client_idx = row
@@ -73,42 +67,19 @@ class DeleteClientDialog(QDialog):
         """Return chosen client row index (through clicking table item)."""
         return self.__client_idx
 
-    async def get_clients(self):
-        """Return a list containing clients from the database."""
-        clients = []
-        async with sql.connect("data.db") as db:
-            async with db.execute(
-                "SELECT id, first_name, last_name, address, phone_number FROM clients;"
-            ) as cursor:
-                async for row in cursor:
-                    clients.append(row)
-        return clients
-
     async def delete_client_from_database(self, logger, client):
         """Delete client from the database."""
         (client_id, first_name, last_name, address, phone_number) = client
 
-        async with sql.connect("data.db") as db:
-            for profile in self._profiles:
-                # Delete orders from all profiles
-                operation = (
-                    f"DELETE FROM {profile._profile_name} WHERE client_id = (?);"
-                )
-                await db.execute(operation, (client_id,))
-                await db.commit()
-            logger.info(
-                f"Deleted orders from profiles that had client_id = {client_id} from the database."
-            )
-            operation = "DELETE FROM clients WHERE id = (?);"
-            await db.execute(operation, (client_id,))
-            await db.commit()
-        QMessageBox.information(
+        orders = await make(delete_client, client)
+        get_clients().remove(client_id)
+        await information(
             self,
             "Succès!",
-            f"Le client ({first_name} {last_name}, {address}, {phone_number}) a été supprimé de la base de données.",
+            f"Le client ({first_name} {last_name}, {address}, {phone_number}) a été supprimé de la base de données, ainsi que ses commandes ({orders}).",
         )
         logger.info(
-            f"Deleted ({first_name}, {last_name}, {address}, {phone_number}) values from the 'clients' table."
+            f"Deleted ({first_name}, {last_name}, {address}, {phone_number}) values from the 'clients' table, along with their orders ({orders})."
         )
         self.close()
 
@@ -125,19 +96,28 @@ class DeleteClientDialog(QDialog):
             logger.warn("The client for deletion has not been chosen; choose one.")
             return
 
-        (client_id, first_name, last_name, address, phone_number) = self._clients[row]
+        run_task(self.confirm_deletion(logger, self.model.row(row)), busy_widget=self)
+
+    async def confirm_deletion(self, logger, client):
+        """Ask whether to delete a client, telling how many orders would go with them."""
+        (client_id, first_name, last_name, address, phone_number) = client
+
+        database = get_database()
+        async with database.reader() as db:
+            orders = await count_orders(
+                db, database.storage, "client_id = (?)", client_id
+            )
 
-        question = QMessageBox.question(
+        answer = await question(
             self,
             "Es-tu sûr?",
-            f"Êtes-vous sûr de vouloir supprimer le client ({first_name} {last_name}, {address}, {phone_number}) de la base de données?",
-            QMessageBox.Yes | QMessageBox.No,
+            f"Êtes-vous sûr de vouloir supprimer le client ({first_name} {last_name}, {address}, {phone_number}) de la base de données, ainsi que ses commandes ({orders})?",
         )
-        if question == QMessageBox.No:
+        if answer == QMessageBox.No:
             return
 
-        asyncio.run(
-            self.delete_client_from_database(logger, self._clients[row]), debug=False
+        run_task(
+            self.delete_client_from_database(logger, client),
+            busy_widget=self,
+            label=f"Suppression du client ({first_name} {last_name})...",
         )
-        for profile in self._profiles:
-            profile.update_table()
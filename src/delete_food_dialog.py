@@ -1,76 +1,66 @@
-import asyncio
-
-import aiosqlite as sql
-from PySide6.QtGui import QColor
 from PySide6.QtWidgets import (
     QAbstractItemView,
     QDialog,
     QDialogButtonBox,
     QHeaderView,
     QMessageBox,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
 )
 
+from database import get_database
+from food_style import FoodDelegate
 from logger import get_logger
+from operations import delete_food, make
+from repository import FoodModel, get_food
+from storage import count_orders
+from tasks import information, question, run_task
 
 
 class DeleteFoodDialog(QDialog):
     """A dialog to delete a food from the database."""
 
-    def __init__(self, profiles):
+    def __init__(self):
         super().__init__()
         self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
-        # List that will contain instances of profile tabs
-        self._profiles = profiles
 
-        table = QTableWidget()
-        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.model = FoodModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setItemDelegate(FoodDelegate(self.table))
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
 
-        self._food = asyncio.run(self.get_food())
         self.__food_idx = None
-
-        # Populate a table if there is any food
-        if self._food:
-            table.setColumnCount(1)
-            table.setRowCount(len(self._food))
-            table.setHorizontalHeaderLabels(["Nom de la nourriture"])
-
-            for row, (_, food_name, red_color, green_color, blue_color) in enumerate(
-                self._food
-            ):
-                item = QTableWidgetItem(food_name)
-                if None not in (red_color, green_color, blue_color):
-                    item.setBackground(QColor(red_color, green_color, blue_color))
-                    item.setForeground(
-                        QColor(
-                            self.get_foreground_color(
-                                (red_color, green_color, blue_color)
-                            )
-                        )
-                    )
-                table.setItem(row, 0, item)
-
-            table.cellClicked.connect(lambda row, _: self.set_food_idx(row))
-
-            header = table.horizontalHeader()
-            header.setSectionResizeMode(QHeaderView.ResizeToContents)
-            # Add 35, lest part of the section gets swallowed
-            self.setMinimumWidth(header.length() + 35)
-
-            header.setSectionResizeMode(QHeaderView.Stretch)
+        self.table.clicked.connect(lambda index: self.set_food_idx(index.row()))
+        # Rows move when food is deleted, so the chosen one has to be chosen again
+        self.model.rowsRemoved.connect(lambda: self.set_food_idx(None))
+        self.model.modelReset.connect(lambda: self.set_food_idx(None))
 
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
 
         layout = QVBoxLayout(self)
-        layout.addWidget(table)
+        layout.addWidget(self.table)
         layout.addWidget(button_box)
 
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
 
+        run_task(self.fill_table())
+
+    async def fill_table(self):
+        """Fill the table with food (from memory, once it's been loaded)."""
+        await self.model.load()
+
+        # Size the table if there is any food
+        if self.model.rowCount():
+            header = self.table.horizontalHeader()
+            header.setSectionResizeMode(QHeaderView.ResizeToContents)
+            # Add 35, lest part of the section gets swallowed
+            self.setMinimumWidth(header.length() + 35)
+
+            header.setSectionResizeMode(QHeaderView.Stretch)
+
     def set_food_idx(self, row):
         """Set food row index (through clicking table item)."""
         self.__food_idx = row
@@ -79,50 +69,25 @@ class DeleteFoodDialog(QDialog):
         """Return chosen client row index (through clicking table item)."""
         return self.__food_idx
 
-    def get_foreground_color(self, color):
-        """Return black/white color depending on calculated luminance."""
-        (red_color, green_color, blue_color) = color
-        luminance = 0.2126 * red_color + 0.7152 * green_color + 0.0722 * blue_color
-        return QColor(255, 255, 255) if luminance < 140 else QColor(0, 0, 0)
-
-    async def get_food(self):
-        """Return a list containing food from the database."""
-        food = []
-        async with sql.connect("data.db") as db:
-            async with db.execute(
-                "SELECT id, food_name, red_color, green_color, blue_color FROM food;"
-            ) as cursor:
-                async for row in cursor:
-                    food.append(row)
-        return food
-
     async def delete_food_from_database(self, logger, data):
         """Delete food from the database."""
         (food_id, food_name, red_color, green_color, blue_color) = data
 
-        async with sql.connect("data.db") as db:
-            # Delete orders from all profiles
-            for profile in self._profiles:
-                operation = f"DELETE FROM {profile._profile_name} WHERE food_id = (?);"
-                await db.execute(operation, (food_id,))
-                await db.commit()
-            logger.info(
-                f"Deleted orders from profiles that had food_id = {food_id} from the database."
-            )
-            operation = "DELETE FROM food WHERE id = (?);"
-            await db.execute(operation, (food_id,))
-            await db.commit()
-        QMessageBox.information(
+        orders = await make(delete_food, data)
+        get_food().remove(food_id)
+        await information(
             self,
             "Succès!",
-            f"La nourriture ({food_name}) a été supprimée de la base de données.",
+            f"La nourriture ({food_name}) a été supprimée de la base de données, ainsi que ses commandes ({orders}).",
         )
         if None not in (red_color, green_color, blue_color):
             logger.info(
-                f"Deleted ({food_name}, {red_color}, {green_color}, {blue_color}) values from the 'food' table."
+                f"Deleted ({food_name}, {red_color}, {green_color}, {blue_color}) values from the 'food' table, along with its orders ({orders})."
             )
         else:
-            logger.info(f"Deleted ({food_name}) values from the 'food' table.")
+            logger.info(
+                f"Deleted ({food_name}) values from the 'food' table, along with its orders ({orders})."
+            )
         self.close()
 
     def accept(self):
@@ -138,16 +103,26 @@ class DeleteFoodDialog(QDialog):
             logger.warn("The food for deletion has not been chosen; choose one.")
             return
 
-        (_, food_name, _, _, _) = self._food[row]
-        question = QMessageBox.question(
+        run_task(self.confirm_deletion(logger, self.model.row(row)), busy_widget=self)
+
+    async def confirm_deletion(self, logger, food):
+        """Ask whether to delete a food, telling how many orders would go with it."""
+        (food_id, food_name, _, _, _) = food
+
+        database = get_database()
+        async with database.reader() as db:
+            orders = await count_orders(db, database.storage, "food_id = (?)", food_id)
+
+        answer = await question(
             self,
             "Es-tu sûr?",
-            f"Êtes-vous sûr de vouloir supprimer la nourriture ({food_name}) de la base de données?",
-            QMessageBox.Yes | QMessageBox.No,
+            f"Êtes-vous sûr de vouloir supprimer la nourriture ({food_name}) de la base de données, ainsi que ses commandes ({orders})?",
         )
-        if question == QMessageBox.No:
+        if answer == QMessageBox.No:
             return
 
-        asyncio.run(self.delete_food_from_database(logger, self._food[row]))
-        for profile in self._profiles:
-            profile.update_table()
+        run_task(
+            self.delete_food_from_database(logger, food),
+            busy_widget=self,
+            label=f"Suppression de la nourriture ({food_name})...",
+        )
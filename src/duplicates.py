@@ -0,0 +1,216 @@
+import re
+
+from audit import record
+from database import get_database
+from search_index import PHONE_DIGITS
+from storage import merge_same_orders
+
+# Clients are indexed by trigrams of their name, address and phone number (digits only), so that
+# a client typed again a bit differently ("Dupond" for "Dupont") can be found while typing. The
+# index only finds candidates, how similar they are is worked out from their trigrams here.
+
+# Letters that are indexed without their accents. Every letter is another nested replace(),
+# which the parser of SQLite only allows so many of, so these are the letters of French names
+# and the capitals that names start with.
+ACCENTS = {
+    "a": "àâ",
+    "c": "ç",
+    "e": "éèêë",
+    "i": "îï",
+    "o": "ô",
+    "u": "ùû",
+    "ae": "æ",
+    "oe": "œ",
+}
+CAPITALS = {"a": "À", "c": "Ç", "e": "ÉÈ"}
+_plain_letters = str.maketrans(
+    {letter: plain for plain, accented in ACCENTS.items() for letter in accented}
+)
+
+# Clients at least this similar are likely the same client
+THRESHOLD = 0.7
+# How many clients (that share the most trigrams) are compared
+CANDIDATES = 50
+
+
+def normalized(expression):
+    """Return SQL expression of a text in lowercase and without accents."""
+    # lower() of SQLite only knows ASCII letters, so accented capitals are replaced as well
+    expression = f"lower({expression})"
+    for letters in (ACCENTS, CAPITALS):
+        for plain, accented in letters.items():
+            for letter in accented:
+                expression = f"replace({expression}, '{letter}', '{plain}')"
+    return expression
+
+
+def normalize(text):
+    """Return a text in lowercase and without accents, the way it's indexed."""
+    return text.lower().translate(_plain_letters)
+
+
+def phone_digits(phone_number):
+    """Return digits of a phone number, the way they're indexed."""
+    return re.sub(r"[ .\-/()+]", "", phone_number)
+
+
+def trigrams(text):
+    """Return the set of trigrams of a text."""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(text, other):
+    """Return how similar two texts are by the trigrams they share, from 0 to 1."""
+    (text, other) = (trigrams(text), trigrams(other))
+    if not text or not other:
+        return 0.0
+    return len(text & other) / len(text | other)
+
+
+def likeness(client, other):
+    """Return how likely two clients (first name, last name, address, phone number) are the same."""
+    # Words of the name are sorted, so "Dupont Jean" is "Jean Dupont"
+    (name, other_name) = (
+        " ".join(sorted(normalize(f"{first_name} {last_name}").split()))
+        for (first_name, last_name, _, _) in (client, other)
+    )
+    name = similarity(name, other_name)
+    address = similarity(normalize(client[2]), normalize(other[2]))
+    digits = phone_digits(client[3])
+    phone = 1.0 if len(digits) >= 6 and digits == phone_digits(other[3]) else 0.0
+    # The same name at the same address is a likelier duplicate than the same name alone
+    return max(name, phone, (name + address) / 2)
+
+
+def indexed_values(client):
+    """Return SELECT statement of values indexed for a client (NEW in triggers, or clients)."""
+    return f"""SELECT
+                    {client}.id,
+                    {normalized(f"{client}.first_name || ' ' || {client}.last_name")},
+                    {normalized(f"{client}.address")},
+                    {PHONE_DIGITS.format(phone=f"{client}.phone_number")}"""
+
+
+async def create_client_index(db):
+    """Create and fill the trigram index of clients, along with triggers that keep it up to date."""
+    operation = """
+                CREATE VIRTUAL TABLE IF NOT EXISTS clients_trigram USING fts5(
+                    name, address, phone_digits, tokenize = 'trigram'
+                );"""
+    await db.execute(operation)
+
+    # Rowid of the index is the id of the client
+    columns = "INSERT INTO clients_trigram (rowid, name, address, phone_digits)"
+    await db.execute("DELETE FROM clients_trigram;")
+    await db.execute(f"{columns} {indexed_values('clients')} FROM clients;")
+
+    operation = f"""
+                CREATE TRIGGER IF NOT EXISTS clients_trigram_insert AFTER INSERT ON clients
+                BEGIN
+                    {columns} {indexed_values("NEW")};
+                END;"""
+    await db.execute(operation)
+
+    operation = """
+                CREATE TRIGGER IF NOT EXISTS clients_trigram_delete AFTER DELETE ON clients
+                BEGIN
+                    DELETE FROM clients_trigram WHERE rowid = OLD.id;
+                END;"""
+    await db.execute(operation)
+
+    operation = f"""
+                CREATE TRIGGER IF NOT EXISTS clients_trigram_update
+                AFTER UPDATE OF id, first_name, last_name, address, phone_number ON clients
+                BEGIN
+                    DELETE FROM clients_trigram WHERE rowid = OLD.id;
+                    {columns} {indexed_values("NEW")};
+                END;"""
+    await db.execute(operation)
+
+
+def candidates_query(client):
+    """Return an FTS5 query that finds clients sharing trigrams of the name or the phone number."""
+    (first_name, last_name, _, phone_number) = client
+    # Trigrams are quoted, so that characters like "-" or ":" aren't taken for query syntax
+    terms = []
+    for trigram in sorted(trigrams(normalize(f"{first_name} {last_name}"))):
+        quoted = trigram.replace('"', '""')
+        terms.append(f'name : "{quoted}"')
+    digits = phone_digits(phone_number).replace('"', '""')
+    if len(digits) >= 3:
+        terms.append(f'phone_digits : "{digits}"')
+    return " OR ".join(terms)
+
+
+async def find_similar_clients(client, exclude=None):
+    """Return (likeness, client row) of clients likely the same as the given one, likeliest first.
+
+    The client is (first name, last name, address, phone number), and the one with the id
+    to exclude (the client itself) is left out.
+    """
+    query = candidates_query(client)
+    if not query:
+        return []
+
+    operation = f"""SELECT
+                        id, first_name, last_name, address, phone_number
+                    FROM
+                        clients
+                    WHERE
+                        id IN (
+                            SELECT
+                                rowid
+                            FROM
+                                clients_trigram
+                            WHERE
+                                clients_trigram MATCH (?)
+                            ORDER BY
+                                rank
+                            LIMIT
+                                {CANDIDATES}
+                        );"""
+    async with get_database().reader() as db:
+        async with db.execute(operation, (query,)) as cursor:
+            rows = await cursor.fetchall()
+
+    similar = [(likeness(client, row[1:]), row) for row in rows if row[0] != exclude]
+    similar = [(score, row) for (score, row) in similar if score >= THRESHOLD]
+    return sorted(similar, key=lambda similar: (-similar[0], similar[1][0]))
+
+
+async def merge_clients(db, storage, kept_id, merged_ids):
+    """Merge clients into the one that's kept, in the transaction that's open on db.
+
+    Orders of the merged clients in every profile become orders of the kept client, adding
+    up quantities of orders of the same food on the same date. Return how many orders moved.
+    """
+    ids = (kept_id, *merged_ids)
+    # Orders of different profiles stay apart
+    key = ("profile_id", "food_id", "date") if storage.partitioned else ("food_id", "date")
+
+    moved = 0
+    combined = 0
+    for source in await storage.sources(db):
+        combined += await merge_same_orders(
+            db, source.table, key, f"client_id IN ({', '.join('?' * len(ids))})", ids
+        )
+        operation = f"""
+                    UPDATE {source.table}
+                    SET
+                        client_id = (?)
+                    WHERE
+                        client_id IN ({', '.join('?' * len(merged_ids))});"""
+        cursor = await db.execute(operation, ids)
+        moved += cursor.rowcount
+
+    operation = f"DELETE FROM clients WHERE id IN ({', '.join('?' * len(merged_ids))});"
+    await db.execute(operation, merged_ids)
+    await record(
+        db,
+        "clients_merged",
+        kept_id,
+        merged=list(merged_ids),
+        orders=moved,
+        combined=combined,
+    )
+    return moved
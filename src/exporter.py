@@ -0,0 +1,97 @@
+import csv
+import os
+
+from database import get_database
+from logger import get_logger
+
+# Every kind is exported with the columns importer.py reads (food with its color as well), so an
+# exported file can be imported again. Orders are those of a profile, by the names of their
+# client and food.
+EXPORTS = {
+    "clients": (
+        ("first_name", "last_name", "address", "phone_number"),
+        """SELECT
+               first_name, last_name, address, phone_number
+           FROM
+               clients
+           ORDER BY
+               id""",
+    ),
+    "food": (
+        ("food_name", "red_color", "green_color", "blue_color"),
+        """SELECT
+               food_name, red_color, green_color, blue_color
+           FROM
+               food
+           ORDER BY
+               id""",
+    ),
+    "orders": (
+        ("first_name", "last_name", "food_name", "food_quantity", "date"),
+        """SELECT
+               first_name, last_name, food_name, food_quantity, date
+           FROM
+               {table}
+               INNER JOIN clients ON {table}.client_id = clients.id
+               INNER JOIN food ON {table}.food_id = food.id
+           {condition}
+           ORDER BY
+               date, {table}.id""",
+    ),
+}
+
+
+async def stream_export(kind, profile=None, start=None, end=None):
+    """Yield the header, then rows of clients, food or orders (of a profile, between two dates inclusive)."""
+    (header, query) = EXPORTS[kind]
+
+    database = get_database()
+    values = ()
+    if kind == "orders":
+        if profile is None:
+            raise ValueError("Orders are exported from a profile, which hasn't been given.")
+        async with database.reader() as db:
+            if profile not in await database.storage.list_profiles(db):
+                raise ValueError(f"Profile ({profile}) doesn't exist.")
+        source = database.storage.source(profile)
+        conditions = []
+        values = []
+        if start is not None:
+            conditions.append("date >= (?)")
+            values.append(start)
+        if end is not None:
+            conditions.append("date <= (?)")
+            values.append(end)
+        query = query.format(table=source.table, condition=source.where(*conditions))
+        values = source.bind(*values)
+
+    async with database.reader() as db:
+        yield header
+        async with db.execute(f"{query};", values) as cursor:
+            async for row in cursor:
+                yield row
+
+
+async def export_csv(kind, path, profile=None, start=None, end=None):
+    """Write clients, food or orders (of a profile) into a CSV file, return the number of its rows."""
+    logger = get_logger("exporter.py")
+    rows = stream_export(kind, profile, start, end)
+    # Check the profile before creating the file
+    header = await anext(rows)
+
+    count = 0
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            async for row in rows:
+                # Food without a color is exported with empty colors, as it's imported
+                writer.writerow(["" if value is None else value for value in row])
+                count += 1
+    except BaseException:
+        # Don't leave half of an export behind (e.g., when it has been cancelled)
+        os.remove(path)
+        raise
+
+    logger.info(f"Exported {count} {kind} into '{path}'.")
+    return count
@@ -0,0 +1,92 @@
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtGui import QBrush, QColor, QPalette
+from PySide6.QtWidgets import QStyledItemDelegate
+
+from repository import FOOD_ID_ROLE, get_food
+from tasks import run_in_background
+
+_food_styles = None
+
+
+def get_foreground_color(color):
+    """Return black/white color depending on calculated luminance."""
+    (red_color, green_color, blue_color) = color
+    luminance = 0.2126 * red_color + 0.7152 * green_color + 0.0722 * blue_color
+    return QColor(255, 255, 255) if luminance < 140 else QColor(0, 0, 0)
+
+
+class FoodStyles(QObject):
+    """Background and foreground brushes of every food (by id), made once and shared by every view.
+
+    Brushes follow the repository of food, so they're made again only for food that changes.
+    """
+
+    # Brushes of some food have changed, views showing food have to be painted again
+    changed = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self._brushes = {}
+
+        food = get_food()
+        food.added.connect(self.food_added)
+        food.removed.connect(self.food_removed)
+        food.reset.connect(self.reload)
+        self.reload()
+
+    async def load(self):
+        """Make brushes of every food (once food has been loaded)."""
+        brushes = {}
+        for food in await get_food().rows():
+            brushes[food[0]] = self.make_brushes(food)
+        self._brushes = brushes
+        self.changed.emit()
+
+    def reload(self):
+        """Make brushes again in the background, after food has been forgotten."""
+        run_in_background(self.load())
+
+    def make_brushes(self, food):
+        """Return background and foreground brushes of a food (None if it has no color)."""
+        (_, _, *rgb) = food
+        if None in rgb:
+            return None
+        return (QBrush(QColor(*rgb)), QBrush(get_foreground_color(rgb)))
+
+    def brushes(self, food_id):
+        """Return background and foreground brushes of the food with the given id (None if it has no color)."""
+        return self._brushes.get(food_id)
+
+    def food_added(self, food):
+        self._brushes[food[0]] = self.make_brushes(food)
+        self.changed.emit()
+
+    def food_removed(self, id):
+        if self._brushes.pop(id, None) is not None:
+            self.changed.emit()
+
+
+def get_food_styles():
+    """Return the brushes of food."""
+    global _food_styles
+    if _food_styles is None:
+        _food_styles = FoodStyles()
+    return _food_styles
+
+
+class FoodDelegate(QStyledItemDelegate):
+    """Paints cells of food in the color of the food, by the id the model gives in FOOD_ID_ROLE."""
+
+    def __init__(self, view):
+        super().__init__(view)
+        # Repaint the view when colors change (or once they've been made)
+        get_food_styles().changed.connect(view.viewport().update)
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        brushes = get_food_styles().brushes(index.data(FOOD_ID_ROLE))
+        if brushes is None:
+            return
+        (background, foreground) = brushes
+        option.backgroundBrush = background
+        option.palette.setBrush(QPalette.Text, foreground)
@@ -0,0 +1,166 @@
+# Fills a scratch database with synthetic clients, food and orders, so that the application
+# (and benchmark.py) can be tried at scales of real kitchens. The same seed and scale always
+# produce the same database.
+
+import datetime
+import random
+
+# (profiles, clients, food, orders) at every scale
+SCALES = {
+    "small": (5, 1000, 20, 20000),
+    "medium": (20, 10000, 50, 500000),
+    "large": (100, 50000, 100, 5000000),
+}
+
+FIRST_NAMES = (
+    "Alice", "Antoine", "Camille", "Chloé", "Élodie", "Émile", "Hélène", "Hugo", "Inès",
+    "Jules", "Léa", "Louis", "Manon", "Mathis", "Noémie", "Paul", "Sarah", "Théo",
+)
+LAST_NAMES = (
+    "Bernard", "Bonnet", "Dubois", "Dupont", "Durand", "Fontaine", "François", "Garnier",
+    "Lambert", "Laurent", "Lefèvre", "Leroy", "Martin", "Moreau", "Petit", "Roux",
+)
+STREETS = ("Rue de la Paix", "Avenue Victor Hugo", "Boulevard Voltaire", "Rue des Écoles")
+FOOD_NAMES = (
+    "Baguette", "Brioche", "Confiture", "Crème Fraîche", "Farine", "Fromage", "Lait",
+    "Lentilles", "Pâtes", "Pommes", "Riz", "Soupe", "Sucre", "Yaourt",
+)
+
+BATCH_SIZE = 50000
+
+
+def generate_clients(rng, count):
+    """Yield rows of clients."""
+    for i in range(count):
+        yield (
+            rng.choice(FIRST_NAMES),
+            # Keep first and last names unique together, as the dialogs require
+            f"{rng.choice(LAST_NAMES)} {i + 1}",
+            f"{rng.randint(1, 200)} {rng.choice(STREETS)}",
+            f"0{rng.randint(1, 9)} {rng.randint(0, 99999999):08}",
+        )
+
+
+def generate_food(rng, count):
+    """Yield rows of food, a third of them without a color."""
+    for i in range(count):
+        name = f"{FOOD_NAMES[i % len(FOOD_NAMES)]} {i // len(FOOD_NAMES) + 1}"
+        if i % 3 == 0:
+            yield (name, None, None, None)
+        else:
+            yield (name, rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+
+
+def generate_orders(rng, count, clients, food, days, end):
+    """Yield rows of orders spread evenly over the days before the end date."""
+    per_day = max(count // days, 1)
+    date = end - datetime.timedelta(days=days)
+    generated = 0
+    while generated < count:
+        date += datetime.timedelta(days=1)
+        # A client orders at most once a day in a profile, so orders never need merging
+        day_clients = rng.sample(range(1, clients + 1), min(per_day, count - generated, clients))
+        for client_id in day_clients:
+            yield (client_id, rng.randint(1, food), rng.randint(1, 10), date.isoformat())
+        generated += len(day_clients)
+
+
+async def insert_batches(db, operation, rows):
+    """Insert rows in transactions of BATCH_SIZE rows, return how many were inserted."""
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            await db.execute("BEGIN;")
+            await db.executemany(operation, batch)
+            await db.commit()
+            count += len(batch)
+            batch = []
+    if batch:
+        await db.execute("BEGIN;")
+        await db.executemany(operation, batch)
+        await db.commit()
+        count += len(batch)
+    return count
+
+
+async def generate(path, profiles, clients, food, orders, partitioned, seed=0, days=730, end=None):
+    """Fill a new database with synthetic data."""
+    from database import Database
+    from logger import get_logger
+    from migrations import migrate
+    from storage import partition
+    from storage_profiles import PROFILES
+
+    logger = get_logger("generate_data.py")
+    rng = random.Random(seed)
+    end = end or datetime.date(2026, 1, 1)
+
+    # Nothing is lost if generating fails halfway, so don't wait for the disk
+    database = Database(path, readers=1, pragmas=PROFILES["fast"])
+    try:
+        async with database.writer() as db:
+            await migrate(db, logger)
+            if partitioned and not database.storage.partitioned:
+                database.storage = await partition(db, logger)
+
+            operation = "INSERT INTO clients (first_name, last_name, address, phone_number) VALUES (?, ?, ?, ?);"
+            await insert_batches(db, operation, generate_clients(rng, clients))
+            operation = "INSERT INTO food (food_name, red_color, green_color, blue_color) VALUES (?, ?, ?, ?);"
+            await insert_batches(db, operation, generate_food(rng, food))
+
+            for number in range(1, profiles + 1):
+                profile = f"Cuisine{number:03}"
+                await db.execute("BEGIN;")
+                await database.storage.create_profile(db, profile)
+                await db.commit()
+
+                source = database.storage.source(profile)
+                operation = source.insert(("client_id", "food_id", "food_quantity", "date"))
+                rows = (
+                    source.bind(*order)
+                    for order in generate_orders(rng, orders // profiles, clients, food, days, end)
+                )
+                count = await insert_batches(db, operation, rows)
+                logger.info(f"Generated {count} orders of profile ({profile}).")
+
+            await db.execute("ANALYZE;")
+            await db.commit()
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    """Generate a scratch database."""
+    import argparse
+    import asyncio
+    import os
+
+    parser = argparse.ArgumentParser(description="Fill a scratch database with synthetic data.")
+    parser.add_argument("path", nargs="?", default="scratch.db")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--profiles", type=int, help="overrides the scale")
+    parser.add_argument("--clients", type=int, help="overrides the scale")
+    parser.add_argument("--food", type=int, help="overrides the scale")
+    parser.add_argument("--orders", type=int, help="overrides the scale")
+    parser.add_argument("--partitioned", action="store_true", help="keep orders in one table")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        parser.error(f"{args.path} already exists, choose another path or remove it.")
+
+    (profiles, clients, food, orders) = SCALES[args.scale]
+    asyncio.run(
+        generate(
+            args.path,
+            args.profiles or profiles,
+            args.clients or clients,
+            args.food or food,
+            args.orders or orders,
+            args.partitioned,
+            args.seed,
+        )
+    )
+    print(f"Generated {args.path}.")
@@ -0,0 +1,165 @@
+from PySide6.QtWidgets import (
+    QComboBox,
+    QDialog,
+    QDialogButtonBox,
+    QFileDialog,
+    QFormLayout,
+    QHBoxLayout,
+    QLabel,
+    QMessageBox,
+    QPushButton,
+    QVBoxLayout,
+)
+
+from changes import get_changes
+from importer import import_csv
+from logger import get_logger
+from repository import get_clients, get_food
+from tasks import information, run_task, warning
+
+
+class ImportDialog(QDialog):
+    """A dialog to import clients, food or orders from a CSV file."""
+
+    def __init__(self, profiles):
+        super().__init__()
+        self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
+        # List that will contain instances of profile tabs
+        self._profiles = profiles
+        self._path = None
+
+        self._kind_combo_box = QComboBox()
+        self._kind_combo_box.addItem("Clients", "clients")
+        self._kind_combo_box.addItem("Nourriture", "food")
+        self._kind_combo_box.addItem("Commandes", "orders")
+
+        self._profile_combo_box = QComboBox()
+        for profile in profiles:
+            self._profile_combo_box.addItem(profile._profile_name)
+        self._profile_combo_box.setEnabled(False)
+
+        self._duplicate_combo_box = QComboBox()
+        self._duplicate_combo_box.addItem("Ignorer les doublons", "skip")
+        self._duplicate_combo_box.addItem("Mettre à jour les doublons", "update")
+
+        file_picker = QHBoxLayout()
+        self._file_label = QLabel("Aucun fichier choisi")
+        _choose_file = QPushButton("Choisir un fichier...")
+        file_picker.addWidget(self._file_label, 12)
+        file_picker.addWidget(_choose_file, 4)
+
+        self._status_label = QLabel(
+            "Colonnes: first_name, last_name, address, phone_number"
+        )
+        self._status_label.setWordWrap(True)
+
+        form_layout = QFormLayout()
+        form_layout.addRow("&Importer:", self._kind_combo_box)
+        form_layout.addRow("&Profil:", self._profile_combo_box)
+        form_layout.addRow("&Doublons:", self._duplicate_combo_box)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(form_layout)
+        layout.addLayout(file_picker)
+        layout.addWidget(self._status_label)
+        layout.addWidget(button_box)
+
+        self.setFixedWidth(512)
+
+        self._kind_combo_box.currentIndexChanged.connect(self.update_kind)
+        _choose_file.clicked.connect(self.choose_file)
+
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+    def update_kind(self):
+        """Show which columns the file needs, and whether a profile has to be chosen."""
+        columns = {
+            "clients": "first_name, last_name, address, phone_number",
+            "food": "food_name, red_color, green_color, blue_color",
+            "orders": "first_name, last_name, food_name, food_quantity, date",
+        }
+        kind = self._kind_combo_box.currentData()
+        self._status_label.setText(f"Colonnes: {columns[kind]}")
+        self._profile_combo_box.setEnabled(kind == "orders")
+        # Orders are always merged with existing ones, as when adding them one by one
+        self._duplicate_combo_box.setEnabled(kind != "orders")
+
+    def choose_file(self):
+        (path, _) = QFileDialog.getOpenFileName(
+            self, "Importer un fichier CSV", "", "CSV (*.csv *.txt)"
+        )
+        if path:
+            self._path = path
+            self._file_label.setText(path)
+
+    def show_progress(self, report):
+        """Show how far the import has got."""
+        self._status_label.setText(
+            f"{report.read} lignes lues, {report.imported} importées, {report.updated} mises à jour, {report.duplicates} doublons, {report.rejected} rejetées..."
+        )
+
+    async def import_file(self, logger, kind, profile, on_duplicate):
+        """Import the chosen file into the database."""
+        try:
+            report = await import_csv(
+                kind, self._path, profile, on_duplicate, progress=self.show_progress
+            )
+        except (OSError, ValueError) as error:
+            # The file can't be read, isn't a CSV file, or it lacks some of the columns
+            await warning(
+                self,
+                "Une erreur s'est produite!",
+                f"Le fichier ({self._path}) n'a pas pu être importé ({error}).",
+            )
+            logger.warn(f"The file ({self._path}) couldn't be imported: {error}")
+            return
+        text = f"Le fichier ({self._path}) a été importé: {report.imported} lignes importées, {report.updated} mises à jour, {report.duplicates} doublons, {report.rejected} rejetées."
+        if report.errors_path is not None:
+            text += f" Les lignes rejetées ont été enregistrées dans le fichier ({report.errors_path})."
+        await information(self, "Succès!", text)
+        self.close()
+
+        # Clients and food are loaded again, rather than told about every imported row
+        if kind == "clients":
+            get_clients().invalidate()
+        elif kind == "food":
+            get_food().invalidate()
+        if kind == "orders":
+            get_changes().reset.emit(profile)
+        elif report.updated:
+            # Orders of every profile show the updated clients or food
+            get_changes().reset.emit(None)
+
+    def accept(self):
+        logger = get_logger("import_dialog.py")
+
+        if self._path is None:
+            QMessageBox.warning(
+                self,
+                "Une erreur s'est produite!",
+                "Veuillez choisir le fichier que vous souhaitez importer.",
+            )
+            logger.warn("The file to import has not been chosen; choose one.")
+            return
+
+        kind = self._kind_combo_box.currentData()
+        profile = self._profile_combo_box.currentText() or None
+        if kind == "orders" and profile is None:
+            QMessageBox.warning(
+                self,
+                "Une erreur s'est produite!",
+                "Veuillez d'abord créer un profil dans lequel importer les commandes.",
+            )
+            logger.warn("There is no profile to import orders into; create one.")
+            return
+
+        run_task(
+            self.import_file(
+                logger, kind, profile, self._duplicate_combo_box.currentData()
+            ),
+            busy_widget=self,
+            label=f"Importation du fichier ({self._path})...",
+        )
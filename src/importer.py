@@ -0,0 +1,410 @@
+import csv
+import os
+from datetime import date
+
+from audit import record
+from database import get_database
+from logger import get_logger
+
+# Rows are validated and written a batch at a time, each batch in a transaction of its own
+BATCH_SIZE = 5000
+
+# Columns that a CSV file of every kind must have (in any order, extra ones are ignored)
+COLUMNS = {
+    "clients": ("first_name", "last_name", "address", "phone_number"),
+    "food": ("food_name",),
+    "orders": ("first_name", "last_name", "food_name", "food_quantity", "date"),
+}
+
+# What to do with a client or a food that already exists
+DUPLICATES = ("skip", "update")
+
+
+class ImportReport:
+    """Counts of what happened to the rows of an imported file so far."""
+
+    def __init__(self, path):
+        self.path = path
+        self.read = 0
+        self.imported = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors_path = None
+
+    def __str__(self):
+        return (
+            f"{self.read} read, {self.imported} imported, {self.updated} updated, "
+            f"{self.duplicates} duplicates, {self.rejected} rejected"
+        )
+
+
+def read_batches(path, columns):
+    """Yield batches of (line number, row) of a CSV file, given the columns it must have."""
+    # Spreadsheets often save CSV files with a BOM, and with ";" as a delimiter
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        sample = file.read(4096)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+
+        reader = csv.DictReader(file, dialect=dialect)
+        missing = [column for column in columns if column not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"Missing columns ({', '.join(missing)}) in '{path}'.")
+
+        batch = []
+        for row in reader:
+            batch.append((reader.line_num, row))
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def validate_client(row):
+    """Return (first name, last name, address, phone number) of a client row, as the dialog does."""
+    client = (
+        (row["first_name"] or "").strip().title(),
+        (row["last_name"] or "").strip().title(),
+        (row["address"] or "").strip(),
+        (row["phone_number"] or "").strip(),
+    )
+    if "" in client:
+        raise ValueError("One or more fields are empty.")
+    return client
+
+
+def validate_food(row):
+    """Return (food name, red, green, blue) of a food row, as the dialog does."""
+    food_name = (row["food_name"] or "").strip().title()
+    if food_name == "":
+        raise ValueError("Food name field is empty.")
+
+    color = [(row.get(column) or "").strip() for column in ("red_color", "green_color", "blue_color")]
+    if color == ["", "", ""]:
+        return (food_name, None, None, None)
+    try:
+        color = [int(value) for value in color]
+    except ValueError:
+        raise ValueError("A color has to be given as three integers (red, green and blue).")
+    if not all(0 <= value <= 255 for value in color):
+        raise ValueError("A color has to be given as three integers between 0 and 255.")
+    return (food_name, *color)
+
+
+def validate_order(row):
+    """Return (first name, last name, food name, quantity, date) of an order row."""
+    first_name = (row["first_name"] or "").strip().title()
+    last_name = (row["last_name"] or "").strip().title()
+    food_name = (row["food_name"] or "").strip().title()
+    if "" in (first_name, last_name, food_name):
+        raise ValueError("One or more fields are empty.")
+
+    try:
+        food_quantity = int((row["food_quantity"] or "").strip())
+    except ValueError:
+        raise ValueError("Food quantity has to be an integer.")
+    if food_quantity < 1:
+        raise ValueError("Food quantity has to be at least 1.")
+
+    try:
+        order_date = date.fromisoformat((row["date"] or "").strip()).isoformat()
+    except ValueError:
+        raise ValueError("Date has to be given as YYYY-MM-DD.")
+    return (first_name, last_name, food_name, food_quantity, order_date)
+
+
+class Importer:
+    """Streams a CSV file of clients, food or orders into the database."""
+
+    def __init__(self, kind, path, profile=None, on_duplicate="skip", progress=None):
+        if kind not in COLUMNS:
+            raise ValueError(f"Unknown kind of import ({kind}).")
+        if on_duplicate not in DUPLICATES:
+            raise ValueError(f"Unknown way to resolve duplicates ({on_duplicate}).")
+        if kind == "orders" and profile is None:
+            raise ValueError("Orders have to be imported into a profile.")
+
+        self.kind = kind
+        self.path = path
+        self.profile = profile
+        self.on_duplicate = on_duplicate
+        # Called with the report after every batch
+        self.progress = progress
+        self.report = ImportReport(path)
+        # Rows rejected from the batch being imported, as (line number, error, row)
+        self.rejects = []
+        self._errors = None
+        self._errors_file = None
+        # Ids of existing clients by (first name, last name) and of food by name
+        self._clients = None
+        self._food = None
+
+    async def run(self):
+        """Import the whole file, return the report."""
+        logger = get_logger("importer.py")
+        database = get_database()
+        if self.kind == "orders":
+            async with database.reader() as db:
+                profiles = await database.storage.list_profiles(db)
+            if self.profile not in profiles:
+                raise ValueError(f"Profile ({self.profile}) doesn't exist.")
+
+        try:
+            for batch in read_batches(self.path, COLUMNS[self.kind]):
+                # A station using a server has it import the batch, with one request
+                if database.remote:
+                    self.add(await database.import_batch(self, batch))
+                else:
+                    await self.import_batch(batch)
+                self.write_rejects()
+                logger.info(f"Importing '{self.path}' ({self.kind}): {self.report}.")
+                if self.progress is not None:
+                    self.progress(self.report)
+        finally:
+            if self._errors_file is not None:
+                self._errors_file.close()
+
+        logger.info(f"Imported '{self.path}' ({self.kind}): {self.report}.")
+        return self.report
+
+    async def import_batch(self, batch):
+        """Import a batch of rows in a transaction of its own."""
+        async with get_database().writer() as db:
+            (imported, updated) = (self.report.imported, self.report.updated)
+            await self.load_keys(db)
+            await getattr(self, f"import_{self.kind}")(db, batch)
+            # A batch is recorded as one event, rather than an event per row
+            await record(
+                db,
+                "imported",
+                profile=self.profile if self.kind == "orders" else None,
+                kind=self.kind,
+                path=os.path.abspath(self.path),
+                imported=self.report.imported - imported,
+                updated=self.report.updated - updated,
+            )
+            await db.commit()
+
+    def add(self, result):
+        """Add up what happened to a batch imported by the server (see server.py)."""
+        for count in ("read", "imported", "updated", "duplicates", "rejected"):
+            setattr(self.report, count, getattr(self.report, count) + result[count])
+        self.rejects += [tuple(reject) for reject in result["rejects"]]
+
+    def reject(self, line, row, error):
+        """Reject a row, which is written into the error file after its batch."""
+        self.report.rejected += 1
+        self.rejects.append((line, error, row))
+
+    def write_rejects(self):
+        """Write rejected rows into the error file (next to the imported one)."""
+        for line, error, row in self.rejects:
+            if self._errors is None:
+                self.report.errors_path = f"{os.path.splitext(self.path)[0]}.errors.csv"
+                self._errors_file = open(
+                    self.report.errors_path, "w", encoding="utf-8", newline=""
+                )
+                self._errors = csv.writer(self._errors_file)
+                self._errors.writerow(["line", "error", *row.keys()])
+            self._errors.writerow([line, error, *row.values()])
+        self.rejects = []
+
+    async def load_keys(self, db):
+        """Load ids of existing clients and food (once), to resolve duplicates and orders."""
+        if self._clients is None and self.kind in ("clients", "orders"):
+            self._clients = {}
+            async with db.execute("SELECT id, first_name, last_name FROM clients;") as cursor:
+                async for (client_id, first_name, last_name) in cursor:
+                    self._clients[(first_name, last_name)] = client_id
+        if self._food is None and self.kind in ("food", "orders"):
+            self._food = {}
+            async with db.execute("SELECT id, food_name FROM food;") as cursor:
+                async for (food_id, food_name) in cursor:
+                    self._food[food_name] = food_id
+
+    async def import_clients(self, db, batch):
+        """Import a batch of clients."""
+        new = {}
+        updates = {}
+        for line, row in batch:
+            self.report.read += 1
+            try:
+                client = validate_client(row)
+            except ValueError as error:
+                self.reject(line, row, str(error))
+                continue
+
+            # Clients are told apart by their first and last name, see AddClientDialog
+            key = client[:2]
+            if key in self._clients:
+                if self.on_duplicate == "update":
+                    updates[self._clients[key]] = client[2:]
+                else:
+                    self.report.duplicates += 1
+            elif key in new:
+                # The last row of the same client in the file wins
+                self.report.duplicates += 1
+                new[key] = client
+            else:
+                new[key] = client
+
+        async with db.execute("SELECT coalesce(max(id), 0) FROM clients;") as cursor:
+            (last_id,) = await cursor.fetchone()
+        operation = """
+                    INSERT INTO clients (
+                        first_name, last_name, address, phone_number
+                    )
+                    VALUES
+                        (?, ?, ?, ?);"""
+        await db.executemany(operation, new.values())
+        self.report.imported += len(new)
+
+        # Remember the new clients, so that they're found as duplicates in the next batches
+        operation = "SELECT id, first_name, last_name FROM clients WHERE id > (?);"
+        async with db.execute(operation, (last_id,)) as cursor:
+            async for (client_id, first_name, last_name) in cursor:
+                self._clients[(first_name, last_name)] = client_id
+
+        operation = "UPDATE clients SET address = (?), phone_number = (?) WHERE id = (?);"
+        await db.executemany(
+            operation,
+            [(address, phone_number, client_id) for client_id, (address, phone_number) in updates.items()],
+        )
+        self.report.updated += len(updates)
+
+    async def import_food(self, db, batch):
+        """Import a batch of food."""
+        new = {}
+        updates = {}
+        for line, row in batch:
+            self.report.read += 1
+            try:
+                food = validate_food(row)
+            except ValueError as error:
+                self.reject(line, row, str(error))
+                continue
+
+            food_name = food[0]
+            if food_name in self._food:
+                if self.on_duplicate == "update":
+                    updates[food_name] = food
+                else:
+                    self.report.duplicates += 1
+            else:
+                if food_name in new:
+                    self.report.duplicates += 1
+                new[food_name] = food
+
+        operation = """
+                    INSERT INTO food (
+                        food_name, red_color, green_color,
+                        blue_color
+                    )
+                    VALUES
+                        (?, ?, ?, ?);"""
+        await db.executemany(operation, new.values())
+        self.report.imported += len(new)
+        # Food names are unique, so there's no need to know the new ids yet
+        self._food.update(dict.fromkeys(new, None))
+
+        operation = """
+                    UPDATE food
+                    SET
+                        red_color = (?),
+                        green_color = (?),
+                        blue_color = (?)
+                    WHERE
+                        food_name = (?);"""
+        await db.executemany(
+            operation, [(*color, food_name) for (food_name, *color) in updates.values()]
+        )
+        self.report.updated += len(updates)
+
+    async def import_orders(self, db, batch):
+        """Import a batch of orders, adding up quantities of orders that already exist."""
+        orders = []
+        for line, row in batch:
+            self.report.read += 1
+            try:
+                (first_name, last_name, food_name, food_quantity, order_date) = (
+                    validate_order(row)
+                )
+            except ValueError as error:
+                self.reject(line, row, str(error))
+                continue
+
+            client_id = self._clients.get((first_name, last_name))
+            food_id = self._food.get(food_name)
+            if client_id is None:
+                self.reject(line, row, "Client doesn't exist.")
+                continue
+            if food_id is None:
+                self.reject(line, row, "Food doesn't exist.")
+                continue
+            orders.append((client_id, food_id, food_quantity, order_date))
+
+        operation = """
+                    CREATE TEMP TABLE IF NOT EXISTS imported_orders (
+                        client_id INTEGER, food_id INTEGER, food_quantity INTEGER, date
+                    );"""
+        await db.execute(operation)
+        await db.execute("DELETE FROM imported_orders;")
+        operation = """
+                    INSERT INTO imported_orders (client_id, food_id, food_quantity, date)
+                    VALUES
+                        (?, ?, ?, ?);"""
+        await db.executemany(operation, orders)
+
+        # Same orders (client, food and date) are merged by adding up their quantities, just
+        # like AddOrderDialog does
+        imported = """SELECT
+                          client_id, food_id, sum(food_quantity) AS food_quantity, date
+                      FROM
+                          imported_orders
+                      GROUP BY
+                          client_id, food_id, date"""
+        database = get_database()
+        source = database.storage.source(self.profile)
+        table = source.table
+        same_order = (
+            f"{table}.client_id = imported.client_id AND {table}.food_id = imported.food_id "
+            f"AND {table}.date = imported.date"
+        )
+
+        operation = f"""
+                    UPDATE {table}
+                    SET
+                        food_quantity = {table}.food_quantity + imported.food_quantity
+                    FROM
+                        ({imported}) AS imported
+                    {source.where(same_order)};"""
+        cursor = await db.execute(operation, source.bind())
+        updated = cursor.rowcount
+
+        operation = source.insert(
+            ("client_id", "food_id", "food_quantity", "date"),
+            f"""SELECT
+                    client_id, food_id, food_quantity, date
+                FROM
+                    ({imported}) AS imported
+                WHERE
+                    NOT EXISTS (SELECT 1 FROM {table} {source.where(same_order)})""",
+        )
+        # Parameters of the source appear twice: for insert() and for where()
+        cursor = await db.execute(operation, source.bind(*source.bind()))
+        inserted = cursor.rowcount
+
+        self.report.imported += inserted
+        self.report.updated += updated
+        # Rows of the same order in the file were merged into one
+        self.report.duplicates += len(orders) - inserted - updated
+
+
+async def import_csv(kind, path, profile=None, on_duplicate="skip", progress=None):
+    """Import a CSV file of clients, food or orders, return the report."""
+    return await Importer(kind, path, profile, on_duplicate, progress).run()
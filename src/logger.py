@@ -1,39 +1,121 @@
+import atexit
 import logging
 import os
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
 
+# Logging hierarchy below:
+# logs/
+#   2024/
+#     January/
+#       2024-01-01.log.zst
+#       2024-01-02.log.zst
+#       ...
+#     February/
+#       ...
+#   2025/
+#     ...
+# Logs of past days are compressed, only the log of the current day is plain text.
 
-def get_logger(name):
-    """Return a logger with the specified name."""
+LOG_DIRECTORY = "logs"
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
-    # Logging hierarchy below:
-    # logs/
-    #   2024/
-    #     January/
-    #       2024-01-01.log
-    #       2024-01-02.log
-    #       ...
-    #     February/
-    #       ...
-    #   2025/
-    #     ...
-
-    current_date = datetime.now()
-    LOG_PATH = os.path.join(
-        "logs",
-        os.path.join(
-            str(current_date.year),
-            str(current_date.strftime("%B")),
-        ),
-    )
-    os.makedirs(LOG_PATH, exist_ok=True)
-
-    logger = logging.getLogger(name)
-    logging.basicConfig(
-        filename=os.path.join(LOG_PATH, f"{current_date.strftime("%Y-%m-%d")}.log"),
-        encoding="utf-8",
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        level=logging.INFO,
+_listener = None
+_lock = threading.Lock()
+
+
+def log_path(directory, date):
+    """Return path of the log of a day."""
+    return os.path.join(
+        directory, str(date.year), date.strftime("%B"), f"{date.strftime('%Y-%m-%d')}.log"
     )
 
-    return logger
+
+def compress_logs(directory, current):
+    """Compress logs of past days (every log but the current one)."""
+    # Not needed before the first day goes by, so it isn't imported on startup
+    import zstandard
+
+    compressor = zstandard.ZstdCompressor(level=10)
+    for root, _, files in os.walk(directory):
+        for file in files:
+            path = os.path.join(root, file)
+            if not file.endswith(".log") or os.path.samefile(path, current):
+                continue
+            with open(path, "rb") as log:
+                frame = compressor.compress(log.read())
+            # The same day might have been compressed before (if its log got written into
+            # later), and a file of several zstd frames decompresses as their concatenation
+            with open(f"{path}.zst", "ab") as archive:
+                archive.write(frame)
+                archive.flush()
+                os.fsync(archive.fileno())
+            os.remove(path)
+
+
+class DailyFileHandler(logging.Handler):
+    """Writes records into the log of their day, compressing logs of days that went by."""
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self._date = None
+        self._stream = None
+
+    def emit(self, record):
+        try:
+            date = datetime.fromtimestamp(record.created).date()
+            # Records queued just before midnight still go into the new day
+            if self._date is None or date > self._date:
+                self.rotate(date)
+            self._stream.write(f"{self.format(record)}\n")
+            self._stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def rotate(self, date):
+        """Start writing into the log of another day."""
+        if self._stream is not None:
+            self._stream.close()
+        self._date = date
+        path = log_path(self.directory, date)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._stream = open(path, "a", encoding="utf-8")
+        # Also picks up logs left behind by the application running on a previous day
+        compress_logs(self.directory, path)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        super().close()
+
+
+def setup_logging(directory=LOG_DIRECTORY):
+    """Start writing logs on a thread of their own (only the first time it's called)."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        handler = DailyFileHandler(directory)
+        handler.setFormatter(logging.Formatter(FORMAT))
+
+        # Logging only puts records into the queue, the listener's thread writes them
+        queue = SimpleQueue()
+        root = logging.getLogger()
+        root.addHandler(QueueHandler(queue))
+        root.setLevel(logging.INFO)
+
+        _listener = QueueListener(queue, handler)
+        _listener.start()
+        # Write what's left in the queue before exiting
+        atexit.register(_listener.stop)
+
+
+def get_logger(name):
+    """Return a logger with the specified name."""
+    setup_logging()
+    return logging.getLogger(name)
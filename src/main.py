@@ -18,67 +18,140 @@
 #   nuitka-project: --output-dir=build/linux
 #   nuitka-project: --output-filename=pyfncm
 
-import aiosqlite as sql
+import asyncio
+
+from startup_trace import StartupTrace
+
+# Started before anything else is imported, so that importing is timed as well
+startup_trace = StartupTrace()
+
+from PySide6.QtCore import Signal
 from PySide6.QtWidgets import QApplication, QMainWindow
 
 from logger import get_logger
 from main_widget import MainWidget
 
+# Everything that isn't needed to show the window is imported once it's been shown, see start()
+
+# Status the application exits with, set by start() if it fails
+exit_status = 0
+
 
 class MainWindow(QMainWindow):
+    # Emitted whenever the window is painted, the first time being when the user sees it
+    painted = Signal()
+
     def __init__(self, widget):
         super().__init__()
         self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
         self.setCentralWidget(widget)
 
-
-async def initialize_database(logger):
-    """Initialize database if it doesn't exist."""
-    async with sql.connect("data.db") as db:
-        # Create clients table if it doesn't exist
-        operation = """
-                    CREATE TABLE IF NOT EXISTS clients (
-                        id INTEGER PRIMARY KEY, first_name TEXT NOT NULL,
-                        last_name TEXT NOT NULL, address TEXT NOT NULL,
-                        phone_number TEXT NOT NULL
-                    );"""
-        await db.execute(operation)
-
-        # Create index for clients table on first name, last name and phone number
-        operation = "CREATE INDEX IF NOT EXISTS first_name_idx ON clients(first_name);"
-        await db.execute(operation)
-
-        operation = "CREATE INDEX IF NOT EXISTS last_name_idx ON clients(last_name);"
-        await db.execute(operation)
-
-        operation = (
-            "CREATE INDEX IF NOT EXISTS phone_number_idx ON clients(phone_number);"
-        )
-        await db.execute(operation)
-
-        # Create food table if it doesn't exist
-        operation = """
-                    CREATE TABLE IF NOT EXISTS food (
-                        id INTEGER PRIMARY KEY, food_name TEXT UNIQUE NOT NULL,
-                        red_color INTEGER, green_color INTEGER,
-                        blue_color INTEGER
-                    );"""
-        await db.execute(operation)
-    logger.info("Database initialized...")
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        self.painted.emit()
+
+
+async def first_paint(window, timeout):
+    """Return once the window has been painted (or the timeout has passed, e.g. if it's hidden)."""
+    if "first paint" in startup_trace.phases:
+        return
+    painted = asyncio.get_running_loop().create_future()
+    window.painted.connect(lambda: painted.done() or painted.set_result(None))
+    try:
+        await asyncio.wait_for(painted, timeout)
+    except TimeoutError:
+        pass
+
+
+async def start(main_widget, logger, trace_path=None, quit=False):
+    """Prepare the database, then load the profiles into the main widget."""
+    global exit_status
+    # Importing the rest of the application waits for the window to be seen
+    await first_paint(main_widget.window(), timeout=1)
+
+    from database import get_database
+    from migrations import initialize_database
+    from repository import load_repositories
+    from tasks import run_in_background
+
+    # A server brings the database it owns up to date itself
+    if not get_database().remote:
+        try:
+            await initialize_database(logger)
+        except Exception:
+            # Without a database there's nothing to show, quit with a failure status
+            logger.exception("The database couldn't be initialized.")
+            exit_status = 1
+            QApplication.quit()
+            return
+    startup_trace.mark("database")
+    await main_widget.load_profiles()
+    startup_trace.mark("profiles")
+
+    if trace_path is not None:
+        startup_trace.write(trace_path)
+        logger.info(f"Startup took {sum(startup_trace.phases.values()):.3f}s.")
+    if quit:
+        QApplication.quit()
+        return
+    # Clients and food are kept in memory, load them before the first dialog asks for them
+    run_in_background(load_repositories())
+    if get_database().remote:
+        from change_feed import follow_changes
+
+        run_in_background(follow_changes(main_widget))
+    else:
+        run_in_background(archive_expired_orders(main_widget))
+
+
+async def archive_expired_orders(main_widget):
+    """Archive expired orders in the background, then reload the profiles that showed them."""
+    # Archiving starts well after startup, so the archive's compression isn't loaded before
+    from audit import seal_audit
+    from changes import get_changes
+    from retention import run_retention
+
+    if await run_retention():
+        get_changes().reset.emit(None)
+    await seal_audit()
 
 
 if __name__ == "__main__":
     """Run the application."""
-    import asyncio
+    import argparse
     import sys
 
-    logger = get_logger("main.py")
+    from PySide6 import QtAsyncio
+
+    parser = argparse.ArgumentParser(description="Python Food and Clientèle Manager")
+    parser.add_argument(
+        "--startup-trace", metavar="PATH", help="write timings of startup phases into a JSON file"
+    )
+    parser.add_argument(
+        "--quit-after-startup", action="store_true", help="quit once started (to time startup)"
+    )
+    args = parser.parse_args()
+    startup_trace.mark("imports")
 
-    asyncio.run(initialize_database(logger), debug=False)
+    logger = get_logger("main.py")
 
     app = QApplication([])
     logger.info("Application started...")
+    startup_trace.mark("application")
 
-    main_window = MainWindow(MainWidget())
+    main_widget = MainWidget()
+    main_window = MainWindow(main_widget)
+    main_window.painted.connect(lambda: startup_trace.mark("first paint"))
     main_window.show()
-    sys.exit(app.exec())
+    startup_trace.mark("window")
+
+    # Qt and asyncio share one event loop, which runs until the application quits
+    QtAsyncio.run(
+        start(main_widget, logger, args.startup_trace, args.quit_after_startup),
+        keep_running=True,
+    )
+
+    from database import get_database
+
+    asyncio.run(get_database().close(), debug=False)
+    sys.exit(exit_status)
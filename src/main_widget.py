@@ -1,17 +1,18 @@
-import asyncio
-
-import aiosqlite as sql
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtWidgets import QTabWidget, QToolButton
 
 from actions_tab import ActionsTab
-from add_profile_dialog import AddProfileDialog
-from profile_tab import ProfileTab
+
+# Profile tabs (along with their models and the database) are imported once the window has been
+# shown, when the profiles are loaded
 
 
 class MainWidget(QTabWidget):
     """The central widget of the application."""
 
+    # How many tabs on each side of the current one are loaded ahead of time
+    PREFETCH_DISTANCE = 2
+
     def __init__(self):
         super().__init__()
 
@@ -24,32 +25,90 @@ class MainWidget(QTabWidget):
         self.actions_tab = ActionsTab()
         self.addTab(self.actions_tab, "Actions principales")
 
-        self._profiles = asyncio.run(self.get_profiles(), debug=False)
-        for profile in self._profiles:
-            self.add_profile_tab(profile)
+        # Profiles are loaded once the event loop runs, see load_profiles()
+        self._profiles = []
+
+        # Tabs near the current one are prefetched one at a time, whenever the loop is idle
+        self._prefetch_timer = QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(0)
 
         add_button.clicked.connect(self.add_profile)
+        self.currentChanged.connect(self.load_tab)
+        self._prefetch_timer.timeout.connect(self.prefetch)
+
+    async def load_profiles(self):
+        """Load all profiles and add a tab for each of them."""
+        for profile in await self.get_profiles():
+            self.add_profile_tab(profile)
+        self._prefetch_timer.start()
+
+    async def update_profiles(self):
+        """Add and remove tabs of profiles added and deleted (at other stations) since."""
+        profiles = await self.get_profiles()
+        for profile in [profile for profile in self._profiles if profile not in profiles]:
+            self.remove_profile_tab(profile)
+        for profile in profiles:
+            self.add_profile_tab(profile)
 
     def add_profile_tab(self, profile):
-        """Add new profile tab to the main widget."""
+        """Add new profile tab to the main widget (unless it has one already)."""
+        from profile_tab import ProfileTab
+
+        if profile in self._profiles:
+            return
         profile_tab = ProfileTab(self, profile)
+        self._profiles.append(profile)
         self.actions_tab._profiles.append(profile_tab)
         self.addTab(profile_tab, profile)
 
+    def remove_profile_tab(self, profile):
+        """Remove the tab of a deleted profile from the main widget."""
+        if profile not in self._profiles:
+            return
+        idx = self._profiles.index(profile)
+        # Add 1 to account for main actions tab
+        profile_tab = self.widget(idx + 1)
+        self.removeTab(idx + 1)
+        self._profiles.pop(idx)
+        self.actions_tab._profiles.pop(idx)
+        # Removing the tab doesn't delete it, and its model would go on reloading orders
+        profile_tab.deleteLater()
+
+    def load_tab(self, index):
+        """Load a profile tab once it's shown, then prefetch the ones around it."""
+        tab = self.widget(index)
+        if tab not in (None, self.actions_tab):
+            task = tab.load()
+            if not task.done():
+                # The shown tab comes first
+                task.add_done_callback(lambda _: self._prefetch_timer.start())
+                return
+        self._prefetch_timer.start()
+
+    def prefetch(self):
+        """Load the closest tab to the current one that hasn't been loaded yet."""
+        current = self.currentIndex()
+        for distance in range(1, self.PREFETCH_DISTANCE + 1):
+            for index in (current + distance, current - distance):
+                tab = self.widget(index)
+                if tab not in (None, self.actions_tab) and tab.model is None:
+                    # Carry on with the next tab once this one has been loaded
+                    task = tab.load(prefetch=True)
+                    task.add_done_callback(lambda _: self._prefetch_timer.start())
+                    return
+
     async def get_profiles(self):
         """Return all profiles."""
-        tables = []
-        async with sql.connect("data.db") as db:
-            async with db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table';"
-            ) as cursor:
-                async for table in cursor:
-                    tables.append(table[0])
+        from database import get_database
 
-        # All profiles start with uppercase letter, so we check against that and return only them
-        return [profile for profile in filter(lambda table: table[0].isupper(), tables)]
+        database = get_database()
+        async with database.reader() as db:
+            return await database.storage.list_profiles(db)
 
     def add_profile(self):
         """Add new profile to the database"""
+        from add_profile_dialog import AddProfileDialog
+
         add_profile_dialog = AddProfileDialog(self, self._profiles)
         add_profile_dialog.exec()
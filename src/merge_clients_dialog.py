@@ -0,0 +1,148 @@
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import (
+    QAbstractItemView,
+    QDialog,
+    QDialogButtonBox,
+    QHeaderView,
+    QLabel,
+    QListWidget,
+    QListWidgetItem,
+    QMessageBox,
+    QTableView,
+    QVBoxLayout,
+)
+
+from changes import get_changes
+from duplicates import find_similar_clients, merge_clients
+from logger import get_logger
+from operations import make
+from repository import ClientsModel, get_clients
+from tasks import information, question, run_in_background, run_task
+
+
+class MergeClientsDialog(QDialog):
+    """A dialog to merge clients that were added more than once into one of them."""
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
+
+        self.model = ClientsModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+
+        self._client = None
+        self._similar_task = None
+        self.table.clicked.connect(lambda index: self.set_client(index.row()))
+        # Rows move when clients are deleted, so the kept one has to be chosen again
+        self.model.rowsRemoved.connect(lambda: self.set_client(None))
+        self.model.modelReset.connect(lambda: self.set_client(None))
+
+        self._similar_list = QListWidget()
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel("Client à conserver:"))
+        layout.addWidget(self.table)
+        layout.addWidget(QLabel("Clients semblables à fusionner dans celui-ci:"))
+        layout.addWidget(self._similar_list)
+        layout.addWidget(button_box)
+
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+        run_task(self.fill_table())
+
+    async def fill_table(self):
+        """Fill the table with clients (from memory, once they've been loaded)."""
+        await self.model.load()
+
+        # Size the table if there are any clients
+        if self.model.rowCount():
+            header = self.table.horizontalHeader()
+            header.setSectionResizeMode(QHeaderView.ResizeToContents)
+            # Add 35, lest part of the last section gets swallowed
+            self.setMinimumWidth(header.length() + 35)
+
+            header.setSectionResizeMode(2, QHeaderView.Stretch)
+
+    def set_client(self, row):
+        """Choose the client to keep (through clicking table item), and list similar ones."""
+        self._client = None if row is None else self.model.row(row)
+        self._similar_list.clear()
+        if self._similar_task is not None:
+            self._similar_task.cancel()
+        if self._client is not None:
+            self._similar_task = run_in_background(self.fill_similar(self._client))
+
+    async def fill_similar(self, client):
+        """List clients similar to the chosen one, checked to be merged."""
+        (client_id, *data) = client
+        for score, (similar_id, first_name, last_name, address, phone_number) in (
+            await find_similar_clients(data, exclude=client_id)
+        ):
+            item = QListWidgetItem(
+                f"{first_name} {last_name}, {address}, {phone_number} ({score:.0%})"
+            )
+            item.setData(Qt.UserRole, similar_id)
+            item.setCheckState(Qt.Checked)
+            self._similar_list.addItem(item)
+
+    async def merge_clients_in_database(self, logger, client, merged_ids):
+        """Merge clients into the chosen one."""
+        (client_id, first_name, last_name, address, phone_number) = client
+
+        orders = await make(merge_clients, client_id, merged_ids)
+        await information(
+            self,
+            "Succès!",
+            f"Les clients ({len(merged_ids)}) ont été fusionnés dans le client ({first_name} {last_name}, {address}, {phone_number}), avec leurs commandes ({orders}).",
+        )
+        logger.info(
+            f"Merged clients ({', '.join(map(str, merged_ids))}) into client ({client_id}), along with {orders} orders."
+        )
+        self.close()
+        for merged_id in merged_ids:
+            get_clients().remove(merged_id)
+        # Orders of the kept client have changed in every profile
+        get_changes().reset.emit(None)
+
+    def accept(self):
+        logger = get_logger("merge_clients_dialog.py")
+
+        merged_ids = [
+            self._similar_list.item(row).data(Qt.UserRole)
+            for row in range(self._similar_list.count())
+            if self._similar_list.item(row).checkState() == Qt.Checked
+        ]
+        if self._client is None or not merged_ids:
+            QMessageBox.warning(
+                self,
+                "Une erreur s'est produite!",
+                "Veuillez choisir le client à conserver et les clients à fusionner dans celui-ci.",
+            )
+            logger.warn("The clients to merge have not been chosen; choose them.")
+            return
+
+        run_task(self.confirm_merge(logger, self._client, merged_ids), busy_widget=self)
+
+    async def confirm_merge(self, logger, client, merged_ids):
+        """Ask whether to merge clients into the chosen one."""
+        (_, first_name, last_name, address, phone_number) = client
+
+        answer = await question(
+            self,
+            "Es-tu sûr?",
+            f"Êtes-vous sûr de vouloir fusionner les clients ({len(merged_ids)}) dans le client ({first_name} {last_name}, {address}, {phone_number})? Leurs commandes lui seront attribuées et ils seront supprimés.",
+        )
+        if answer == QMessageBox.No:
+            return
+
+        run_task(
+            self.merge_clients_in_database(logger, client, merged_ids),
+            busy_widget=self,
+            label=f"Fusion des clients dans le client ({first_name} {last_name})...",
+        )
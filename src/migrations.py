@@ -0,0 +1,200 @@
+import asyncio
+from datetime import datetime
+
+from audit import create_audit_table
+from client_search import create_prefix_indexes
+from config import get_config
+from database import get_database
+from duplicates import create_client_index
+from logger import get_logger
+from rollups import create_rollup_tables, rebuild_rollups
+from search_index import create_search_index
+from storage import TableStorage, detect_storage, partition
+
+# Migrations are numbered by their position in MIGRATIONS (starting from 1), and the number of
+# the last applied one is kept in "PRAGMA user_version". Never reorder or remove migrations,
+# only append new ones. Every migration must be safe to run on a database that already has
+# (some of) its changes, since databases made before migrations existed start at version 0.
+
+
+async def create_tables(db):
+    """Create clients and food tables."""
+    operation = """
+                CREATE TABLE IF NOT EXISTS clients (
+                    id INTEGER PRIMARY KEY, first_name TEXT NOT NULL,
+                    last_name TEXT NOT NULL, address TEXT NOT NULL,
+                    phone_number TEXT NOT NULL
+                );"""
+    await db.execute(operation)
+
+    # Create index for clients table on first name, last name and phone number
+    operation = "CREATE INDEX IF NOT EXISTS first_name_idx ON clients(first_name);"
+    await db.execute(operation)
+
+    operation = "CREATE INDEX IF NOT EXISTS last_name_idx ON clients(last_name);"
+    await db.execute(operation)
+
+    operation = "CREATE INDEX IF NOT EXISTS phone_number_idx ON clients(phone_number);"
+    await db.execute(operation)
+
+    operation = """
+                CREATE TABLE IF NOT EXISTS food (
+                    id INTEGER PRIMARY KEY, food_name TEXT UNIQUE NOT NULL,
+                    red_color INTEGER, green_color INTEGER,
+                    blue_color INTEGER
+                );"""
+    await db.execute(operation)
+
+
+# The two migrations below were made before databases could be partitioned, so they only know
+# of profile tables. Newer migrations have to handle both storages.
+
+
+async def index_profiles(db):
+    """Create indexes of existing profile tables (new ones get them on creation)."""
+    # Indexes are created as they were when this migration was made, unique_orders() makes the
+    # index of clients unique later on
+    for profile in await TableStorage().list_profiles(db):
+        # Orders are listed and expired by date
+        operation = f"CREATE INDEX IF NOT EXISTS {profile}_date_idx ON {profile}(date);"
+        await db.execute(operation)
+
+        # Orders are looked up by client (when deleting a client) and by client, food and date
+        # (when adding an order that might already exist)
+        operation = f"""
+                    CREATE INDEX IF NOT EXISTS {profile}_client_idx
+                    ON {profile}(client_id, food_id, date);"""
+        await db.execute(operation)
+
+        # Orders are looked up by food when deleting a food
+        operation = f"CREATE INDEX IF NOT EXISTS {profile}_food_idx ON {profile}(food_id);"
+        await db.execute(operation)
+
+
+async def create_search_indexes(db):
+    """Create search indexes of existing profiles (new ones get them on creation)."""
+    storage = TableStorage()
+    for profile in await storage.list_profiles(db):
+        await create_search_index(db, profile, storage.search_table(profile))
+    await storage.update_search_triggers(db)
+
+
+async def cascade_deletes(db):
+    """Rebuild order tables, so that deleting a client or a food deletes its orders as well."""
+    storage = await detect_storage(db)
+    # Orders of clients and food deleted before can't be kept in the rebuilt tables
+    await archive_orphaned_orders(db, storage)
+    await storage.rebuild_tables(db)
+
+
+async def archive_orphaned_orders(db, storage):
+    """Archive orders whose client or food doesn't exist anymore, return how many there were."""
+    async with db.execute(await storage.orphaned_orders(db)) as cursor:
+        columns = [column for (column, *_) in cursor.description]
+        orders = [dict(zip(columns, row)) for row in await cursor.fetchall()]
+    if not orders:
+        return 0
+
+    # Imported only when needed, the archive's compression isn't loaded on startup otherwise
+    from retention import append_to_archive, get_retention
+
+    directory = get_retention().directory
+    archived = datetime.now().isoformat(timespec="seconds")
+    await asyncio.to_thread(
+        append_to_archive, directory, [order | {"archived": archived} for order in orders]
+    )
+    get_logger("migrations.py").warning(
+        f"Archived {len(orders)} orders of deleted clients or food into '{directory}'."
+    )
+    return len(orders)
+
+
+async def create_rollups(db):
+    """Create rollups of orders, along with triggers that keep them up to date."""
+    storage = await detect_storage(db)
+    await create_rollup_tables(db)
+    await storage.create_rollup_triggers(db)
+    await rebuild_rollups(db, storage)
+
+
+async def create_audit_journal(db):
+    """Create the audit table, where every change to the database is recorded."""
+    await create_audit_table(db)
+
+
+async def unique_orders(db):
+    """Merge orders of the same client, food and date, and keep them from being added twice."""
+    storage = await detect_storage(db)
+    await storage.create_order_keys(db)
+
+
+async def index_client_trigrams(db):
+    """Create the trigram index of clients, which finds clients that were added twice."""
+    await create_client_index(db)
+
+
+async def index_client_prefixes(db):
+    """Index names of clients regardless of case and phone numbers by digits, as they're searched."""
+    await create_prefix_indexes(db)
+
+
+async def track_restored_orders(db):
+    """Create the table of orders restored from the archive, which aren't archived again at once."""
+    operation = """
+                CREATE TABLE IF NOT EXISTS restored_orders (
+                    profile TEXT NOT NULL, order_id INTEGER NOT NULL,
+                    restored TEXT NOT NULL, PRIMARY KEY (profile, order_id)
+                ) WITHOUT ROWID;"""
+    await db.execute(operation)
+
+
+MIGRATIONS = (
+    create_tables,
+    index_profiles,
+    create_search_indexes,
+    cascade_deletes,
+    create_rollups,
+    create_audit_journal,
+    unique_orders,
+    index_client_trigrams,
+    index_client_prefixes,
+    track_restored_orders,
+)
+
+
+async def get_schema_version(db):
+    """Return the number of migrations applied to the database."""
+    async with db.execute("PRAGMA user_version;") as cursor:
+        (version,) = await cursor.fetchone()
+    return version
+
+
+async def migrate(db, logger):
+    """Apply migrations that haven't been applied to the database yet."""
+    version = await get_schema_version(db)
+    if version > len(MIGRATIONS):
+        raise RuntimeError(
+            f"The database schema (version {version}) is newer than the application (version {len(MIGRATIONS)})."
+        )
+
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        # Every migration is applied in a transaction of its own, together with its number
+        await db.execute("BEGIN;")
+        await migration(db)
+        await db.execute(f"PRAGMA user_version = {number};")
+        await db.commit()
+        logger.info(f"Applied database migration {number} ({migration.__name__}).")
+
+
+async def initialize_database(logger):
+    """Initialize database if it doesn't exist, or bring its schema up to date."""
+    database = get_database()
+    async with database.writer() as db:
+        await migrate(db, logger)
+
+        # Partitioning is opt-in and one-way, so a partitioned database stays partitioned
+        storage = get_config().get("database", "storage")
+        if storage == "partitioned" and not database.storage.partitioned:
+            database.storage = await partition(db, logger)
+            logger.info("Database partitioned...")
+    logger.info("Database initialized...")
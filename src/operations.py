@@ -0,0 +1,224 @@
+from audit import record
+from database import get_database
+from storage import count_orders
+
+# Changes to profiles, clients, food and orders, made in the transaction that's open on db (the
+# caller commits it). The dialogs and the server (see server.py) both make them with make(),
+# each in a transaction of its own.
+
+
+def scrub(text):
+    """Return a string with only alphanumerics, stripped of all punctuation (except underscores) and whitespace."""
+    sanitized_text = ""
+    for ch in text:
+        if not ch.isalnum() and ch != "_":
+            raise ValueError
+        sanitized_text += ch
+    return sanitized_text
+
+
+async def add_profile(db, storage, profile_name):
+    """Add a profile (its name scrubbed already)."""
+    await storage.create_profile(db, profile_name)
+    await record(db, "profile_added", profile=profile_name)
+
+
+async def delete_profile(db, storage, profile_name):
+    """Delete a profile along with its orders, return how many orders it had."""
+    source = storage.source(profile_name)
+    operation = f"SELECT count(*) FROM {source.table} {source.where()};"
+    async with db.execute(operation, source.bind()) as cursor:
+        (orders,) = await cursor.fetchone()
+    await storage.drop_profile(db, profile_name)
+    # A profile made later under the same name doesn't keep its orders from being archived
+    await db.execute("DELETE FROM restored_orders WHERE profile = (?);", (profile_name,))
+    await record(db, "profile_deleted", profile=profile_name, orders=orders)
+    return orders
+
+
+async def make(change, *args):
+    """Make a change in a transaction of its own, return its result.
+
+    A station using a server (see remote.py) has the server make it, with one request.
+    """
+    database = get_database()
+    if database.remote:
+        return await getattr(database, change.__name__)(*args)
+    async with database.writer() as db:
+        result = await change(db, database.storage, *args)
+        await db.commit()
+    return result
+
+
+async def add_client(db, storage, data):
+    """Add a client, return its id (None if a client of the same name exists already)."""
+    (first_name, last_name, address, phone_number) = data
+
+    # Check if a client with the exact first and last name already exists in the database
+    operation = """
+                SELECT
+                    first_name, last_name
+                FROM
+                    clients
+                WHERE
+                    first_name = (?)
+                    AND last_name = (?);"""
+
+    # Try to find client with the same first and last name
+    async with db.execute(operation, (first_name, last_name)) as cursor:
+        if await cursor.fetchone() is not None:
+            return None
+
+    operation = """
+                INSERT INTO clients (
+                    first_name, last_name, address, phone_number
+                )
+                VALUES
+                    (?, ?, ?, ?);"""
+    cursor = await db.execute(operation, data)
+    await record(
+        db,
+        "client_added",
+        cursor.lastrowid,
+        first_name=first_name,
+        last_name=last_name,
+        address=address,
+        phone_number=phone_number,
+    )
+    return cursor.lastrowid
+
+
+async def delete_client(db, storage, client):
+    """Delete a client along with their orders in every profile, return how many orders they had."""
+    (client_id, first_name, last_name, address, phone_number) = client
+
+    orders = await count_orders(db, storage, "client_id = (?)", client_id)
+    # Orders of the client are deleted from all profiles by the database, in the same
+    # transaction
+    operation = "DELETE FROM clients WHERE id = (?);"
+    await db.execute(operation, (client_id,))
+    await record(
+        db,
+        "client_deleted",
+        client_id,
+        first_name=first_name,
+        last_name=last_name,
+        address=address,
+        phone_number=phone_number,
+        orders=orders,
+    )
+    return orders
+
+
+async def add_food(db, storage, food_name, color=None):
+    """Add a food (with an RGB color, if any), return its id (None if it exists already)."""
+    # Check if food with the exact name already exists in the database
+    operation = """
+                SELECT
+                    food_name
+                FROM
+                    food
+                WHERE
+                    food_name = (?);"""
+
+    # Try to find food with the same name
+    async with db.execute(operation, (food_name,)) as cursor:
+        if await cursor.fetchone() is not None:
+            return None
+
+    (red_color, green_color, blue_color) = color or (None, None, None)
+    operation = """
+                INSERT INTO food (
+                    food_name, red_color, green_color,
+                    blue_color
+                )
+                VALUES
+                    (?, ?, ?, ?);"""
+    cursor = await db.execute(operation, (food_name, red_color, green_color, blue_color))
+    await record(
+        db,
+        "food_added",
+        cursor.lastrowid,
+        food_name=food_name,
+        red_color=red_color,
+        green_color=green_color,
+        blue_color=blue_color,
+    )
+    return cursor.lastrowid
+
+
+async def delete_food(db, storage, food):
+    """Delete a food along with its orders in every profile, return how many orders it had."""
+    (food_id, food_name, red_color, green_color, blue_color) = food
+
+    orders = await count_orders(db, storage, "food_id = (?)", food_id)
+    # Orders of the food are deleted from all profiles by the database, in the same
+    # transaction
+    operation = "DELETE FROM food WHERE id = (?);"
+    await db.execute(operation, (food_id,))
+    await record(
+        db,
+        "food_deleted",
+        food_id,
+        food_name=food_name,
+        red_color=red_color,
+        green_color=green_color,
+        blue_color=blue_color,
+        orders=orders,
+    )
+    return orders
+
+
+async def add_order(db, storage, profile_name, data):
+    """Add an order to a profile (adding up quantities if it exists already), return its id."""
+    (client_id, food_id, food_quantity, date) = data
+
+    source = storage.source(profile_name)
+    operation = source.upsert(("client_id", "food_id", "food_quantity", "date"))
+    operation = f"{operation[:-1]} RETURNING id, food_quantity;"
+    async with db.execute(operation, source.bind(*data)) as cursor:
+        (order_id, total_quantity) = await cursor.fetchone()
+    # Quantities are positive, so an order that existed already has grown bigger
+    event = "order_added" if total_quantity == food_quantity else "order_merged"
+    await record(
+        db,
+        event,
+        order_id,
+        profile_name,
+        client_id=client_id,
+        food_id=food_id,
+        food_quantity=food_quantity,
+        date=date,
+    )
+    return order_id
+
+
+async def add_orders(db, storage, profile_name, orders):
+    """Add orders to a profile (all of them or none, in one transaction), return their ids."""
+    return [await add_order(db, storage, profile_name, order) for order in orders]
+
+
+async def delete_order(db, storage, profile_name, order_id):
+    """Delete an order of a profile, return whether it existed."""
+    source = storage.source(profile_name)
+    operation = f"""SELECT
+                        client_id, food_id, food_quantity, date
+                    FROM
+                        {source.table}
+                    {source.where('id = (?)')};"""
+    async with db.execute(operation, source.bind(order_id)) as cursor:
+        row = await cursor.fetchone()
+    # Someone else might have deleted it in the meantime
+    if row is None:
+        return False
+
+    operation = f"DELETE FROM {source.table} {source.where('id = (?)')};"
+    await db.execute(operation, source.bind(order_id))
+    await record(
+        db,
+        "order_deleted",
+        order_id,
+        profile_name,
+        **dict(zip(("client_id", "food_id", "food_quantity", "date"), row)),
+    )
+    return True
@@ -0,0 +1,424 @@
+import bisect
+from functools import cmp_to_key
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt, QTimer
+
+from changes import get_changes
+from database import get_database
+from repository import FOOD_ID_ROLE, get_clients, get_food
+from search_index import match_query
+from tasks import run_in_background, run_task
+
+# (header label, sort expression) of every visible column
+COLUMNS = (
+    ("Prénom", "first_name"),
+    ("Nom de famille", "last_name"),
+    ("Addresse", "address"),
+    ("Numéro de téléphone", "phone_number"),
+    ("Nom de la nourriture", "food_name"),
+    ("Quantité", "food_quantity"),
+    ("Date", "date"),
+)
+
+# Position of the selected columns in a row returned by get_orders()
+ROW_INDEX = {
+    "id": 0,
+    "first_name": 1,
+    "last_name": 2,
+    "address": 3,
+    "phone_number": 4,
+    "food_name": 5,
+    "food_quantity": 6,
+    "date": 7,
+    "client_id": 8,
+    "food_id": 9,
+}
+
+DATE_COLUMN = 6
+FOOD_COLUMN = 4
+
+
+def keyset_condition(keys):
+    """Return a WHERE condition that selects the rows coming after a row in the given sort order."""
+    # (a, b) after (x, y) means: a after x, or a = x and b after y, and so on
+    conditions = []
+    for i, (expression, descending) in enumerate(keys):
+        terms = [f"{previous} = ?" for (previous, _) in keys[:i]]
+        terms.append(f"{expression} {'<' if descending else '>'} ?")
+        conditions.append(f"({' AND '.join(terms)})")
+    return " OR ".join(conditions)
+
+
+def sort_value(value):
+    """Return a value that compares in Python the way it's sorted by the database."""
+    # NULL comes first, then numbers, then text
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, value)
+
+
+class OrdersModel(QAbstractTableModel):
+    """A table model that loads orders of a profile page by page while the view scrolls."""
+
+    PAGE_SIZE = 200
+
+    def __init__(self, profile_name, parent=None):
+        super().__init__(parent)
+        self._profile_name = profile_name
+        self._orders = []
+        self._exhausted = True
+        self._sort_column = DATE_COLUMN
+        self._sort_order = Qt.DescendingOrder
+        self._search = ""
+        self._reload_task = None
+        self._fetch_task = None
+
+        # Changes are applied once per turn of the event loop, however many come in
+        self._changed = set()
+        self._stale = False
+        self._changes_timer = QTimer(self)
+        self._changes_timer.setSingleShot(True)
+        self._changes_timer.setInterval(0)
+        self._changes_timer.timeout.connect(self.apply_changes)
+
+        changes = get_changes()
+        changes.changed.connect(self.orders_changed)
+        changes.removed.connect(self.orders_removed)
+        changes.reset.connect(self.profile_reset)
+        # Orders of a deleted client or food are deleted along with it
+        get_clients().removed.connect(self.client_removed)
+        get_food().removed.connect(self.food_removed)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._orders)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][0]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        order = self._orders[index.row()]
+        column = COLUMNS[index.column()][1]
+        if role == Qt.DisplayRole:
+            return str(order[ROW_INDEX[column]])
+        # FoodDelegate paints the food in its color
+        if role == FOOD_ID_ROLE and column == "food_name":
+            return order[ROW_INDEX["food_id"]]
+        return None
+
+    def order(self, row):
+        """Return the order shown in the given row."""
+        return self._orders[row]
+
+    def sort_keys(self):
+        """Return (expression, descending) pairs that orders are sorted by."""
+        sort_column = COLUMNS[self._sort_column][1]
+        descending = self._sort_order == Qt.DescendingOrder
+        keys = [(sort_column, descending)]
+        # Orders of the same day are sorted by client, and id makes the order unique
+        keys += [
+            (column, False)
+            for column in ("first_name", "last_name")
+            if column != sort_column
+        ]
+        keys.append(("id", False))
+        return keys
+
+    def set_search(self, text):
+        """Show only orders matching the searched text (or all of them, if it's empty)."""
+        search = match_query(text)
+        if search == self._search:
+            return
+        self._search = search
+        self.reload()
+
+    async def get_orders(self, after=None, offset=0):
+        """Return the next page of orders, starting after the given order (or from the top)."""
+        if self._search:
+            return await self.get_found_orders(offset)
+
+        database = get_database()
+        source = database.storage.source(self._profile_name)
+        table = source.table
+        keys = self.sort_keys()
+        # Only id is ambiguous, since clients and food have one as well
+        expressions = [
+            (f"{table}.id" if column == "id" else column, descending)
+            for (column, descending) in keys
+        ]
+
+        conditions = []
+        values = []
+        if after is not None:
+            conditions.append(keyset_condition(expressions))
+            for i in range(len(keys)):
+                values += [after[ROW_INDEX[column]] for (column, _) in keys[: i + 1]]
+        ordering = ", ".join(
+            f"{expression} {'DESC' if descending else 'ASC'}"
+            for (expression, descending) in expressions
+        )
+
+        orders = []
+        async with database.reader() as db:
+            operation = f"""SELECT
+                                {table}.id,
+                                first_name,
+                                last_name,
+                                address,
+                                phone_number,
+                                food_name,
+                                food_quantity,
+                                date,
+                                client_id,
+                                food_id
+                            FROM
+                                {table}
+                                INNER JOIN clients ON {table}.client_id = clients.id
+                                INNER JOIN food ON {table}.food_id = food.id
+                            {source.where(*conditions)}
+                            ORDER BY
+                                {ordering}
+                            LIMIT
+                                {self.PAGE_SIZE};"""
+            async with db.execute(operation, source.bind(*values)) as cursor:
+                async for row in cursor:
+                    orders.append(row)
+        return orders
+
+    async def get_found_orders(self, offset=0):
+        """Return the next page of orders matching the search, best matches first."""
+        database = get_database()
+        source = database.storage.source(self._profile_name)
+        table = source.table
+        search = database.storage.search_table(self._profile_name)
+        # The search index has columns of the same names, so every column is qualified
+
+        orders = []
+        async with database.reader() as db:
+            operation = f"""SELECT
+                                {table}.id,
+                                clients.first_name,
+                                clients.last_name,
+                                clients.address,
+                                clients.phone_number,
+                                food.food_name,
+                                {table}.food_quantity,
+                                {table}.date,
+                                {table}.client_id,
+                                {table}.food_id
+                            FROM
+                                {search}
+                                INNER JOIN {table} ON {table}.id = {search}.rowid
+                                INNER JOIN clients ON {table}.client_id = clients.id
+                                INNER JOIN food ON {table}.food_id = food.id
+                            {source.where(f"{search} MATCH (?)")}
+                            ORDER BY
+                                rank,
+                                {table}.date DESC
+                            LIMIT
+                                {self.PAGE_SIZE}
+                            OFFSET
+                                (?);"""
+            async with db.execute(operation, source.bind(self._search, offset)) as cursor:
+                async for row in cursor:
+                    orders.append(row)
+        return orders
+
+    async def refresh(self):
+        """Reload the model from the first page."""
+        if self._fetch_task is not None:
+            self._fetch_task.cancel()
+
+        orders = await self.get_orders()
+        self.beginResetModel()
+        self._orders = orders
+        self._exhausted = len(orders) < self.PAGE_SIZE
+        self.endResetModel()
+
+    def reload(self):
+        """Reload the model in the background (once this turn of the event loop is over)."""
+        self._stale = True
+        self._changes_timer.start()
+
+    def apply_changes(self):
+        """Apply the changes that came in since the last time, reloading only when needed."""
+        self._changes_timer.stop()
+        if self._stale:
+            # Reloading shows every change, dropping a reload that's still running
+            self._stale = False
+            self._changed.clear()
+            if self._reload_task is not None:
+                self._reload_task.cancel()
+            self._reload_task = run_task(self.refresh())
+        elif self._changed:
+            ids = sorted(self._changed)
+            self._changed.clear()
+            run_in_background(self.update_orders(ids))
+
+    def orders_changed(self, profile, ids):
+        if profile != self._profile_name:
+            return
+        # Found orders are sorted by relevance, so where a changed one goes isn't known
+        if self._search:
+            self.reload()
+            return
+        self._changed.update(ids)
+        self._changes_timer.start()
+
+    def orders_removed(self, profile, ids):
+        if profile != self._profile_name:
+            return
+        self._changed.difference_update(ids)
+        ids = set(ids)
+        self.remove_rows(lambda order: order[ROW_INDEX["id"]] in ids)
+
+    def profile_reset(self, profile):
+        if profile is None or profile == self._profile_name:
+            self.reload()
+
+    def client_removed(self, id):
+        self.remove_rows(lambda order: order[ROW_INDEX["client_id"]] == id)
+
+    def food_removed(self, id):
+        self.remove_rows(lambda order: order[ROW_INDEX["food_id"]] == id)
+
+    def remove_rows(self, removed):
+        """Remove rows of the orders for which removed(order) is true."""
+        # From the bottom up, a run of adjacent rows at a time
+        row = len(self._orders) - 1
+        while row >= 0:
+            if not removed(self._orders[row]):
+                row -= 1
+                continue
+            last = row
+            while row > 0 and removed(self._orders[row - 1]):
+                row -= 1
+            self.beginRemoveRows(QModelIndex(), row, last)
+            del self._orders[row : last + 1]
+            self.endRemoveRows()
+            row -= 1
+
+    def compare_orders(self, order, other):
+        """Compare two orders in the sort order of the model."""
+        for column, descending in self.sort_keys():
+            a = sort_value(order[ROW_INDEX[column]])
+            b = sort_value(other[ROW_INDEX[column]])
+            if a != b:
+                return (1 if a > b else -1) * (-1 if descending else 1)
+        return 0
+
+    async def get_orders_by_id(self, ids):
+        """Return orders with the given ids."""
+        database = get_database()
+        source = database.storage.source(self._profile_name)
+        table = source.table
+
+        orders = []
+        async with database.reader() as db:
+            operation = f"""SELECT
+                                {table}.id,
+                                first_name,
+                                last_name,
+                                address,
+                                phone_number,
+                                food_name,
+                                food_quantity,
+                                date,
+                                client_id,
+                                food_id
+                            FROM
+                                {table}
+                                INNER JOIN clients ON {table}.client_id = clients.id
+                                INNER JOIN food ON {table}.food_id = food.id
+                            {source.where(f"{table}.id IN ({', '.join('?' * len(ids))})")};"""
+            async with db.execute(operation, source.bind(*ids)) as cursor:
+                async for row in cursor:
+                    orders.append(row)
+        return orders
+
+    async def update_orders(self, ids):
+        """Update rows of orders that have been added or changed, without reloading the rest."""
+        orders = await self.get_orders_by_id(ids)
+        # A reload that started meanwhile shows them anyway
+        if self._stale or (self._reload_task is not None and not self._reload_task.done()):
+            return
+
+        positions = {order[ROW_INDEX["id"]]: row for row, order in enumerate(self._orders)}
+        found = {order[ROW_INDEX["id"]] for order in orders}
+        # Those that are gone have been removed by someone else
+        gone = {id for id in ids if id not in found and id in positions}
+        if gone:
+            self.remove_rows(lambda order: order[ROW_INDEX["id"]] in gone)
+            positions = {order[ROW_INDEX["id"]]: row for row, order in enumerate(self._orders)}
+
+        key = cmp_to_key(self.compare_orders)
+        for order in orders:
+            row = positions.get(order[ROW_INDEX["id"]])
+            if row is not None:
+                if self.fits(row, order):
+                    self._orders[row] = order
+                    self.dataChanged.emit(
+                        self.index(row, 0), self.index(row, self.columnCount() - 1)
+                    )
+                    continue
+                # Changing the quantity moves the order, when sorted by quantity
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._orders[row]
+                self.endRemoveRows()
+
+            row = bisect.bisect_left(self._orders, key(order), key=key)
+            # Orders after the last loaded one show up with the next page
+            if row < len(self._orders) or self._exhausted:
+                self.beginInsertRows(QModelIndex(), row, row)
+                self._orders.insert(row, order)
+                self.endInsertRows()
+            positions = {order[ROW_INDEX["id"]]: row for row, order in enumerate(self._orders)}
+
+    def fits(self, row, order):
+        """Return whether an order can replace the one in the given row, keeping the sort order."""
+        if row > 0 and self.compare_orders(self._orders[row - 1], order) > 0:
+            return False
+        if row < len(self._orders) - 1 and self.compare_orders(order, self._orders[row + 1]) > 0:
+            return False
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Sorting is done by the database, since most orders aren't loaded (found orders are
+        # always sorted by relevance though)
+        if (column, order) == (self._sort_column, self._sort_order):
+            return
+        self._sort_column = column
+        self._sort_order = order
+        self.reload()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        if self._fetch_task is not None and not self._fetch_task.done():
+            return
+        self._fetch_task = run_task(self.fetch_page())
+
+    async def fetch_page(self):
+        """Append the next page of orders."""
+        if not self._orders:
+            return
+
+        orders = await self.get_orders(after=self._orders[-1], offset=len(self._orders))
+        self._exhausted = len(orders) < self.PAGE_SIZE
+        if orders:
+            start = len(self._orders)
+            self.beginInsertRows(QModelIndex(), start, start + len(orders) - 1)
+            self._orders.extend(orders)
+            self.endInsertRows()
@@ -1,47 +1,82 @@
-import asyncio
-
-import aiosqlite as sql
-from PySide6.QtGui import QColor
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtWidgets import (
     QAbstractItemView,
     QHBoxLayout,
     QHeaderView,
+    QLineEdit,
     QMessageBox,
     QPushButton,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
     QWidget,
 )
 
-from add_order_dialog import AddOrderDialog
+from changes import get_changes
+from food_style import FoodDelegate
 from logger import get_logger
+from operations import delete_order, delete_profile, make
+from orders_model import DATE_COLUMN, FOOD_COLUMN, OrdersModel
+from tasks import information, question, run_in_background, run_task
 
 
 class ProfileTab(QWidget):
     """An extra tab that shows selected profile and offers to create/delete orders and etc."""
 
+    SAMPLE_ROWS = 100
+
     def __init__(self, parent, profile_name):
         super().__init__()
         self._parent = parent
         self._profile_name = profile_name
+        self.__order_idx = None
+        self._initialize_task = None
+        # The tab stays an empty placeholder until it's needed, see load()
+        self.model = None
 
-        asyncio.run(self.delete_old_orders(), debug=False)
+    def load(self, prefetch=False):
+        """Build the tab and start loading its orders (only the first time), return the task."""
+        if self.model is not None:
+            return self._initialize_task
 
         top_bar = QHBoxLayout()
         _delete_profile = QPushButton("Supprimer le profil")
         _search = QPushButton("Recherche")
+        self._search_line_edit = QLineEdit()
+        self._search_line_edit.setPlaceholderText(
+            "Prénom, nom, addresse, téléphone ou nourriture..."
+        )
+        self._search_line_edit.setClearButtonEnabled(True)
+        self._search_line_edit.hide()
         top_bar.addWidget(_delete_profile, 4)
         top_bar.addWidget(_search, 12)
+        top_bar.addWidget(self._search_line_edit, 12)
+
+        # Search once typing pauses, rather than for every single keystroke
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(100)
 
-        self.table = QTableWidget()
+        # The model goes along with the tab, along with its connections to changes of orders
+        self.model = OrdersModel(self._profile_name, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setItemDelegateForColumn(FOOD_COLUMN, FoodDelegate(self.table))
+
+        header = self.table.horizontalHeader()
+        # Size columns after a sample of rows, not after every loaded one
+        header.setResizeContentsPrecision(self.SAMPLE_ROWS)
+        # Sorting is done by the model, so this doesn't sort anything yet
+        header.setSortIndicator(DATE_COLUMN, Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
 
         bottom_bar = QHBoxLayout()
         _add_order = QPushButton("Ajouter une commande")
+        _add_orders = QPushButton("Ajouter plusieurs commandes")
         _delete_order = QPushButton("Supprimer la commande")
         bottom_bar.addWidget(_add_order)
+        bottom_bar.addWidget(_add_orders)
         bottom_bar.addWidget(_delete_order)
 
         layout = QVBoxLayout(self)
@@ -53,12 +88,25 @@ class ProfileTab(QWidget):
 
         _delete_profile.clicked.connect(self.delete_profile)
         _search.clicked.connect(self.search)
+        self._search_line_edit.textChanged.connect(self._search_timer.start)
+        self._search_timer.timeout.connect(
+            lambda: self.model.set_search(self._search_line_edit.text())
+        )
 
         _add_order.clicked.connect(self.add_order)
+        _add_orders.clicked.connect(self.add_orders)
         _delete_order.clicked.connect(self.delete_order)
 
-        self.table.cellClicked.connect(lambda row, _: self.set_order_idx(row))
-        self.update_table()
+        self.table.clicked.connect(lambda index: self.set_order_idx(index.row()))
+        # Rows move when orders are added or removed, so the chosen one has to be chosen again
+        self.model.modelReset.connect(lambda: self.set_order_idx(None))
+        self.model.rowsInserted.connect(lambda: self.set_order_idx(None))
+        self.model.rowsRemoved.connect(lambda: self.set_order_idx(None))
+        self.model.modelReset.connect(self.resize_columns)
+        # Prefetched tabs load while the user is busy with another one, so don't show it
+        run = run_in_background if prefetch else run_task
+        self._initialize_task = run(self.model.refresh())
+        return self._initialize_task
 
     def set_order_idx(self, row):
         """Set order row index (through clicking table item)."""
@@ -70,153 +118,74 @@ class ProfileTab(QWidget):
 
     async def delete_profile_from_database(self, logger):
         """Delete a profile from the database."""
-        async with sql.connect("data.db") as db:
-            # No need to sanitize, since profile names are sanitized on creation
-            await db.execute(f"DROP TABLE IF EXISTS {self._profile_name};")
-        QMessageBox.information(
+        await make(delete_profile, self._profile_name)
+        await information(
             self,
             "Succès!",
             f"Le profil ({self._profile_name}) a été supprimé de la base de données.",
         )
         logger.info(f"Deleted table ({self._profile_name}) from the database.")
         self.close()
+        self._parent.remove_profile_tab(self._profile_name)
 
-    def delete_profile(self):
-        logger = get_logger("profile_tab.py")
-
-        question = QMessageBox.question(
+    async def confirm_profile_deletion(self, logger):
+        """Ask whether to delete the profile, then delete it."""
+        answer = await question(
             self,
             "Es-tu sûr?",
             f"Êtes-vous sûr de vouloir supprimer le profil ({self._profile_name}) de la base de données?",
-            QMessageBox.Yes | QMessageBox.No,
         )
-        if question == QMessageBox.No:
+        if answer == QMessageBox.No:
             return
 
-        asyncio.run(self.delete_profile_from_database(logger), debug=False)
+        if self._initialize_task is not None:
+            self._initialize_task.cancel()
+        # The tab itself is deleted along with the profile
+        run_task(self.delete_profile_from_database(logger), busy_widget=self._parent)
 
-        idx = self._parent._profiles.index(self._profile_name)
-        # Add 1 to account for main actions tab
-        self._parent.removeTab(idx + 1)
-        self._parent._profiles.pop(idx)
-        self._parent.actions_tab._profiles.pop(idx)
+    def delete_profile(self):
+        logger = get_logger("profile_tab.py")
+        run_task(self.confirm_profile_deletion(logger))
 
     def search(self):
-        raise NotImplementedError()
+        """Show/hide the search field; orders are filtered as the user types."""
+        if self._search_line_edit.isHidden():
+            self._search_line_edit.show()
+            self._search_line_edit.setFocus()
+            return
+
+        self._search_line_edit.hide()
+        self._search_line_edit.clear()
+        self._search_timer.stop()
+        self.model.set_search("")
 
     def update_table(self):
-        self.table.clear()
-        self._orders = asyncio.run(self.get_orders(), debug=False)
-        self.__order_idx = None
-        # Populate a table if there are any orders
-        if self._orders:
-            # Do not account for order id and food colors
-            self.table.setColumnCount(len(self._orders[0]) - 4)
-            self.table.setRowCount(len(self._orders))
-            self.table.setHorizontalHeaderLabels(
-                [
-                    "Prénom",
-                    "Nom de famille",
-                    "Addresse",
-                    "Numéro de téléphone",
-                    "Nom de la nourriture",
-                    "Quantité",
-                    "Date",
-                ]
-            )
+        """Reload the table in the background."""
+        # A tab that hasn't been loaded yet will show the changes once it is
+        if self.model is not None:
+            self.model.reload()
 
-            for row, (
-                _,
-                first_name,
-                last_name,
-                address,
-                phone_number,
-                food_name,
-                red_color,
-                green_color,
-                blue_color,
-                food_quantity,
-                date,
-            ) in enumerate(self._orders):
-                self.table.setItem(row, 0, QTableWidgetItem(first_name))
-                self.table.setItem(row, 1, QTableWidgetItem(last_name))
-                self.table.setItem(row, 2, QTableWidgetItem(address))
-                self.table.setItem(row, 3, QTableWidgetItem(phone_number))
-                self.table.setItem(row, 4, QTableWidgetItem(food_name))
-                if None not in (red_color, green_color, blue_color):
-                    rgb = (red_color, green_color, blue_color)
-                    self.table.item(row, 4).setBackground(
-                        QColor(red_color, green_color, blue_color)
-                    )
-                    self.table.item(row, 4).setForeground(
-                        self.get_foreground_color(rgb)
-                    )
-                self.table.setItem(row, 5, QTableWidgetItem(str(food_quantity)))
-                self.table.setItem(row, 6, QTableWidgetItem(date))
-
-            header = self.table.horizontalHeader()
-            header.setSectionResizeMode(QHeaderView.ResizeToContents)
-            # Add 35, lest part of the last section gets swallowed
-            self.setMinimumWidth(header.length() + 35)
-
-            header.setSectionResizeMode(2, QHeaderView.Stretch)
-        else:
-            self.table.setColumnCount(0)
-            self.table.setRowCount(0)
-            self.table.setHorizontalHeaderLabels([])
-
-    async def get_orders(self):
-        """Return a list containing 1000 last orders for current profile."""
-        orders = []
-        async with sql.connect("data.db") as db:
-            operation = f"""SELECT 
-                                {self._profile_name}.id,
-                                first_name,
-                                last_name,
-                                address,
-                                phone_number,
-                                food_name,
-                                red_color,
-                                green_color,
-                                blue_color,
-                                food_quantity,
-                                date
-                            FROM
-                                {self._profile_name}
-                                INNER JOIN clients ON {self._profile_name}.client_id = clients.id
-                                INNER JOIN food ON {self._profile_name}.food_id = food.id
-                            ORDER BY
-                                date DESC,
-                                first_name,
-                                last_name
-                            LIMIT
-                                1000;"""
-            async with db.execute(operation) as cursor:
-                async for row in cursor:
-                    orders.append(row)
-        # Return reversed list so it actually shows the early dates first
-        return orders[-1::-1]
-
-    def get_foreground_color(self, color):
-        """Return black/white color depending on calculated luminance."""
-        (red_color, green_color, blue_color) = color
-        luminance = 0.2126 * red_color + 0.7152 * green_color + 0.0722 * blue_color
-        return QColor(255, 255, 255) if luminance < 140 else QColor(0, 0, 0)
+    def resize_columns(self):
+        """Resize columns to fit their contents."""
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(2, QHeaderView.Interactive)
+        self.table.resizeColumnsToContents()
+        # Add 35, lest part of the last section gets swallowed
+        self.setMinimumWidth(header.length() + 35)
+
+        header.setSectionResizeMode(2, QHeaderView.Stretch)
 
     def add_order(self):
+        from add_order_dialog import AddOrderDialog
+
         add_order_dialog = AddOrderDialog(self)
         add_order_dialog.exec()
 
-    async def delete_old_orders(self):
-        """Delete old orders (i.e., 1 year old)."""
-        logger = get_logger("profile_tab.py")
-        async with sql.connect("data.db") as db:
-            operation = f"DELETE FROM {self._profile_name} WHERE date <= date('now', '-1 year');"
-            await db.execute(operation)
-            await db.commit()
-        logger.info(
-            f"Deleted 1 year old orders from the database for table '{self._profile_name}'."
-        )
+    def add_orders(self):
+        from batch_order_dialog import BatchOrderDialog
+
+        batch_order_dialog = BatchOrderDialog(self)
+        batch_order_dialog.exec()
 
     async def delete_order_from_database(self, logger, data):
         """Delete order from the database."""
@@ -231,11 +200,8 @@ class ProfileTab(QWidget):
             date,
         ) = data
 
-        async with sql.connect("data.db") as db:
-            operation = f"DELETE FROM {self._profile_name} WHERE id = (?);"
-            await db.execute(operation, (order_id,))
-            await db.commit()
-        QMessageBox.information(
+        await make(delete_order, self._profile_name, order_id)
+        await information(
             self,
             "Succès!",
             f"La commande ({first_name} {last_name}, {address}, {phone_number}, {food_quantity}x {food_name}, {date}) a été supprimée du profil ({self._profile_name}).",
@@ -243,6 +209,7 @@ class ProfileTab(QWidget):
         logger.info(
             f"Deleted values associated with order ({first_name}, {last_name}, {address}, {phone_number}, {food_name}, {food_quantity}, {date}) from the '{self._profile_name}' table."
         )
+        get_changes().removed.emit(self._profile_name, [order_id])
 
     def delete_order(self):
         logger = get_logger("profile_tab.py")
@@ -264,21 +231,11 @@ class ProfileTab(QWidget):
             address,
             phone_number,
             food_name,
-            _,
-            _,
-            _,
             food_quantity,
             date,
-        ) = self._orders[row]
-
-        question = QMessageBox.question(
-            self,
-            "Es-tu sûr?",
-            f"Êtes-vous sûr de vouloir supprimer la commande ({first_name} {last_name}, {address}, {phone_number}, {food_quantity}x {food_name}, {date}) ?",
-            QMessageBox.Yes | QMessageBox.No,
-        )
-        if question == QMessageBox.No:
-            return
+            _,
+            _,
+        ) = self.model.order(row)
 
         user_data = (
             order_id,
@@ -290,5 +247,18 @@ class ProfileTab(QWidget):
             food_quantity,
             date,
         )
-        asyncio.run(self.delete_order_from_database(logger, user_data), debug=False)
-        self.update_table()
+        run_task(self.confirm_order_deletion(logger, user_data))
+
+    async def confirm_order_deletion(self, logger, data):
+        """Ask whether to delete an order, then delete it."""
+        (_, first_name, last_name, address, phone_number, food_name, food_quantity, date) = data
+
+        answer = await question(
+            self,
+            "Es-tu sûr?",
+            f"Êtes-vous sûr de vouloir supprimer la commande ({first_name} {last_name}, {address}, {phone_number}, {food_quantity}x {food_name}, {date}) ?",
+        )
+        if answer == QMessageBox.No:
+            return
+
+        run_task(self.delete_order_from_database(logger, data), busy_widget=self)
@@ -0,0 +1,271 @@
+# Runs operations on the database from the command line, without starting the application (and
+# without importing PySide6), so that they can be scheduled on a server without a display:
+#
+#     python -m pyfncm migrate
+#     python -m pyfncm import clients clients.csv
+#     python -m pyfncm export orders orders.csv --profile Cuisine
+#     python -m pyfncm report food_per_day report.csv --start 2024-01-01
+#     python -m pyfncm retention run
+#     python -m pyfncm retention restore Cuisine --start 2023-01-01 --end 2023-12-31
+#     python -m pyfncm rollups verify
+#     python -m pyfncm audit client 42 --sealed
+#     python -m pyfncm vacuum
+#     python -m pyfncm list orders Cuisine --limit 20
+#     python -m pyfncm serve --host 0.0.0.0
+#
+# The database is brought up to date before every command, as it is when the application starts
+# (unless config.ini gives a server, which does it instead).
+
+import argparse
+import asyncio
+import csv
+import json
+import sys
+
+from audit import EVENTS, find_events, read_segments
+from config import get_config, get_directory
+from database import get_database
+from exporter import EXPORTS, export_csv, stream_export
+from importer import COLUMNS, DUPLICATES, import_csv
+from logger import get_logger
+from migrations import initialize_database
+from reports import FORMATS, REPORTS, export_report
+from rollups import rebuild_rollups, verify_rollups
+
+
+async def migrate(args):
+    print(f"Database ({get_config().get('database', 'path')}) is up to date.")
+
+
+async def import_file(args):
+    report = await import_csv(
+        args.kind,
+        args.path,
+        args.profile,
+        args.on_duplicate,
+        progress=lambda report: print(f"{report}...", flush=True),
+    )
+    print(f"{report}.")
+    if report.errors_path is not None:
+        print(f"Rejected rows were written to {report.errors_path}.")
+
+
+async def export_file(args):
+    count = await export_csv(args.kind, args.path, args.profile, args.start, args.end)
+    print(f"{count} {args.kind} written to {args.path}.")
+
+
+async def report(args):
+    count = await export_report(
+        args.report, args.path, args.format, args.profile, args.start, args.end
+    )
+    print(f"{count} rows written to {args.path}.")
+
+
+async def run_retention(args):
+    # Only archiving needs the archive's compression
+    from retention import get_retention
+
+    # Unlike at startup, there's nothing to wait for
+    archived = await get_retention().run()
+    print(f"{archived} orders archived.")
+
+
+async def list_archive(args):
+    from retention import ARCHIVED_COLUMNS, read_archive
+
+    header = ("profile", *ARCHIVED_COLUMNS, "archived")
+    orders = await asyncio.to_thread(read_archive, None, args.profile, args.start, args.end)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(header)
+    for order in orders[: args.limit]:
+        writer.writerow([order[column] for column in header])
+
+
+async def restore_archive(args):
+    from retention import restore_orders
+
+    restored = await restore_orders(args.profile, args.start, args.end)
+    print(f"{restored} orders restored into {args.profile}.")
+
+
+async def check_rollups(args):
+    database = get_database()
+    async with database.writer() as db:
+        if args.action == "rebuild":
+            await db.execute("BEGIN;")
+            await rebuild_rollups(db, database.storage)
+            await db.commit()
+            print("Rollups rebuilt.")
+        mismatches = await verify_rollups(db, database.storage)
+    for rollup, count in mismatches.items():
+        print(f"{rollup}: {count} mismatching rows")
+    if any(mismatches.values()):
+        raise SystemExit(1)
+
+
+async def list_events(args):
+    events = {
+        event["id"]: event
+        for event in await find_events(args.entity, args.id, args.profile, args.start, args.end)
+    }
+    if args.sealed:
+        directory = get_directory("audit")
+        for event in read_segments(directory, args.entity, args.id, args.profile):
+            if (args.start is None or event["time"] >= args.start) and (
+                args.end is None or event["time"] < args.end
+            ):
+                events.setdefault(event["id"], event)
+    for event in sorted(events.values(), key=lambda event: (event["time"], event["id"])):
+        print(json.dumps(event, ensure_ascii=False))
+
+
+async def vacuum(args):
+    await get_database().vacuum()
+    print("Database vacuumed.")
+
+
+async def list_profiles(args):
+    database = get_database()
+    async with database.reader() as db:
+        for profile in await database.storage.list_profiles(db):
+            print(profile)
+
+
+async def list_orders(args):
+    writer = csv.writer(sys.stdout)
+    rows = stream_export("orders", args.profile, args.start, args.end)
+    writer.writerow(await anext(rows))
+    count = 0
+    async for row in rows:
+        if args.limit is not None and count == args.limit:
+            break
+        writer.writerow(row)
+        count += 1
+    await rows.aclose()
+
+
+async def serve(args):
+    # Only the server needs its routes
+    from server import serve as serve_database
+
+    config = get_config()
+    if config.get("database", "server"):
+        raise ValueError("The database is served already (see server in config.ini).")
+    host = args.host or config.get("server", "host")
+    port = config.getint("server", "port") if args.port is None else args.port
+
+    def started(host, port):
+        print(f"Serving the database on http://{host}:{port}.", flush=True)
+
+    await serve_database(host, port, started)
+
+
+def make_parser():
+    """Return the parser of the command line, every command calling back a coroutine of its own."""
+    parser = argparse.ArgumentParser(
+        prog="pyfncm", description="Python Food and Clientèle Manager, without its window."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser(
+        "migrate", aliases=["init"], help="create the database, or bring its schema up to date"
+    )
+    command.set_defaults(run=migrate)
+
+    command = commands.add_parser("import", help="import clients, food or orders from CSV")
+    command.add_argument("kind", choices=COLUMNS)
+    command.add_argument("path")
+    command.add_argument("--profile", help="profile of imported orders")
+    command.add_argument("--on-duplicate", choices=DUPLICATES, default="skip")
+    command.set_defaults(run=import_file)
+
+    command = commands.add_parser("export", help="export clients, food or orders into CSV")
+    command.add_argument("kind", choices=EXPORTS)
+    command.add_argument("path")
+    command.add_argument("--profile", help="profile of exported orders")
+    command.add_argument("--start", help="first date of orders (YYYY-MM-DD)")
+    command.add_argument("--end", help="last date of orders (YYYY-MM-DD)")
+    command.set_defaults(run=export_file)
+
+    command = commands.add_parser("report", help="export a report of orders")
+    command.add_argument("report", choices=REPORTS)
+    command.add_argument("path")
+    command.add_argument("--format", choices=FORMATS)
+    command.add_argument("--profile")
+    command.add_argument("--start", help="first date (YYYY-MM-DD)")
+    command.add_argument("--end", help="last date (YYYY-MM-DD)")
+    command.set_defaults(run=report)
+
+    command = commands.add_parser("retention", help="archive expired orders, or restore them")
+    actions = command.add_subparsers(dest="action", required=True)
+    action = actions.add_parser("run", help="archive orders older than the retention window")
+    action.set_defaults(run=run_retention)
+    action = actions.add_parser("list", help="print archived orders as CSV")
+    action.add_argument("--profile")
+    action.add_argument("--start", help="first date (YYYY-MM-DD)")
+    action.add_argument("--end", help="last date (YYYY-MM-DD)")
+    action.add_argument("--limit", type=int, help="print at most this many orders")
+    action.set_defaults(run=list_archive)
+    action = actions.add_parser("restore", help="put archived orders back into a profile")
+    action.add_argument("profile")
+    action.add_argument("--start", help="first date (YYYY-MM-DD)")
+    action.add_argument("--end", help="last date (YYYY-MM-DD)")
+    action.set_defaults(run=restore_archive)
+
+    command = commands.add_parser("rollups", help="verify or rebuild the rollups of orders")
+    command.add_argument("action", choices=("verify", "rebuild"))
+    command.set_defaults(run=check_rollups)
+
+    command = commands.add_parser(
+        "audit", help="show what happened to a client, food, order or profile"
+    )
+    command.add_argument("entity", choices=sorted({entity for (entity, _) in EVENTS.values()}))
+    command.add_argument("id", nargs="?", type=int, help="id of the client, food or order")
+    command.add_argument("--profile", help="profile of orders")
+    command.add_argument("--start", help="from this time (ISO 8601, UTC)")
+    command.add_argument("--end", help="until this time (ISO 8601, UTC)")
+    command.add_argument("--sealed", action="store_true", help="search the segments as well")
+    command.set_defaults(run=list_events)
+
+    command = commands.add_parser("vacuum", help="give back the space of deleted rows")
+    command.set_defaults(run=vacuum)
+
+    command = commands.add_parser("list", help="list profiles or orders of a profile")
+    actions = command.add_subparsers(dest="what", required=True)
+    action = actions.add_parser("profiles")
+    action.set_defaults(run=list_profiles)
+    action = actions.add_parser("orders", help="print orders of a profile as CSV")
+    action.add_argument("profile")
+    action.add_argument("--start", help="first date (YYYY-MM-DD)")
+    action.add_argument("--end", help="last date (YYYY-MM-DD)")
+    action.add_argument("--limit", type=int, help="print at most this many orders")
+    action.set_defaults(run=list_orders)
+
+    command = commands.add_parser("serve", help="serve the database to stations over the network")
+    command.add_argument("--host", help="address to listen on")
+    command.add_argument("--port", type=int, help="port to listen on (0 for any free port)")
+    command.set_defaults(run=serve)
+    return parser
+
+
+if __name__ == "__main__":
+    """Run a command on the database."""
+    parser = make_parser()
+    args = parser.parse_args()
+
+    async def main():
+        try:
+            # A server brings the database up to date when it starts
+            if args.run is not serve and not get_database().remote:
+                await initialize_database(get_logger("pyfncm.py"))
+            await args.run(args)
+        finally:
+            await get_database().close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
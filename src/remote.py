@@ -0,0 +1,259 @@
+import asyncio
+import http.client
+import itertools
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import quote, urlsplit
+
+from storage import detect_storage
+
+# Fields of clients, food and orders sent to the server, in the order operations.py gives them
+CLIENT_COLUMNS = ("first_name", "last_name", "address", "phone_number")
+FOOD_COLUMNS = ("food_name", "red_color", "green_color", "blue_color")
+ORDER_COLUMNS = ("client_id", "food_id", "food_quantity", "date")
+
+# A database served by server.py, used the way a Database (see database.py) is. Readers run SQL
+# statements on the server, which owns data.db, so that stations don't share the file over the
+# network; the server only lets them read. Changes (see operations.py) are made by the server,
+# each with one request to its endpoints, in a transaction that ends with the request. Every
+# connection keeps one HTTP connection to the server open, and makes requests from a thread of
+# its own (as aiosqlite does with SQLite), since the event loop of Qt can't open sockets.
+
+
+class RemoteCursor:
+    """Rows (all of them) and counts returned for a statement, read like those of aiosqlite."""
+
+    def __init__(self, result):
+        self._rows = [tuple(row) for row in result["rows"]]
+        self._next = 0
+        self.rowcount = result["rowcount"]
+        self.lastrowid = result["lastrowid"]
+
+    async def fetchone(self):
+        if self._next == len(self._rows):
+            return None
+        self._next += 1
+        return self._rows[self._next - 1]
+
+    async def fetchall(self):
+        rows = self._rows[self._next :]
+        self._next = len(self._rows)
+        return rows
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        row = await self.fetchone()
+        if row is None:
+            raise StopAsyncIteration
+        return row
+
+    async def close(self):
+        pass
+
+
+class RemoteResult:
+    """A statement, run once awaited (returning its cursor) or entered with "async with"."""
+
+    def __init__(self, coroutine):
+        self._coroutine = coroutine
+
+    def __await__(self):
+        return self._coroutine.__await__()
+
+    async def __aenter__(self):
+        return await self._coroutine
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+class RemoteConnection:
+    """A connection making requests to the server, one at a time, from its own thread."""
+
+    def __init__(self, url, token):
+        self._url = urlsplit(url)
+        self._token = token
+        self._connection = None
+        self._thread = ThreadPoolExecutor(max_workers=1)
+
+    def _request(self, method, path, body):
+        """Send a request and return its status and JSON response (in the connection's thread)."""
+        if self._connection is None:
+            self._connection = http.client.HTTPConnection(
+                self._url.hostname, self._url.port or 80, timeout=60
+            )
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self._token}",
+        }
+        try:
+            self._connection.request(
+                method, path, None if body is None else json.dumps(body), headers
+            )
+            response = self._connection.getresponse()
+            content = json.loads(response.read() or b"{}")
+        except (OSError, http.client.HTTPException):
+            # A new connection is opened for the next request
+            self._connection.close()
+            self._connection = None
+            raise
+        return (response.status, content)
+
+    async def request(self, method, path, body=None, expected=(200, 201)):
+        """Send a request, return its status (one of those expected) and its JSON response."""
+        loop = asyncio.get_running_loop()
+        (status, content) = await loop.run_in_executor(
+            self._thread, self._request, method, quote(path), body
+        )
+        if status not in expected:
+            # Errors of SQLite are raised as they would be by a local database
+            error = getattr(sqlite3, content.get("type", ""), sqlite3.DatabaseError)
+            if not (isinstance(error, type) and issubclass(error, sqlite3.Error)):
+                error = sqlite3.DatabaseError
+            raise error(content.get("error", f"The server answered with {status}."))
+        return (status, content)
+
+    async def _execute(self, operation, parameters):
+        body = {"operation": operation, "parameters": list(parameters)}
+        (_, content) = await self.request("POST", "/sql", body)
+        return RemoteCursor(content)
+
+    def execute(self, operation, parameters=()):
+        return RemoteResult(self._execute(operation, parameters))
+
+    async def close(self):
+        if self._connection is not None:
+            await asyncio.get_running_loop().run_in_executor(self._thread, self._connection.close)
+        self._thread.shutdown(wait=False)
+
+
+class RemoteDatabase:
+    """A database served by server.py, with a few readers, that makes changes with requests."""
+
+    # Unlike a Database, the database is brought up to date (and orders are archived) by the server
+    remote = True
+
+    def __init__(self, url, token, readers=2):
+        self.url = url
+        self._token = token
+        self._reader_count = max(readers, 1)
+        self._changes = None
+        self._readers = []
+        self._next_reader = None
+        self._open_lock = asyncio.Lock()
+        self.storage = None
+
+    async def open(self):
+        """Find out how orders are laid out, the first time the database is used."""
+        if self._changes is not None:
+            return
+
+        async with self._open_lock:
+            if self._changes is not None:
+                return
+
+            changes = RemoteConnection(self.url, self._token)
+            self._readers = [
+                RemoteConnection(self.url, self._token) for _ in range(self._reader_count)
+            ]
+            self._next_reader = itertools.cycle(self._readers)
+            self.storage = await detect_storage(self._readers[0])
+            self._changes = changes
+
+    async def close(self):
+        """Close the connections to the server."""
+        if self._changes is None:
+            return
+
+        for connection in (self._changes, *self._readers):
+            await connection.close()
+        self._changes = None
+        self._readers = []
+        self._next_reader = None
+
+    async def request(self, method, path, body=None, expected=(200, 201)):
+        """Have the server make a change, return the status and JSON response."""
+        await self.open()
+        return await self._changes.request(method, path, body, expected)
+
+    async def vacuum(self):
+        """Have the server vacuum the database."""
+        await self.request("POST", "/vacuum")
+
+    @asynccontextmanager
+    async def reader(self):
+        """Yield a read-only connection."""
+        await self.open()
+        yield next(self._next_reader)
+
+    def writer(self):
+        """Refuse to write, as only the server writes into the database it serves."""
+        raise ValueError(f"The database is served by {self.url}, run this on the server instead.")
+
+    # Changes of operations.py (see make()), made by the server
+
+    async def add_profile(self, profile_name):
+        await self.request("POST", "/profiles", {"name": profile_name})
+
+    async def delete_profile(self, profile_name):
+        (_, content) = await self.request("DELETE", f"/profiles/{profile_name}")
+        return content["orders"]
+
+    async def add_client(self, data):
+        body = dict(zip(CLIENT_COLUMNS, data))
+        (status, content) = await self.request("POST", "/clients", body, expected=(201, 409))
+        return content["id"] if status == 201 else None
+
+    async def delete_client(self, client):
+        (_, content) = await self.request("DELETE", f"/clients/{client[0]}")
+        return content["orders"]
+
+    async def add_food(self, food_name, color=None):
+        body = dict(zip(FOOD_COLUMNS, (food_name, *(color or ("", "", "")))))
+        (status, content) = await self.request("POST", "/food", body, expected=(201, 409))
+        return content["id"] if status == 201 else None
+
+    async def delete_food(self, food):
+        (_, content) = await self.request("DELETE", f"/food/{food[0]}")
+        return content["orders"]
+
+    async def add_order(self, profile_name, data):
+        (order_id,) = await self.add_orders(profile_name, [data])
+        return order_id
+
+    async def add_orders(self, profile_name, orders):
+        body = [dict(zip(ORDER_COLUMNS, order)) for order in orders]
+        (_, content) = await self.request("POST", f"/profiles/{profile_name}/orders", body)
+        return content["ids"]
+
+    async def delete_order(self, profile_name, order_id):
+        path = f"/profiles/{profile_name}/orders/{order_id}"
+        (status, _) = await self.request("DELETE", path, expected=(200, 404))
+        return status == 200
+
+    async def merge_clients(self, kept_id, merged_ids):
+        body = {"merged_ids": list(merged_ids)}
+        (_, content) = await self.request("POST", f"/clients/{kept_id}/merge", body)
+        return content["orders"]
+
+    async def restore_orders(self, profile_name, start=None, end=None):
+        body = {"start": start, "end": end}
+        (_, content) = await self.request("POST", f"/profiles/{profile_name}/restore", body)
+        return content["restored"]
+
+    async def import_batch(self, importer, batch):
+        """Have the server import a batch of rows (see Importer), return what happened to them."""
+        body = {
+            "kind": importer.kind,
+            "profile": importer.profile,
+            "on_duplicate": importer.on_duplicate,
+            "path": os.path.abspath(importer.path),
+            "rows": batch,
+        }
+        (_, content) = await self.request("POST", "/import", body)
+        return content
@@ -0,0 +1,106 @@
+from PySide6.QtCore import QDate, Qt
+from PySide6.QtWidgets import (
+    QCheckBox,
+    QComboBox,
+    QDateEdit,
+    QDialog,
+    QDialogButtonBox,
+    QFileDialog,
+    QFormLayout,
+    QHBoxLayout,
+    QVBoxLayout,
+)
+
+from reports import REPORTS, export_report
+from tasks import information, run_task
+
+
+class ReportDialog(QDialog):
+    """A dialog to export a report of orders into a file."""
+
+    def __init__(self, profiles):
+        super().__init__()
+        self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
+
+        self._report_combo_box = QComboBox()
+        for name, (title, _, _) in REPORTS.items():
+            self._report_combo_box.addItem(title, name)
+
+        self._profile_combo_box = QComboBox()
+        self._profile_combo_box.addItem("Tous les profils", None)
+        for profile in profiles:
+            self._profile_combo_box.addItem(profile, profile)
+
+        self._period_check_box = QCheckBox("&Période:")
+        self._start_date_edit = QDateEdit(QDate.currentDate().addYears(-1))
+        self._end_date_edit = QDateEdit(QDate.currentDate())
+        period = QHBoxLayout()
+        for date_edit in (self._start_date_edit, self._end_date_edit):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+            date_edit.setEnabled(False)
+            period.addWidget(date_edit)
+
+        self._format_combo_box = QComboBox()
+        self._format_combo_box.addItem("CSV (*.csv)", "csv")
+        self._format_combo_box.addItem("JSON Lines (*.jsonl)", "jsonl")
+
+        form_layout = QFormLayout()
+        form_layout.addRow("&Rapport:", self._report_combo_box)
+        form_layout.addRow("P&rofil:", self._profile_combo_box)
+        form_layout.addRow(self._period_check_box, period)
+        form_layout.addRow("&Format:", self._format_combo_box)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(form_layout)
+        layout.addWidget(button_box)
+
+        height = layout.totalMinimumSize().height()
+        self.setFixedHeight(height)
+        self.setFixedWidth(512)
+
+        self._period_check_box.toggled.connect(self._start_date_edit.setEnabled)
+        self._period_check_box.toggled.connect(self._end_date_edit.setEnabled)
+
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+    async def export(self, path, options):
+        """Export the chosen report into a file."""
+        count = await export_report(path=path, **options)
+        await information(
+            self,
+            "Succès!",
+            f"Le rapport ({count} lignes) a été enregistré dans le fichier ({path}).",
+        )
+        self.close()
+
+    def accept(self):
+        format = self._format_combo_box.currentData()
+        (path, _) = QFileDialog.getSaveFileName(
+            self,
+            "Enregistrer le rapport",
+            f"{self._report_combo_box.currentData()}.{format}",
+            self._format_combo_box.currentText(),
+        )
+        if not path:
+            return
+
+        options = {
+            "name": self._report_combo_box.currentData(),
+            "format": format,
+            "profile": self._profile_combo_box.currentData(),
+            "start": None,
+            "end": None,
+        }
+        if self._period_check_box.isChecked():
+            options["start"] = self._start_date_edit.date().toString(Qt.DateFormat.ISODate)
+            options["end"] = self._end_date_edit.date().toString(Qt.DateFormat.ISODate)
+
+        run_task(
+            self.export(path, options),
+            busy_widget=self,
+            label="Génération du rapport...",
+        )
@@ -0,0 +1,192 @@
+import csv
+import json
+import os
+
+from database import get_database
+from logger import get_logger
+
+# Every report is (title, header, SELECT statement over "all_orders" of all profiles). Rows are
+# aggregated by the database and streamed from it, so a report never has to fit into memory.
+REPORTS = {
+    "food_per_day": (
+        "Quantités par nourriture et par jour",
+        ("date", "food_id", "food_name", "orders", "food_quantity"),
+        """SELECT
+               date,
+               food_id,
+               food_name,
+               count(*),
+               sum(food_quantity)
+           FROM
+               all_orders
+               INNER JOIN food ON all_orders.food_id = food.id
+           {condition}
+           GROUP BY
+               date, food_id
+           ORDER BY
+               date, food_name""",
+    ),
+    "client_per_month": (
+        "Quantités par client et par mois",
+        (
+            "month",
+            "client_id",
+            "first_name",
+            "last_name",
+            "address",
+            "phone_number",
+            "orders",
+            "food_quantity",
+        ),
+        """SELECT
+               substr(date, 1, 7) AS month,
+               client_id,
+               first_name,
+               last_name,
+               address,
+               phone_number,
+               count(*),
+               sum(food_quantity)
+           FROM
+               all_orders
+               INNER JOIN clients ON all_orders.client_id = clients.id
+           {condition}
+           GROUP BY
+               month, client_id
+           ORDER BY
+               month, last_name, first_name, client_id""",
+    ),
+    "profile": (
+        "Quantités par profil",
+        (
+            "profile",
+            "orders",
+            "clients",
+            "food_quantity",
+            "first_date",
+            "last_date",
+        ),
+        """SELECT
+               profile,
+               count(*),
+               count(DISTINCT client_id),
+               sum(food_quantity),
+               min(date),
+               max(date)
+           FROM
+               all_orders
+           {condition}
+           GROUP BY
+               profile
+           ORDER BY
+               profile""",
+    ),
+}
+
+# Reports that can be read from the rollups instead, as (SELECT statement, whether it can be
+# filtered by profile)
+ROLLUP_REPORTS = {
+    "food_per_day": (
+        """SELECT
+               date,
+               food_id,
+               food_name,
+               sum(orders),
+               sum(food_rollup.food_quantity)
+           FROM
+               food_rollup
+               INNER JOIN food ON food_rollup.food_id = food.id
+           {condition}
+           GROUP BY
+               date, food_id
+           ORDER BY
+               date, food_name""",
+        True,
+    ),
+    "client_per_month": (
+        """SELECT
+               substr(date, 1, 7) AS month,
+               client_id,
+               first_name,
+               last_name,
+               address,
+               phone_number,
+               sum(orders),
+               sum(food_quantity)
+           FROM
+               client_rollup
+               INNER JOIN clients ON client_rollup.client_id = clients.id
+           {condition}
+           GROUP BY
+               month, client_id
+           ORDER BY
+               month, last_name, first_name, client_id""",
+        False,
+    ),
+}
+
+FORMATS = ("csv", "jsonl")
+
+
+async def stream_report(name, profile=None, start=None, end=None):
+    """Yield the header, then rows of a report (of a profile, between two dates inclusive)."""
+    (_, header, query) = REPORTS[name]
+
+    conditions = []
+    values = []
+    if profile is not None:
+        conditions.append("profile = (?)")
+        values.append(profile)
+    if start is not None:
+        conditions.append("date >= (?)")
+        values.append(start)
+    if end is not None:
+        conditions.append("date <= (?)")
+        values.append(end)
+    condition = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    database = get_database()
+    async with database.reader() as db:
+        (rollup_query, by_profile) = ROLLUP_REPORTS.get(name, (None, False))
+        if rollup_query is not None and (profile is None or by_profile):
+            operation = f"{rollup_query.format(condition=condition)};"
+        else:
+            # Orders of all profiles are named "all_orders", whatever the storage
+            operation = f"""WITH all_orders AS ({await database.storage.all_orders(db)})
+                            {query.format(condition=condition)};"""
+        yield header
+        async with db.execute(operation, values) as cursor:
+            async for row in cursor:
+                yield row
+
+
+async def export_report(name, path, format=None, profile=None, start=None, end=None):
+    """Write a report into a CSV or JSON Lines file, return the number of its rows."""
+    logger = get_logger("reports.py")
+    if format is None:
+        format = "jsonl" if path.endswith(".jsonl") else "csv"
+    if format not in FORMATS:
+        raise ValueError(f"Unknown report format ({format}).")
+
+    count = 0
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            rows = stream_report(name, profile, start, end)
+            header = await anext(rows)
+            if format == "csv":
+                writer = csv.writer(file)
+                writer.writerow(header)
+                async for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            else:
+                async for row in rows:
+                    file.write(json.dumps(dict(zip(header, row)), ensure_ascii=False) + "\n")
+                    count += 1
+    except BaseException:
+        # Don't leave half of a report behind (e.g., when it has been cancelled)
+        os.remove(path)
+        raise
+
+    logger.info(f"Exported '{name}' report ({count} rows) into '{path}'.")
+    return count
@@ -0,0 +1,217 @@
+import asyncio
+
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, QObject, Qt, Signal
+
+from database import get_database
+from tasks import run_in_background
+
+# Models showing food give its id in this role, and FoodDelegate (see food_style.py) paints it
+# in its color
+FOOD_ID_ROLE = Qt.UserRole
+
+_clients = None
+_food = None
+
+
+class Repository(QObject):
+    """Rows of a table kept in memory, indexed by id, loaded from the database only once.
+
+    Dialogs that change the table tell the repository, which passes the change on to
+    the models showing its rows.
+    """
+
+    # A row has been added (or changed), a row (by id) has been removed, every row has been
+    # forgotten
+    added = Signal(object)
+    removed = Signal(int)
+    reset = Signal()
+
+    def __init__(self, table, columns):
+        super().__init__()
+        self.table = table
+        self.columns = columns
+        self._rows = None
+        self._stale = False
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        """Load the rows from the database (unless they're loaded already)."""
+        async with self._lock:
+            while self._rows is None:
+                # A change made while loading might be missing from what's been read
+                self._stale = False
+                operation = f"SELECT {', '.join(self.columns)} FROM {self.table} ORDER BY id;"
+                async with get_database().reader() as db:
+                    async with db.execute(operation) as cursor:
+                        rows = {row[0]: row for row in await cursor.fetchall()}
+                if not self._stale:
+                    self._rows = rows
+
+    async def rows(self):
+        """Return a list of the rows, ordered by id."""
+        await self.load()
+        return list(self._rows.values())
+
+    async def get(self, id):
+        """Return the row with the given id (None if there's none)."""
+        await self.load()
+        return self._rows.get(id)
+
+    def put(self, row):
+        """Add a row that's been committed to the database (or replace it, if it's changed)."""
+        if self._rows is None:
+            self._stale = True
+            return
+        self._rows[row[0]] = row
+        self.added.emit(row)
+
+    def remove(self, id):
+        """Remove the row with the given id, once it's been deleted from the database."""
+        if self._rows is None:
+            self._stale = True
+        else:
+            self._rows.pop(id, None)
+        # Orders shown in profiles go with it, even while the repository isn't loaded
+        self.removed.emit(id)
+
+    async def reload_row(self, id):
+        """Read a row from the database again, after it's been changed by another station."""
+        operation = f"SELECT {', '.join(self.columns)} FROM {self.table} WHERE id = (?);"
+        async with get_database().reader() as db:
+            async with db.execute(operation, (id,)) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            self.remove(id)
+        else:
+            self.put(row)
+
+    def invalidate(self):
+        """Forget every row, after too many of them have changed (by an import, for instance)."""
+        self._rows = None
+        self._stale = True
+        self.reset.emit()
+
+
+def get_clients():
+    """Return the repository of clients."""
+    global _clients
+    if _clients is None:
+        _clients = Repository(
+            "clients", ("id", "first_name", "last_name", "address", "phone_number")
+        )
+    return _clients
+
+
+def get_food():
+    """Return the repository of food."""
+    global _food
+    if _food is None:
+        _food = Repository(
+            "food", ("id", "food_name", "red_color", "green_color", "blue_color")
+        )
+    return _food
+
+
+async def load_repositories():
+    """Load clients and food, so that dialogs showing them open right away."""
+    await get_clients().load()
+    await get_food().load()
+
+
+class RepositoryModel(QAbstractTableModel):
+    """A table model showing the rows of a repository, that follows its changes."""
+
+    def __init__(self, repository, headers, parent=None):
+        super().__init__(parent)
+        self._repository = repository
+        self._headers = headers
+        self._rows = []
+
+        repository.added.connect(self.add_row)
+        repository.removed.connect(self.remove_row)
+        repository.reset.connect(self.reload)
+
+    async def load(self):
+        """Load the rows of the repository."""
+        rows = await self._repository.rows()
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def reload(self):
+        """Load the rows again, after the repository has forgotten them."""
+        run_in_background(self.load())
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._headers[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        # The id comes first in a row, but isn't shown
+        if role == Qt.DisplayRole:
+            return self._rows[index.row()][index.column() + 1]
+        return None
+
+    def row(self, row):
+        """Return the repository's row shown in the given row."""
+        return self._rows[row]
+
+    def find(self, id):
+        """Return the position of the row with the given id (None if it isn't shown)."""
+        for position, row in enumerate(self._rows):
+            if row[0] == id:
+                return position
+        return None
+
+    def add_row(self, row):
+        position = self.find(row[0])
+        if position is not None:
+            self._rows[position] = row
+            self.dataChanged.emit(
+                self.index(position, 0), self.index(position, self.columnCount() - 1)
+            )
+            return
+        # New ids are the greatest ones, so the rows stay ordered by id
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows))
+        self._rows.append(row)
+        self.endInsertRows()
+
+    def remove_row(self, id):
+        position = self.find(id)
+        if position is None:
+            return
+        self.beginRemoveRows(QModelIndex(), position, position)
+        del self._rows[position]
+        self.endRemoveRows()
+
+
+class ClientsModel(RepositoryModel):
+    """A table model showing clients."""
+
+    def __init__(self, parent=None):
+        super().__init__(
+            get_clients(),
+            ["Prénom", "Nom de famille", "Addresse", "Numéro de téléphone"],
+            parent,
+        )
+
+
+class FoodModel(RepositoryModel):
+    """A table model showing food, which FoodDelegate (see food_style.py) paints in its color."""
+
+    def __init__(self, parent=None):
+        super().__init__(get_food(), ["Nom de la nourriture"], parent)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role == FOOD_ID_ROLE:
+            return self._rows[index.row()][0]
+        return super().data(index, role)
@@ -0,0 +1,97 @@
+from PySide6.QtCore import QDate, Qt
+from PySide6.QtWidgets import (
+    QCheckBox,
+    QComboBox,
+    QDateEdit,
+    QDialog,
+    QDialogButtonBox,
+    QFormLayout,
+    QHBoxLayout,
+    QMessageBox,
+    QVBoxLayout,
+)
+
+from changes import get_changes
+from logger import get_logger
+from tasks import information, run_task
+
+
+class RestoreDialog(QDialog):
+    """A dialog to put archived orders back into a profile."""
+
+    def __init__(self, profiles):
+        super().__init__()
+        self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
+
+        self._profile_combo_box = QComboBox()
+        for profile in profiles:
+            self._profile_combo_box.addItem(profile, profile)
+
+        self._period_check_box = QCheckBox("&Période:")
+        self._start_date_edit = QDateEdit(QDate.currentDate().addYears(-2))
+        self._end_date_edit = QDateEdit(QDate.currentDate().addYears(-1))
+        period = QHBoxLayout()
+        for date_edit in (self._start_date_edit, self._end_date_edit):
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+            date_edit.setEnabled(False)
+            period.addWidget(date_edit)
+
+        form_layout = QFormLayout()
+        form_layout.addRow("P&rofil:", self._profile_combo_box)
+        form_layout.addRow(self._period_check_box, period)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+
+        layout = QVBoxLayout(self)
+        layout.addLayout(form_layout)
+        layout.addWidget(button_box)
+
+        height = layout.totalMinimumSize().height()
+        self.setFixedHeight(height)
+        self.setFixedWidth(512)
+
+        self._period_check_box.toggled.connect(self._start_date_edit.setEnabled)
+        self._period_check_box.toggled.connect(self._end_date_edit.setEnabled)
+
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+
+    async def restore(self, logger, profile, start, end):
+        """Restore archived orders of a profile."""
+        # Only restoring needs the archive's compression
+        from retention import restore_orders
+
+        restored = await restore_orders(profile, start, end)
+        await information(
+            self,
+            "Succès!",
+            f"Les commandes archivées ({restored}) ont été restaurées dans le profil ({profile}).",
+        )
+        logger.info(f"Restored {restored} archived orders into the '{profile}' table.")
+        self.close()
+        get_changes().reset.emit(profile)
+
+    def accept(self):
+        logger = get_logger("restore_dialog.py")
+
+        profile = self._profile_combo_box.currentData()
+        if profile is None:
+            QMessageBox.warning(
+                self,
+                "Une erreur s'est produite!",
+                "Veuillez choisir le profil dans lequel restaurer les commandes archivées.",
+            )
+            logger.warn("The profile to restore orders into has not been chosen; choose one.")
+            return
+
+        (start, end) = (None, None)
+        if self._period_check_box.isChecked():
+            start = self._start_date_edit.date().toString(Qt.DateFormat.ISODate)
+            end = self._end_date_edit.date().toString(Qt.DateFormat.ISODate)
+
+        run_task(
+            self.restore(logger, profile, start, end),
+            busy_widget=self,
+            label="Restauration des commandes archivées...",
+        )
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import aiosqlite as sql
+import zstandard
+
+from audit import record
+from config import get_config, get_directory
+from database import get_database
+from logger import get_logger
+
+# Archive hierarchy below (every line is an order in JSON):
+# archive/
+#   orders-2024.jsonl.zst
+#   orders-2025.jsonl.zst
+#   ...
+
+# Columns of an archived order; clients and food are copied, since they might be deleted later
+ARCHIVED_COLUMNS = (
+    "id",
+    "client_id",
+    "first_name",
+    "last_name",
+    "address",
+    "phone_number",
+    "food_id",
+    "food_name",
+    "food_quantity",
+    "date",
+)
+
+# Orders restored from the archive within the retention window aren't expired yet, whatever
+# their date
+RESTORED_CONDITION = """{table}.id NOT IN (
+                            SELECT
+                                order_id
+                            FROM
+                                restored_orders
+                            WHERE
+                                profile = (?)
+                                AND restored > date('now', ?)
+                        )"""
+
+# Every zstd frame starts with these bytes
+FRAME_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def archive_path(directory, year):
+    """Return path of the archive file of orders from a year."""
+    return os.path.join(directory, f"orders-{year}.jsonl.zst")
+
+
+def append_to_archive(directory, orders):
+    """Append orders to the archive files of their years, and make sure they're on disk."""
+    os.makedirs(directory, exist_ok=True)
+
+    years = {}
+    for order in orders:
+        years.setdefault(str(order["date"])[:4], []).append(order)
+
+    compressor = zstandard.ZstdCompressor(level=10)
+    for year, year_orders in years.items():
+        lines = "".join(
+            json.dumps(order, ensure_ascii=False) + "\n" for order in year_orders
+        )
+        # Every batch is a zstd frame of its own, so archive files are only ever appended to
+        with open(archive_path(directory, year), "ab") as file:
+            file.write(compressor.compress(lines.encode("utf-8")))
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def read_frames(path):
+    """Yield decompressed frames of an archive file."""
+    with open(path, "rb") as file:
+        data = file.read()
+
+    decompressor = zstandard.ZstdDecompressor()
+    while data:
+        frame = decompressor.decompressobj()
+        try:
+            content = frame.decompress(data)
+        except zstandard.ZstdError:
+            content = None
+        if content is None or not frame.eof:
+            # A frame was cut short by a crash (its orders are still in the database), so skip
+            # to the next frame that was appended after it
+            get_logger("retention.py").warning(f"Skipped incomplete frame of '{path}'.")
+            start = data.find(FRAME_MAGIC, 1)
+            if start == -1:
+                return
+            data = data[start:]
+            continue
+        yield content
+        data = frame.unused_data
+
+
+def read_archive(directory=None, profile=None, start=None, end=None):
+    """Return archived orders (of a profile, between two dates inclusive), oldest first."""
+    if directory is None:
+        directory = get_directory("retention")
+    if not os.path.isdir(directory):
+        return []
+
+    orders = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl.zst"):
+            continue
+        for frame in read_frames(os.path.join(directory, name)):
+            for line in frame.decode("utf-8").splitlines():
+                order = json.loads(line)
+                if profile is not None and order["profile"] != profile:
+                    continue
+                if start is not None and order["date"] < start:
+                    continue
+                if end is not None and order["date"] > end:
+                    continue
+                # An order is archived twice when the application stopped between writing
+                # it and deleting it, or when it was restored and expired again
+                key = (order["profile"], order["client_id"], order["food_id"], order["date"])
+                orders[key] = order
+    return sorted(orders.values(), key=lambda order: (order["date"], order["profile"]))
+
+
+async def restore_orders(profile, start=None, end=None, directory=None):
+    """Put archived orders of a profile back into the database, return how many were restored.
+
+    Restored orders are kept for a whole retention window (from the day they're restored)
+    before they're archived again.
+    """
+    logger = get_logger("retention.py")
+    database = get_database()
+    # The archive is kept by the server, along with the database
+    if database.remote:
+        return await database.restore_orders(profile, start, end)
+    async with database.reader() as db:
+        if profile not in await database.storage.list_profiles(db):
+            raise ValueError(f"Profile ({profile}) doesn't exist.")
+    orders = await asyncio.to_thread(read_archive, directory, profile, start, end)
+
+    restored = []
+    async with database.writer() as db:
+        source = database.storage.source(profile)
+        for order in orders:
+            operation = f"""SELECT
+                                id
+                            FROM
+                                {source.table}
+                            {source.where("client_id = (?) AND food_id = (?) AND date = (?)")};"""
+            values = (order["client_id"], order["food_id"], order["date"])
+            async with db.execute(operation, source.bind(*values)) as cursor:
+                if await cursor.fetchone() is not None:
+                    continue
+
+            operation = source.insert(("client_id", "food_id", "food_quantity", "date"))
+            values = (
+                order["client_id"],
+                order["food_id"],
+                order["food_quantity"],
+                order["date"],
+            )
+            try:
+                cursor = await db.execute(operation, source.bind(*values))
+            except sql.IntegrityError:
+                # The client or the food of the order has been deleted since
+                logger.warning(f"Couldn't restore order ({order}) into '{profile}'.")
+                continue
+            restored.append(cursor.lastrowid)
+
+        # Otherwise, orders older than the retention window would be archived again right away
+        operation = """
+                    INSERT OR REPLACE INTO restored_orders (
+                        profile, order_id, restored
+                    )
+                    VALUES
+                        (?, ?, date('now'));"""
+        await db.executemany(operation, [(profile, order_id) for order_id in restored])
+        await record(
+            db, "orders_restored", profile=profile, orders=len(restored), start=start, end=end
+        )
+        await db.commit()
+    logger.info(f"Restored {len(restored)} archived orders into '{profile}'.")
+    return len(restored)
+
+
+class RetentionService:
+    """Moves orders older than the retention window into the archive, a batch at a time."""
+
+    def __init__(self, days, batch_size, directory):
+        self.days = days
+        self.batch_size = batch_size
+        self.directory = directory
+
+    async def run(self):
+        """Archive expired orders of all profiles, return how many were archived."""
+        logger = get_logger("retention.py")
+        database = get_database()
+        async with database.reader() as db:
+            profiles = await database.storage.list_profiles(db)
+
+        archived = 0
+        for profile in profiles:
+            profile_archived = 0
+            while True:
+                count = await self.archive_batch(profile)
+                profile_archived += count
+                if count < self.batch_size:
+                    break
+                # Let everyone else write between batches
+                await asyncio.sleep(0.1)
+            if profile_archived:
+                logger.info(f"Archived {profile_archived} expired orders of '{profile}'.")
+            archived += profile_archived
+        logger.info(
+            f"Archived {archived} orders older than {self.days} days into '{self.directory}'."
+        )
+        return archived
+
+    async def archive_batch(self, profile):
+        """Archive the oldest batch of expired orders of a profile, return its size."""
+        database = get_database()
+        # The writer is held from reading the batch until deleting it, so nothing changes between
+        async with database.writer() as db:
+            source = database.storage.source(profile)
+            table = source.table
+            not_restored = RESTORED_CONDITION.format(table=table)
+            operation = f"""SELECT
+                                {table}.id,
+                                client_id,
+                                first_name,
+                                last_name,
+                                address,
+                                phone_number,
+                                food_id,
+                                food_name,
+                                food_quantity,
+                                date
+                            FROM
+                                {table}
+                                INNER JOIN clients ON {table}.client_id = clients.id
+                                INNER JOIN food ON {table}.food_id = food.id
+                            {source.where("date <= date('now', ?)", not_restored)}
+                            ORDER BY
+                                date
+                            LIMIT
+                                {self.batch_size};"""
+            window = f"-{self.days} days"
+            async with db.execute(operation, source.bind(window, profile, window)) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                return 0
+
+            archived = datetime.now().isoformat(timespec="seconds")
+            orders = [
+                {"profile": profile, **dict(zip(ARCHIVED_COLUMNS, row)), "archived": archived}
+                for row in rows
+            ]
+            # Orders are deleted only once they're safely on disk
+            await asyncio.to_thread(append_to_archive, self.directory, orders)
+
+            ids = [order["id"] for order in orders]
+            condition = f"{table}.id IN ({', '.join('?' * len(ids))})"
+            operation = f"DELETE FROM {table} {source.where(condition)};"
+            await db.execute(operation, source.bind(*ids))
+            # Restored orders among them have been kept long enough
+            operation = f"""DELETE FROM
+                                restored_orders
+                            WHERE
+                                profile = (?)
+                                AND order_id IN ({', '.join('?' * len(ids))});"""
+            await db.execute(operation, (profile, *ids))
+            await record(
+                db,
+                "orders_archived",
+                profile=profile,
+                orders=len(orders),
+                first_date=orders[0]["date"],
+                last_date=orders[-1]["date"],
+            )
+            await db.commit()
+        return len(rows)
+
+
+def get_retention():
+    """Return the retention service configured in config.ini."""
+    config = get_config()
+    return RetentionService(
+        config.getint("retention", "days"),
+        config.getint("retention", "batch_size"),
+        get_directory("retention"),
+    )
+
+
+async def run_retention():
+    """Archive expired orders once startup is over, return how many were archived."""
+    await asyncio.sleep(get_config().getfloat("retention", "delay"))
+    return await get_retention().run()
@@ -0,0 +1,175 @@
+# Rollups hold the number of orders and their total quantity per (profile, date, food) and per
+# (date, client). Triggers on order tables keep them up to date, so that aggregates read a
+# few rows of the rollups instead of every order.
+
+ROLLUPS = {
+    "food_rollup": ("profile", "date", "food_id"),
+    "client_rollup": ("date", "client_id"),
+}
+
+
+async def create_rollup_tables(db):
+    """Create the rollup tables."""
+    operation = """
+                CREATE TABLE IF NOT EXISTS food_rollup (
+                    profile TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    food_id INTEGER NOT NULL,
+                    orders INTEGER NOT NULL,
+                    food_quantity INTEGER NOT NULL,
+                    PRIMARY KEY (profile, date, food_id)
+                ) WITHOUT ROWID;"""
+    await db.execute(operation)
+
+    operation = """
+                CREATE TABLE IF NOT EXISTS client_rollup (
+                    date TEXT NOT NULL,
+                    client_id INTEGER NOT NULL,
+                    orders INTEGER NOT NULL,
+                    food_quantity INTEGER NOT NULL,
+                    PRIMARY KEY (date, client_id)
+                ) WITHOUT ROWID;"""
+    await db.execute(operation)
+
+
+def add_order(row, profile):
+    """Return statements that add an order (NEW or OLD in triggers) to the rollups."""
+    values = {
+        "profile": profile.format(row=row),
+        "date": f"{row}.date",
+        "food_id": f"{row}.food_id",
+        "client_id": f"{row}.client_id",
+    }
+    statements = []
+    for rollup, key in ROLLUPS.items():
+        statements.append(
+            f"""
+                    INSERT INTO {rollup} ({', '.join(key)}, orders, food_quantity)
+                    VALUES ({', '.join(values[column] for column in key)}, 1, {row}.food_quantity)
+                    ON CONFLICT ({', '.join(key)}) DO UPDATE
+                    SET
+                        orders = orders + 1,
+                        food_quantity = food_quantity + excluded.food_quantity;"""
+        )
+    return "".join(statements)
+
+
+def remove_order(row, profile):
+    """Return statements that remove an order (NEW or OLD in triggers) from the rollups."""
+    values = {
+        "profile": profile.format(row=row),
+        # Dates of orders have INTEGER affinity, which would keep the primary key from being used
+        "date": f"CAST({row}.date AS TEXT)",
+        "food_id": f"{row}.food_id",
+        "client_id": f"{row}.client_id",
+    }
+    statements = []
+    for rollup, key in ROLLUPS.items():
+        condition = " AND ".join(f"{column} = {values[column]}" for column in key)
+        statements.append(
+            f"""
+                    UPDATE {rollup}
+                    SET
+                        orders = orders - 1,
+                        food_quantity = food_quantity - {row}.food_quantity
+                    WHERE
+                        {condition};
+                    DELETE FROM {rollup} WHERE {condition} AND orders = 0;"""
+        )
+    return "".join(statements)
+
+
+async def create_rollup_triggers(db, table, profile):
+    """Create triggers that keep the rollups up to date with an order table.
+
+    The profile is an SQL expression of the profile of an order, where {row} stands for
+    NEW or OLD.
+    """
+    await create_rollup_tables(db)
+
+    operation = f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_rollup_insert AFTER INSERT ON {table}
+                BEGIN{add_order("NEW", profile)}
+                END;"""
+    await db.execute(operation)
+
+    operation = f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_rollup_delete AFTER DELETE ON {table}
+                BEGIN{remove_order("OLD", profile)}
+                END;"""
+    await db.execute(operation)
+
+    # Merging quantities of an order (see AddOrderDialog) goes through here as well
+    operation = f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_rollup_update
+                AFTER UPDATE OF client_id, food_id, food_quantity, date ON {table}
+                BEGIN{remove_order("OLD", profile)}{add_order("NEW", profile)}
+                END;"""
+    await db.execute(operation)
+
+
+async def forget_profile(db, profile, table):
+    """Remove orders of a profile table from the rollups (before it's dropped)."""
+    await db.execute("DELETE FROM food_rollup WHERE profile = (?);", (profile,))
+
+    operation = f"""
+                UPDATE client_rollup
+                SET
+                    orders = client_rollup.orders - dropped.orders,
+                    food_quantity = client_rollup.food_quantity - dropped.food_quantity
+                FROM
+                    (
+                        SELECT
+                            date, client_id, count(*) AS orders,
+                            sum(food_quantity) AS food_quantity
+                        FROM
+                            {table}
+                        GROUP BY
+                            date, client_id
+                    ) AS dropped
+                WHERE
+                    client_rollup.date = CAST(dropped.date AS TEXT)
+                    AND client_rollup.client_id = dropped.client_id;"""
+    await db.execute(operation)
+    await db.execute("DELETE FROM client_rollup WHERE orders = 0;")
+
+
+def computed_rollup(rollup, orders):
+    """Return SELECT statement that computes a rollup from orders of all profiles."""
+    key = ", ".join(ROLLUPS[rollup])
+    return f"""SELECT
+                   {key}, count(*), sum(food_quantity)
+               FROM
+                   ({orders})
+               GROUP BY
+                   {key}"""
+
+
+async def rebuild_rollups(db, storage):
+    """Compute the rollups from scratch."""
+    await create_rollup_tables(db)
+    orders = await storage.all_orders(db)
+    for rollup, key in ROLLUPS.items():
+        await db.execute(f"DELETE FROM {rollup};")
+        operation = f"""
+                    INSERT INTO {rollup} ({', '.join(key)}, orders, food_quantity)
+                    {computed_rollup(rollup, orders)};"""
+        await db.execute(operation)
+
+
+async def verify_rollups(db, storage):
+    """Return the number of rows of every rollup that don't match the orders."""
+    orders = await storage.all_orders(db)
+    mismatches = {}
+    for rollup, key in ROLLUPS.items():
+        stored = f"SELECT {', '.join(key)}, orders, food_quantity FROM {rollup}"
+        computed = computed_rollup(rollup, orders)
+        operation = f"""
+                    SELECT count(*) FROM (
+                        SELECT * FROM ({computed} EXCEPT {stored})
+                        UNION ALL
+                        SELECT * FROM ({stored} EXCEPT {computed})
+                    );"""
+        async with db.execute(operation) as cursor:
+            (mismatches[rollup],) = await cursor.fetchone()
+    return mismatches
@@ -0,0 +1,130 @@
+# Phone numbers are indexed with digits only, so "01 23 45" can be found by typing "012345"
+PHONE_DIGITS = (
+    "replace(replace(replace(replace(replace(replace(replace("
+    "{phone}, ' ', ''), '.', ''), '-', ''), '/', ''), '(', ''), ')', ''), '+', '')"
+)
+
+
+def indexed_columns(search):
+    """Return INSERT INTO statement of a search index, without its values."""
+    # Rowid of the search index is the id of the order
+    return f"""INSERT INTO {search} (
+                    rowid, first_name, last_name, address, phone_number,
+                    phone_digits, food_name
+                )"""
+
+
+def indexed_values(order, tables="clients, food"):
+    """Return SELECT statement of values indexed for an order (NEW in triggers, or an order table)."""
+    return f"""SELECT
+                    {order}.id,
+                    first_name,
+                    last_name,
+                    address,
+                    phone_number,
+                    {PHONE_DIGITS.format(phone="phone_number")},
+                    food_name
+                FROM
+                    {tables}
+                WHERE
+                    clients.id = {order}.client_id
+                    AND food.id = {order}.food_id"""
+
+
+async def create_search_index(db, table, search):
+    """Create and fill the search index of an order table, along with triggers that keep it up to date."""
+    # Accents are removed from both the indexed text and the queries, so "helene" finds "Hélène"
+    operation = f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {search} USING fts5(
+                    first_name, last_name, address, phone_number,
+                    phone_digits, food_name,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '1 2 3'
+                );"""
+    await db.execute(operation)
+
+    await db.execute(f"DELETE FROM {search};")
+    operation = f"""
+                {indexed_columns(search)}
+                {indexed_values(table, f"{table}, clients, food")};"""
+    await db.execute(operation)
+
+    operation = f"""
+                CREATE TRIGGER IF NOT EXISTS {search}_insert AFTER INSERT ON {table}
+                BEGIN
+                    {indexed_columns(search)}
+                    {indexed_values("NEW")};
+                END;"""
+    await db.execute(operation)
+
+    operation = f"""
+                CREATE TRIGGER IF NOT EXISTS {search}_delete AFTER DELETE ON {table}
+                BEGIN
+                    DELETE FROM {search} WHERE rowid = OLD.id;
+                END;"""
+    await db.execute(operation)
+
+    operation = f"""
+                CREATE TRIGGER IF NOT EXISTS {search}_update
+                AFTER UPDATE OF id, client_id, food_id ON {table}
+                BEGIN
+                    DELETE FROM {search} WHERE rowid = OLD.id;
+                    {indexed_columns(search)}
+                    {indexed_values("NEW")};
+                END;"""
+    await db.execute(operation)
+
+
+async def drop_search_index(db, search):
+    """Drop a search index (its triggers are dropped along with the order table)."""
+    await db.execute(f"DROP TABLE IF EXISTS {search};")
+
+
+async def update_search_triggers(db, indexes):
+    """(Re)create triggers that update the given (order table, search index) pairs when clients or food change."""
+    await db.execute("DROP TRIGGER IF EXISTS search_clients_update;")
+    await db.execute("DROP TRIGGER IF EXISTS search_food_update;")
+    if not indexes:
+        return
+
+    client_updates = "".join(
+        f"""
+                    UPDATE {search}
+                    SET
+                        first_name = NEW.first_name,
+                        last_name = NEW.last_name,
+                        address = NEW.address,
+                        phone_number = NEW.phone_number,
+                        phone_digits = {PHONE_DIGITS.format(phone="NEW.phone_number")}
+                    WHERE
+                        rowid IN (SELECT id FROM {table} WHERE client_id = NEW.id);"""
+        for (table, search) in indexes
+    )
+    operation = f"""
+                CREATE TRIGGER search_clients_update
+                AFTER UPDATE OF first_name, last_name, address, phone_number ON clients
+                BEGIN{client_updates}
+                END;"""
+    await db.execute(operation)
+
+    food_updates = "".join(
+        f"""
+                    UPDATE {search}
+                    SET
+                        food_name = NEW.food_name
+                    WHERE
+                        rowid IN (SELECT id FROM {table} WHERE food_id = NEW.id);"""
+        for (table, search) in indexes
+    )
+    operation = f"""
+                CREATE TRIGGER search_food_update AFTER UPDATE OF food_name ON food
+                BEGIN{food_updates}
+                END;"""
+    await db.execute(operation)
+
+
+def match_query(text):
+    """Return an FTS5 query that matches every word of the text as a prefix."""
+    # Quote the words, so that characters like "-" or ":" aren't taken for query syntax
+    words = [word.replace('"', '""') for word in text.split()]
+    return " ".join(f'"{word}"*' for word in words)
@@ -1,87 +1,107 @@
-import asyncio
-
-import aiosqlite as sql
+from PySide6.QtCore import QEvent, Qt, QTimer
 from PySide6.QtWidgets import (
     QAbstractItemView,
     QDialog,
     QDialogButtonBox,
     QHeaderView,
+    QLineEdit,
     QMessageBox,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
 )
 
+from client_search_model import ClientSearchModel
 from logger import get_logger
 
 
 class SelectClientDialog(QDialog):
-    """A dialog to select a client from the database."""
+    """A dialog to select a client from the database, found by typing (part of) their name or phone number."""
 
     def __init__(self, parent):
         super().__init__()
         self._parent = parent
         self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
 
-        table = QTableWidget()
-        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        table.setSelectionBehavior(QAbstractItemView.SelectRows)
-
-        self._clients = asyncio.run(self.get_clients())
-        self.__client_idx = None
-
-        # Populate a table if there are any clients
-        if self._clients:
-            table.setColumnCount(len(self._clients[0]) - 1)
-            table.setRowCount(len(self._clients))
-            table.setHorizontalHeaderLabels(
-                ["Prénom", "Nom de famille", "Addresse", "Numéro de téléphone"]
-            )
-
-            for row, (_, first_name, last_name, address, phone_number) in enumerate(
-                self._clients
-            ):
-                table.setItem(row, 0, QTableWidgetItem(first_name))
-                table.setItem(row, 1, QTableWidgetItem(last_name))
-                table.setItem(row, 2, QTableWidgetItem(address))
-                table.setItem(row, 3, QTableWidgetItem(phone_number))
-
-            table.cellClicked.connect(lambda row, _: self.set_client_idx(row))
-
-            header = table.horizontalHeader()
-            header.setSectionResizeMode(QHeaderView.ResizeToContents)
-            # Add 35, lest part of the last section gets swallowed
-            self.setMinimumWidth(header.length() + 35)
-
-            header.setSectionResizeMode(2, QHeaderView.Stretch)
+        self._search_line_edit = QLineEdit()
+        self._search_line_edit.setPlaceholderText(
+            "Début du prénom, du nom ou du numéro de téléphone"
+        )
+        self._search_line_edit.setClearButtonEnabled(True)
+        # Up and down arrows move through the clients found while typing
+        self._search_line_edit.installEventFilter(self)
+
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(100)
+
+        self.model = ClientSearchModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(2, QHeaderView.Stretch)
+        self.setMinimumWidth(768)
 
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
 
         layout = QVBoxLayout(self)
-        layout.addWidget(table)
+        layout.addWidget(self._search_line_edit)
+        layout.addWidget(self.table)
         layout.addWidget(button_box)
 
+        self._search_line_edit.textChanged.connect(self._search_timer.start)
+        self._search_timer.timeout.connect(
+            lambda: self.model.set_search(self._search_line_edit.text())
+        )
+        # The first client found is chosen, so Enter picks it right away
+        self.model.modelReset.connect(self.choose_first_client)
+        self.table.doubleClicked.connect(self.accept)
+
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
 
-    def set_client_idx(self, row):
-        """Set client row index (through clicking table item)."""
-        self.__client_idx = row
+        self._search_line_edit.setFocus()
+        self.model.reload()
+
+    def eventFilter(self, watched, event):
+        if (
+            watched is self._search_line_edit
+            and event.type() == QEvent.KeyPress
+            and event.key() in (Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown)
+        ):
+            self.move_choice(event.key())
+            return True
+        return super().eventFilter(watched, event)
+
+    def move_choice(self, key):
+        """Choose the client above/below the chosen one, without leaving the search field."""
+        if not self.model.rowCount():
+            return
+        row = self.table.currentIndex().row()
+        step = {
+            Qt.Key_Up: -1,
+            Qt.Key_Down: 1,
+            Qt.Key_PageUp: -self.model.PAGE_SIZE // 10,
+            Qt.Key_PageDown: self.model.PAGE_SIZE // 10,
+        }[key]
+        row = min(max(row + step, 0), self.model.rowCount() - 1)
+        # Reaching the last client found loads the next page, as scrolling does
+        if row == self.model.rowCount() - 1 and self.model.canFetchMore():
+            self.model.fetchMore()
+        self.table.setCurrentIndex(self.model.index(row, 0))
+
+    def choose_first_client(self):
+        """Choose the first client found (if any)."""
+        if self.model.rowCount():
+            self.table.setCurrentIndex(self.model.index(0, 0))
 
     def get_client_idx(self):
-        """Return chosen client row index (through clicking table item)."""
-        return self.__client_idx
-
-    async def get_clients(self):
-        """Return a list containing clients from the database."""
-        clients = []
-        async with sql.connect("data.db") as db:
-            async with db.execute(
-                "SELECT id, first_name, last_name, address, phone_number FROM clients;"
-            ) as cursor:
-                async for row in cursor:
-                    clients.append(row)
-        return clients
+        """Return chosen client row index (None if none is chosen)."""
+        index = self.table.currentIndex()
+        return index.row() if index.isValid() else None
 
     def accept(self):
         logger = get_logger("select_client_dialog.py")
@@ -96,7 +116,7 @@ class SelectClientDialog(QDialog):
             logger.warn("The client has not been chosen; choose one.")
             return
 
-        (client_id, first_name, last_name, address, phone_number) = self._clients[row]
+        (client_id, first_name, last_name, address, phone_number) = self.model.row(row)
         self._parent.client_label.setText(
             f"Client: {first_name} {last_name}, {address}, {phone_number}"
         )
@@ -1,19 +1,17 @@
-import asyncio
-
-import aiosqlite as sql
-from PySide6.QtGui import QColor
 from PySide6.QtWidgets import (
     QAbstractItemView,
     QDialog,
     QDialogButtonBox,
     QHeaderView,
     QMessageBox,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
 )
 
+from food_style import FoodDelegate
 from logger import get_logger
+from repository import FoodModel
+from tasks import run_task
 
 
 class SelectFoodDialog(QDialog):
@@ -24,52 +22,43 @@ class SelectFoodDialog(QDialog):
         self._parent = parent
         self.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
 
-        table = QTableWidget()
-        table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.model = FoodModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setItemDelegate(FoodDelegate(self.table))
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
 
-        self._food = asyncio.run(self.get_food())
         self.__food_idx = None
-
-        # Populate a table if there is any food
-        if self._food:
-            table.setColumnCount(1)
-            table.setRowCount(len(self._food))
-            table.setHorizontalHeaderLabels(["Nom de la nourriture"])
-
-            for row, (_, food_name, red_color, green_color, blue_color) in enumerate(
-                self._food
-            ):
-                item = QTableWidgetItem(food_name)
-                if None not in (red_color, green_color, blue_color):
-                    item.setBackground(QColor(red_color, green_color, blue_color))
-                    item.setForeground(
-                        QColor(
-                            self.get_foreground_color(
-                                (red_color, green_color, blue_color)
-                            )
-                        )
-                    )
-                table.setItem(row, 0, item)
-
-            table.cellClicked.connect(lambda row, _: self.set_food_idx(row))
-
-            header = table.horizontalHeader()
-            header.setSectionResizeMode(QHeaderView.ResizeToContents)
-            # Add 35, lest part of the section gets swallowed
-            self.setMinimumWidth(header.length() + 35)
-
-            header.setSectionResizeMode(QHeaderView.Stretch)
+        self.table.clicked.connect(lambda index: self.set_food_idx(index.row()))
+        # Rows move when food is deleted, so the chosen one has to be chosen again
+        self.model.rowsRemoved.connect(lambda: self.set_food_idx(None))
+        self.model.modelReset.connect(lambda: self.set_food_idx(None))
 
         button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
 
         layout = QVBoxLayout(self)
-        layout.addWidget(table)
+        layout.addWidget(self.table)
         layout.addWidget(button_box)
 
         button_box.accepted.connect(self.accept)
         button_box.rejected.connect(self.reject)
 
+        run_task(self.fill_table())
+
+    async def fill_table(self):
+        """Fill the table with food (from memory, once it's been loaded)."""
+        await self.model.load()
+
+        # Size the table if there is any food
+        if self.model.rowCount():
+            header = self.table.horizontalHeader()
+            header.setSectionResizeMode(QHeaderView.ResizeToContents)
+            # Add 35, lest part of the section gets swallowed
+            self.setMinimumWidth(header.length() + 35)
+
+            header.setSectionResizeMode(QHeaderView.Stretch)
+
     def set_food_idx(self, row):
         """Set food row index (through clicking table item)."""
         self.__food_idx = row
@@ -78,23 +67,6 @@ class SelectFoodDialog(QDialog):
         """Return chosen client row index (through clicking table item)."""
         return self.__food_idx
 
-    def get_foreground_color(self, color):
-        """Return black/white color depending on calculated luminance."""
-        (red_color, green_color, blue_color) = color
-        luminance = 0.2126 * red_color + 0.7152 * green_color + 0.0722 * blue_color
-        return QColor(255, 255, 255) if luminance < 140 else QColor(0, 0, 0)
-
-    async def get_food(self):
-        """Return a list containing food from the database."""
-        food = []
-        async with sql.connect("data.db") as db:
-            async with db.execute(
-                "SELECT id, food_name, red_color, green_color, blue_color FROM food;"
-            ) as cursor:
-                async for row in cursor:
-                    food.append(row)
-        return food
-
     def accept(self):
         logger = get_logger("select_food_dialog.py")
 
@@ -108,7 +80,7 @@ class SelectFoodDialog(QDialog):
             logger.warn("The food has not been chosen; choose one.")
             return
 
-        (food_id, food_name, _, _, _) = self._food[row]
+        (food_id, food_name, _, _, _) = self.model.row(row)
         self._parent.food_label.setText(f"Nourriture: {food_name}")
 
         self._parent.food_id = food_id
@@ -0,0 +1,597 @@
+import asyncio
+import hmac
+import itertools
+import json
+import re
+import sqlite3
+from datetime import date
+from functools import partial
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import aiosqlite as sql
+
+from client_search import search_clients
+from config import get_config
+from database import get_database
+from duplicates import merge_clients
+from importer import COLUMNS, DUPLICATES, Importer, validate_client, validate_food
+from logger import get_logger
+from operations import (
+    add_client,
+    add_food,
+    add_orders,
+    add_profile,
+    delete_client,
+    delete_food,
+    delete_order,
+    delete_profile,
+    make,
+    scrub,
+)
+
+# Serves the database to stations over HTTP, with JSON bodies, so that only this process opens
+# data.db. Every connection is kept open for as many requests as a station makes (requests can
+# be pipelined, they're answered in order). Profiles, clients, food and orders have endpoints of
+# their own, and every change is made by one request, in a transaction that ends with it, so
+# that a station never holds the writer between requests. /sql runs statements of stations
+# using a RemoteDatabase (see remote.py), on connections that are only allowed to read.
+#
+# Stations have to give the token of config.ini ("Authorization: Bearer <token>"), and the
+# server doesn't start without one.
+
+# Largest request body accepted (an import sends batches of thousands of rows)
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+# Largest page of clients or orders answered at once
+MAX_PAGE_SIZE = 1000
+
+REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Content Too Large",
+    500: "Internal Server Error",
+}
+
+CLIENT_COLUMNS = ("id", "first_name", "last_name", "address", "phone_number")
+FOOD_COLUMNS = ("id", "food_name", "red_color", "green_color", "blue_color")
+ORDER_COLUMNS = ("id", "client_id", "food_id", "food_quantity", "date")
+
+# What statements of /sql may do: read tables and call functions, and nothing else (no ATTACH,
+# no PRAGMA, no changes to the schema nor to rows)
+READ_ACTIONS = (
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+)
+
+
+class HTTPError(Exception):
+    """An error answered with an HTTP status (and a message in JSON)."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """A request read from a connection."""
+
+    def __init__(self, method, target, version, headers, body):
+        self.method = method
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        """Return the JSON body of the request."""
+        try:
+            return json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "The body isn't valid JSON.")
+
+    def keep_alive(self):
+        """Return whether the connection stays open after the response."""
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def authorized(self, token):
+        """Return whether the request gives the token of the server."""
+        given = self.headers.get("authorization", "").encode("latin-1")
+        return hmac.compare_digest(given, f"Bearer {token}".encode("latin-1"))
+
+
+async def read_request(reader):
+    """Read the next request from a connection (None once the station has closed it)."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        (method, target, version) = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "The request line is malformed.")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        (name, _, value) = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", ""):
+        raise HTTPError(400, "Chunked requests aren't supported, give a Content-Length.")
+    length = int(headers.get("content-length") or 0)
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, "The body is too large.")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method, target, version, headers, body)
+
+
+def write_response(writer, status, content, keep_alive):
+    """Write a JSON response."""
+    body = json.dumps(content, ensure_ascii=False).encode()
+    head = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+
+def authorize_read(action, *args):
+    """Allow a statement to read the database, and deny it anything else."""
+    return sqlite3.SQLITE_OK if action in READ_ACTIONS else sqlite3.SQLITE_DENY
+
+
+class StatementConnection(sqlite3.Connection):
+    """A connection running statements of stations, which can only read the database."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.execute("PRAGMA query_only = ON;")
+        self.set_authorizer(authorize_read)
+
+
+class StatementReaders:
+    """A few connections that run statements of stations (see /sql), apart from the database's."""
+
+    def __init__(self, path, count=2):
+        self.path = path
+        self._count = max(count, 1)
+        self._connections = []
+        self._next = None
+
+    async def open(self):
+        """Open the connections."""
+        for _ in range(self._count):
+            connection = sql.connect(self.path, factory=StatementConnection)
+            # Don't let a connection that wasn't closed keep the server alive on exit
+            connection.daemon = True
+            self._connections.append(await connection)
+        self._next = itertools.cycle(self._connections)
+
+    async def close(self):
+        """Close the connections."""
+        for connection in self._connections:
+            await connection.close()
+        self._connections = []
+        self._next = None
+
+    def reader(self):
+        """Return a connection (aiosqlite queues statements of each on its own thread)."""
+        return next(self._next)
+
+
+# Opened while serve() runs
+_statement_readers = None
+
+ROUTES = []
+
+
+def route(method, pattern):
+    """Register a handler of requests of a method on paths matching the pattern."""
+
+    def register(handler):
+        ROUTES.append((method, re.compile(f"^{pattern}$"), handler))
+        return handler
+
+    return register
+
+
+async def existing_profile(name):
+    """Return the name of a profile, unless it doesn't exist."""
+    # Names of profiles are names of tables, so only those that exist are let through
+    database = get_database()
+    async with database.reader() as db:
+        if name not in await database.storage.list_profiles(db):
+            raise HTTPError(404, f"Profile ({name}) doesn't exist.")
+    return name
+
+
+@route("GET", "/profiles")
+async def get_profiles(request):
+    database = get_database()
+    async with database.reader() as db:
+        return (200, {"profiles": await database.storage.list_profiles(db)})
+
+
+@route("POST", "/profiles")
+async def post_profile(request):
+    name = str(request.json().get("name", "")).strip().title()
+    try:
+        name = scrub(name).title()
+    except ValueError:
+        raise HTTPError(400, "Profile name can only have alphanumerics and underscores.")
+    if not name or not name[0].isupper():
+        raise HTTPError(400, "Profile name has to start with a letter.")
+    database = get_database()
+    async with database.writer() as db:
+        if name in await database.storage.list_profiles(db):
+            raise HTTPError(409, f"Profile ({name}) exists already.")
+        await add_profile(db, database.storage, name)
+        await db.commit()
+    return (201, {"name": name})
+
+
+@route("DELETE", "/profiles/(?P<profile>[^/]+)")
+async def delete_profile_route(request, profile):
+    profile = await existing_profile(profile)
+    orders = await make(delete_profile, profile)
+    return (200, {"orders": orders})
+
+
+def page_size(request):
+    """Return the number of rows a page asks for, no more than MAX_PAGE_SIZE."""
+    try:
+        limit = int(request.query.get("limit", 100))
+    except ValueError:
+        raise HTTPError(400, "Limit has to be an integer.")
+    if limit < 0:
+        raise HTTPError(400, "Limit can't be negative.")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+@route("GET", "/clients")
+async def get_clients(request):
+    # A page starts after the key (name or phone number, and id) of the last client of the last page
+    limit = page_size(request)
+    try:
+        after = None
+        if "after_id" in request.query:
+            after = (request.query.get("after_key", ""), int(request.query["after_id"]))
+    except ValueError:
+        raise HTTPError(400, "After_id has to be an integer.")
+    (rows, after) = await search_clients(request.query.get("search", ""), after, limit)
+    clients = [dict(zip(CLIENT_COLUMNS, row)) for row in rows]
+    return (200, {"clients": clients, "after": after})
+
+
+@route("POST", "/clients")
+async def post_client(request):
+    try:
+        client = validate_client({column: "" for column in CLIENT_COLUMNS} | request.json())
+    except (ValueError, AttributeError) as error:
+        raise HTTPError(400, str(error))
+    client_id = await make(add_client, client)
+    if client_id is None:
+        raise HTTPError(409, "A client with the same first and last name exists already.")
+    return (201, dict(zip(CLIENT_COLUMNS, (client_id, *client))))
+
+
+@route("DELETE", "/clients/(?P<client_id>[0-9]+)")
+async def delete_client_route(request, client_id):
+    database = get_database()
+    async with database.writer() as db:
+        operation = f"SELECT {', '.join(CLIENT_COLUMNS)} FROM clients WHERE id = (?);"
+        async with db.execute(operation, (int(client_id),)) as cursor:
+            client = await cursor.fetchone()
+        if client is None:
+            raise HTTPError(404, f"Client ({client_id}) doesn't exist.")
+        orders = await delete_client(db, database.storage, client)
+        await db.commit()
+    return (200, {"orders": orders})
+
+
+@route("POST", "/clients/(?P<client_id>[0-9]+)/merge")
+async def merge_clients_route(request, client_id):
+    try:
+        merged_ids = [int(merged_id) for merged_id in request.json()["merged_ids"]]
+    except (AttributeError, KeyError, TypeError, ValueError):
+        raise HTTPError(400, "Merged clients have to be given as a list of ids (merged_ids).")
+    if not merged_ids or int(client_id) in merged_ids:
+        raise HTTPError(400, "Clients can't be merged into one of themselves.")
+    orders = await make(merge_clients, int(client_id), merged_ids)
+    return (200, {"orders": orders})
+
+
+@route("GET", "/food")
+async def get_food(request):
+    async with get_database().reader() as db:
+        operation = f"SELECT {', '.join(FOOD_COLUMNS)} FROM food ORDER BY id;"
+        async with db.execute(operation) as cursor:
+            rows = await cursor.fetchall()
+    return (200, {"food": [dict(zip(FOOD_COLUMNS, row)) for row in rows]})
+
+
+@route("POST", "/food")
+async def post_food(request):
+    # Colors are read as the importer reads them, from text
+    row = {column: "" if value is None else str(value) for column, value in request.json().items()}
+    try:
+        (food_name, *color) = validate_food({"food_name": ""} | row)
+    except ValueError as error:
+        raise HTTPError(400, str(error))
+    color = None if None in color else color
+    food_id = await make(add_food, food_name, color)
+    if food_id is None:
+        raise HTTPError(409, f"Food ({food_name}) exists already.")
+    return (201, dict(zip(FOOD_COLUMNS, (food_id, food_name, *(color or (None, None, None))))))
+
+
+@route("DELETE", "/food/(?P<food_id>[0-9]+)")
+async def delete_food_route(request, food_id):
+    database = get_database()
+    async with database.writer() as db:
+        operation = f"SELECT {', '.join(FOOD_COLUMNS)} FROM food WHERE id = (?);"
+        async with db.execute(operation, (int(food_id),)) as cursor:
+            food = await cursor.fetchone()
+        if food is None:
+            raise HTTPError(404, f"Food ({food_id}) doesn't exist.")
+        orders = await delete_food(db, database.storage, food)
+        await db.commit()
+    return (200, {"orders": orders})
+
+
+@route("GET", "/profiles/(?P<profile>[^/]+)/orders")
+async def get_orders(request, profile):
+    profile = await existing_profile(profile)
+    database = get_database()
+    source = database.storage.source(profile)
+    conditions = []
+    values = []
+    if "start" in request.query:
+        conditions.append("date >= (?)")
+        values.append(request.query["start"])
+    if "end" in request.query:
+        conditions.append("date <= (?)")
+        values.append(request.query["end"])
+    # A page starts after the key (date and id) of the last order of the last page
+    limit = page_size(request)
+    if "after_id" in request.query:
+        try:
+            after_id = int(request.query["after_id"])
+        except ValueError:
+            raise HTTPError(400, "After_id has to be an integer.")
+        conditions.append("date < (?) OR (date = (?) AND id < (?))")
+        after_date = request.query.get("after_date", "")
+        values += [after_date, after_date, after_id]
+
+    operation = f"""SELECT
+                        {', '.join(ORDER_COLUMNS)}
+                    FROM
+                        {source.table}
+                    {source.where(*conditions)}
+                    ORDER BY
+                        date DESC, id DESC
+                    LIMIT
+                        (?);"""
+    async with database.reader() as db:
+        async with db.execute(operation, source.bind(*values, limit)) as cursor:
+            rows = await cursor.fetchall()
+    orders = [dict(zip(ORDER_COLUMNS, row)) for row in rows]
+    after = [orders[-1]["date"], orders[-1]["id"]] if orders else None
+    return (200, {"orders": orders, "after": after})
+
+
+def validate_order(order):
+    """Return (client id, food id, quantity, date) of an order given in JSON."""
+    try:
+        data = (
+            int(order["client_id"]),
+            int(order["food_id"]),
+            int(order["food_quantity"]),
+            date.fromisoformat(order["date"]).isoformat(),
+        )
+    except (KeyError, TypeError, ValueError):
+        raise HTTPError(
+            400, "An order has a client_id, a food_id, a food_quantity and a date (YYYY-MM-DD)."
+        )
+    if data[2] < 1:
+        raise HTTPError(400, "Food quantity has to be at least 1.")
+    return data
+
+
+@route("POST", "/profiles/(?P<profile>[^/]+)/orders")
+async def post_orders(request, profile):
+    profile = await existing_profile(profile)
+    # An order, or a list of orders added all together (or none of them)
+    body = request.json()
+    orders = [validate_order(order) for order in (body if isinstance(body, list) else [body])]
+    return (201, {"ids": await make(add_orders, profile, orders)})
+
+
+@route("DELETE", "/profiles/(?P<profile>[^/]+)/orders/(?P<order_id>[0-9]+)")
+async def delete_order_route(request, profile, order_id):
+    profile = await existing_profile(profile)
+    if not await make(delete_order, profile, int(order_id)):
+        raise HTTPError(404, f"Order ({order_id}) doesn't exist in profile ({profile}).")
+    return (200, {})
+
+
+@route("POST", "/profiles/(?P<profile>[^/]+)/restore")
+async def restore_orders_route(request, profile):
+    # Only restoring needs the archive's compression
+    from retention import restore_orders
+
+    profile = await existing_profile(profile)
+    body = request.json()
+    try:
+        (start, end) = (
+            None if body.get(bound) is None else date.fromisoformat(body[bound]).isoformat()
+            for bound in ("start", "end")
+        )
+    except (AttributeError, TypeError, ValueError):
+        raise HTTPError(400, "A period has a start and an end (YYYY-MM-DD).")
+    return (200, {"restored": await restore_orders(profile, start, end)})
+
+
+@route("POST", "/import")
+async def import_route(request):
+    # A batch of rows of a file that a station imports (see Importer), each one by a request
+    body = request.json()
+    try:
+        importer = Importer(
+            body.get("kind"),
+            str(body.get("path", "")),
+            body.get("profile"),
+            body.get("on_duplicate", DUPLICATES[0]),
+        )
+        batch = [(int(line), dict(row)) for (line, row) in body.get("rows", [])]
+    except (AttributeError, TypeError, ValueError) as error:
+        raise HTTPError(400, str(error) or "Rows are given as a list of (line, row).")
+    for line, row in batch:
+        missing = [column for column in COLUMNS[importer.kind] if column not in row]
+        if missing:
+            raise HTTPError(400, f"Missing columns ({', '.join(missing)}) on line {line}.")
+    if importer.kind == "orders":
+        await existing_profile(importer.profile)
+
+    await importer.import_batch(batch)
+    report = importer.report
+    counts = ("read", "imported", "updated", "duplicates", "rejected")
+    content = {count: getattr(report, count) for count in counts}
+    return (200, content | {"rejects": importer.rejects})
+
+
+@route("POST", "/sql")
+async def post_sql(request):
+    body = request.json()
+    operation = body.get("operation")
+    parameters = body.get("parameters", [])
+    if not isinstance(operation, str):
+        raise HTTPError(400, "A statement has to be given as operation.")
+
+    # Statements can only read, changes are made by the endpoints above
+    async with _statement_readers.reader().execute(operation, parameters) as cursor:
+        rows = await cursor.fetchall()
+        result = {"rows": rows, "rowcount": cursor.rowcount, "lastrowid": cursor.lastrowid}
+    return (200, result)
+
+
+@route("POST", "/vacuum")
+async def post_vacuum(request):
+    await get_database().vacuum()
+    return (200, {})
+
+
+async def dispatch(request):
+    """Return status and JSON content of the response to a request."""
+    path = unquote(request.path)
+    allowed = False
+    for method, pattern, handler in ROUTES:
+        match = pattern.match(path)
+        if match is None:
+            continue
+        if method != request.method:
+            allowed = True
+            continue
+        return await handler(request, **match.groupdict())
+    if allowed:
+        raise HTTPError(405, f"{request.method} isn't allowed on {path}.")
+    raise HTTPError(404, f"Nothing is served at {path}.")
+
+
+async def handle_connection(reader, writer, token):
+    """Answer the requests of a station, in order, until it closes the connection."""
+    logger = get_logger("server.py")
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except HTTPError as error:
+                write_response(writer, error.status, {"error": str(error)}, keep_alive=False)
+                break
+            if request is None:
+                break
+
+            keep_alive = request.keep_alive()
+            try:
+                if not request.authorized(token):
+                    raise HTTPError(401, "The token of the server has to be given.")
+                (status, content) = await dispatch(request)
+            except HTTPError as error:
+                (status, content) = (error.status, {"error": str(error)})
+            except sqlite3.Error as error:
+                # Stations using a RemoteDatabase raise it again as it is
+                (status, content) = (400, {"error": str(error), "type": type(error).__name__})
+            except Exception as error:
+                logger.exception(f"Failed to answer {request.method} {request.path}.")
+                (status, content) = (500, {"error": str(error)})
+            write_response(writer, status, content, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host, port, on_started=None):
+    """Serve the database until cancelled."""
+    from migrations import initialize_database
+
+    global _statement_readers
+
+    config = get_config()
+    token = config.get("server", "token")
+    if not token:
+        raise ValueError("The server needs a token (see token in config.ini).")
+
+    logger = get_logger("server.py")
+    await initialize_database(logger)
+    _statement_readers = StatementReaders(
+        config.get("database", "path"), config.getint("database", "readers")
+    )
+    await _statement_readers.open()
+    # Stations don't archive expired orders when they use a server, it does
+    archiving = asyncio.create_task(archive_expired_orders(logger))
+    try:
+        server = await asyncio.start_server(partial(handle_connection, token=token), host, port)
+        (host, port) = server.sockets[0].getsockname()[:2]
+        logger.info(f"Serving the database on http://{host}:{port}.")
+        if on_started is not None:
+            on_started(host, port)
+        async with server:
+            await server.serve_forever()
+    finally:
+        archiving.cancel()
+        await asyncio.gather(archiving, return_exceptions=True)
+        await _statement_readers.close()
+        _statement_readers = None
+
+
+async def archive_expired_orders(logger):
+    """Archive expired orders and seal old audit events, as the application does on startup."""
+    from audit import seal_audit
+    from retention import run_retention
+
+    # Archiving goes on in the background, so its failures would go unnoticed otherwise
+    try:
+        await run_retention()
+        await seal_audit()
+    except Exception:
+        logger.exception("Failed to archive expired orders.")
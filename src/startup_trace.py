@@ -0,0 +1,27 @@
+import json
+import time
+
+
+class StartupTrace:
+    """Times the phases of startup, each one from the end of the previous one."""
+
+    def __init__(self):
+        self._start = self._last = time.perf_counter()
+        self.phases = {}
+
+    def mark(self, phase):
+        """End a phase (unless it has ended already)."""
+        if phase in self.phases:
+            return
+        now = time.perf_counter()
+        self.phases[phase] = now - self._last
+        self._last = now
+
+    def write(self, path):
+        """Write timings of the phases (in milliseconds) into a JSON file."""
+        trace = {
+            "phases": {phase: round(seconds * 1000, 1) for phase, seconds in self.phases.items()},
+            "total": round(sum(self.phases.values()) * 1000, 1),
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(trace, file, indent=4)
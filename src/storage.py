@@ -0,0 +1,519 @@
+from rollups import create_rollup_triggers, forget_profile, rebuild_rollups
+from search_index import (
+    create_search_index,
+    drop_search_index,
+    update_search_triggers,
+)
+
+# Orders are unique by client, food and date (within a profile), ordering the same food for the
+# same day again adds up the quantities
+ORDER_KEY = ("client_id", "food_id", "date")
+
+# Columns of an orphaned order, clients and food that still exist are copied along
+ORPHANED_COLUMNS = """client_id, first_name, last_name, address, phone_number,
+                      food_id, food_name, food_quantity, date"""
+
+
+class OrderSource:
+    """Orders of one profile (or of all of them), and how to reach them in SQL."""
+
+    def __init__(self, table, condition=None, params=(), key=None):
+        self.table = table
+        self._condition = condition
+        self._params = tuple(params)
+        # (column, value) that has to be inserted along with every order, if any
+        self._key = key
+
+    def where(self, *conditions):
+        """Return WHERE clause that selects orders of the source meeting all given conditions."""
+        conditions = [
+            condition for condition in (self._condition, *conditions) if condition
+        ]
+        if not conditions:
+            return ""
+        return f"WHERE {' AND '.join(f'({condition})' for condition in conditions)}"
+
+    def bind(self, *values):
+        """Return parameters of a statement made with where() or insert(), given values of its own."""
+        return (*self._params, *values)
+
+    def insert(self, columns, select=None):
+        """Return INSERT statement of an order into the source, given its columns.
+
+        Values are bound, unless a SELECT statement of values of many orders is given.
+        """
+        values = ["?"] * len(columns)
+        if self._key is not None:
+            columns = (self._key[0], *columns)
+            values = [self._key[1], *values]
+        if select is None:
+            return f"INSERT INTO {self.table} ({', '.join(columns)}) VALUES ({', '.join(values)});"
+        if self._key is None:
+            return f"INSERT INTO {self.table} ({', '.join(columns)}) {select};"
+        return f"INSERT INTO {self.table} ({', '.join(columns)}) SELECT {self._key[1]}, * FROM ({select});"
+
+    def upsert(self, columns, select=None):
+        """Return INSERT statement like insert() does, adding up quantities of orders that exist."""
+        key = ORDER_KEY if self._key is None else (self._key[0], *ORDER_KEY)
+        if select is None:
+            operation = self.insert(columns)
+        else:
+            # Without a WHERE clause, ON CONFLICT would be taken for the constraint of a join
+            operation = f"{self.insert(columns, f'SELECT * FROM ({select})')[:-1]} WHERE true;"
+        return f"""{operation[:-1]}
+                   ON CONFLICT ({', '.join(key)}) DO UPDATE
+                   SET
+                       food_quantity = {self.table}.food_quantity + excluded.food_quantity;"""
+
+
+class TableStorage:
+    """Every profile keeps its orders in a table of its own, named after the profile."""
+
+    partitioned = False
+
+    def source(self, profile_name):
+        """Return orders of a profile."""
+        # No need to sanitize, since profile names are sanitized on creation
+        return OrderSource(profile_name)
+
+    def search_table(self, profile_name):
+        """Return the search index of a profile."""
+        # Must not start with an uppercase letter, otherwise it would be taken for a profile
+        return f"search_{profile_name}"
+
+    async def sources(self, db):
+        """Return sources that hold orders of all profiles together."""
+        return [self.source(profile) for profile in await self.list_profiles(db)]
+
+    async def all_orders(self, db):
+        """Return a SELECT statement of orders of all profiles, along with the profile of each."""
+        selects = [
+            f"SELECT '{profile}' AS profile, client_id, food_id, food_quantity, date FROM {profile}"
+            for profile in await self.list_profiles(db)
+        ]
+        if not selects:
+            return "SELECT NULL AS profile, NULL AS client_id, NULL AS food_id, NULL AS food_quantity, NULL AS date WHERE 0"
+        return " UNION ALL ".join(selects)
+
+    async def orphaned_orders(self, db):
+        """Return a SELECT statement of orders whose client or food doesn't exist anymore."""
+        selects = [
+            f"""SELECT
+                    '{profile}' AS profile, {profile}.id AS id, {ORPHANED_COLUMNS}
+                FROM
+                    {profile}
+                    LEFT JOIN clients ON {profile}.client_id = clients.id
+                    LEFT JOIN food ON {profile}.food_id = food.id
+                WHERE
+                    clients.id IS NULL
+                    OR food.id IS NULL"""
+            for profile in await self.list_profiles(db)
+        ]
+        if not selects:
+            return "SELECT NULL AS profile WHERE 0"
+        return " UNION ALL ".join(selects)
+
+    async def list_profiles(self, db):
+        """Return names of all profiles."""
+        tables = []
+        async with db.execute(
+            "SELECT name FROM sqlite_master WHERE type='table';"
+        ) as cursor:
+            async for table in cursor:
+                tables.append(table[0])
+
+        # All profiles start with uppercase letter, so we check against that and return only them
+        return [profile for profile in filter(lambda table: table[0].isupper(), tables)]
+
+    async def create_profile_indexes(self, db, profile_name):
+        """Create indexes of a profile table."""
+        # Orders are listed and expired by date
+        operation = f"CREATE INDEX IF NOT EXISTS {profile_name}_date_idx ON {profile_name}(date);"
+        await db.execute(operation)
+
+        # Orders are looked up by client (when deleting a client), and the same order can't be
+        # added twice
+        operation = f"""
+                    CREATE UNIQUE INDEX IF NOT EXISTS {profile_name}_client_idx
+                    ON {profile_name}({', '.join(ORDER_KEY)});"""
+        await db.execute(operation)
+
+        # Orders are looked up by food when deleting a food
+        operation = f"CREATE INDEX IF NOT EXISTS {profile_name}_food_idx ON {profile_name}(food_id);"
+        await db.execute(operation)
+
+    async def create_profile_table(self, db, table):
+        """Create a table of orders of a profile."""
+        # Deleting a client or a food deletes its orders as well
+        operation = f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id INTEGER PRIMARY KEY,
+                        client_id INTEGER NOT NULL,
+                        food_id INTEGER NOT NULL,
+                        food_quantity INTEGER NOT NULL,
+                        date INTEGER NOT NULL,
+                        FOREIGN KEY (client_id) REFERENCES clients(id) ON DELETE CASCADE,
+                        FOREIGN KEY (food_id) REFERENCES food(id) ON DELETE CASCADE
+                    );"""
+        await db.execute(operation)
+
+    async def create_profile(self, db, profile_name):
+        """Create a profile table along with its indexes and search index."""
+        await self.create_profile_table(db, profile_name)
+        await self.create_profile_indexes(db, profile_name)
+        await create_search_index(db, profile_name, self.search_table(profile_name))
+        await self.update_search_triggers(db)
+        await create_rollup_triggers(db, profile_name, f"'{profile_name}'")
+
+    async def drop_profile(self, db, profile_name):
+        """Drop a profile table along with everything that belongs to it."""
+        # Dropping a table doesn't fire its triggers, so the rollups are updated beforehand
+        await forget_profile(db, profile_name, profile_name)
+        # Indexes and triggers of the table are dropped with it
+        await db.execute(f"DROP TABLE IF EXISTS {profile_name};")
+        await self.update_search_triggers(db)
+        await drop_search_index(db, self.search_table(profile_name))
+
+    async def update_search_triggers(self, db):
+        """(Re)create triggers that keep search indexes of all profiles up to date."""
+        indexes = [
+            (profile, self.search_table(profile))
+            for profile in await self.list_profiles(db)
+        ]
+        await update_search_triggers(db, indexes)
+
+    async def create_order_keys(self, db):
+        """Merge orders that are the same, and keep the same order from being added again."""
+        for profile in await self.list_profiles(db):
+            # The index of the same columns used to allow the same order more than once
+            await db.execute(f"DROP INDEX IF EXISTS {profile}_client_idx;")
+            await merge_same_orders(db, profile, ORDER_KEY)
+            await self.create_profile_indexes(db, profile)
+
+    async def create_rollup_triggers(self, db):
+        """Create triggers that keep the rollups up to date with all profile tables."""
+        for profile in await self.list_profiles(db):
+            await create_rollup_triggers(db, profile, f"'{profile}'")
+
+    async def rebuild_tables(self, db):
+        """Rebuild profile tables after their definition changed, dropping orphaned orders."""
+        # Triggers on clients and food refer to the tables, which would make renaming them fail
+        await update_search_triggers(db, [])
+        for profile in await self.list_profiles(db):
+            # SQLite can't alter constraints of a table, so it's copied into a new one instead
+            table = f"{profile}_rebuilt"
+            await self.create_profile_table(db, table)
+            indexes = await table_indexes(db, profile)
+            operation = f"""
+                        INSERT INTO {table}
+                        SELECT
+                            id, client_id, food_id, food_quantity, date
+                        FROM
+                            {profile}
+                        WHERE
+                            client_id IN (SELECT id FROM clients)
+                            AND food_id IN (SELECT id FROM food);"""
+            await db.execute(operation)
+            await db.execute(f"DROP TABLE {profile};")
+            await db.execute(f"ALTER TABLE {table} RENAME TO {profile};")
+            # The table gets back the indexes it had, which depend on the migrations it went through
+            for operation in indexes:
+                await db.execute(operation)
+            await create_search_index(db, profile, self.search_table(profile))
+            await create_rollup_triggers(db, profile, f"'{profile}'")
+        await self.update_search_triggers(db)
+        await rebuild_rollups(db, self)
+
+
+class PartitionedStorage:
+    """Orders of all profiles are kept in one table, where profile_id tells them apart."""
+
+    partitioned = True
+
+    PROFILE_ID = "(SELECT id FROM profiles WHERE name = ?)"
+    # Profile of an order in triggers, where {row} stands for NEW or OLD
+    PROFILE_NAME = "(SELECT name FROM profiles WHERE id = {row}.profile_id)"
+
+    def source(self, profile_name):
+        """Return orders of a profile."""
+        return OrderSource(
+            "orders",
+            f"orders.profile_id = {self.PROFILE_ID}",
+            (profile_name,),
+            key=("profile_id", self.PROFILE_ID),
+        )
+
+    def search_table(self, profile_name):
+        """Return the search index of a profile."""
+        return "orders_search"
+
+    async def sources(self, db):
+        """Return sources that hold orders of all profiles together."""
+        return [OrderSource("orders")]
+
+    async def all_orders(self, db):
+        """Return a SELECT statement of orders of all profiles, along with the profile of each."""
+        return """SELECT
+                      profiles.name AS profile, client_id, food_id, food_quantity, date
+                  FROM
+                      orders
+                      INNER JOIN profiles ON orders.profile_id = profiles.id"""
+
+    async def orphaned_orders(self, db):
+        """Return a SELECT statement of orders whose profile, client or food doesn't exist anymore."""
+        return f"""SELECT
+                       profiles.name AS profile, orders.id AS id, {ORPHANED_COLUMNS}
+                   FROM
+                       orders
+                       LEFT JOIN profiles ON orders.profile_id = profiles.id
+                       LEFT JOIN clients ON orders.client_id = clients.id
+                       LEFT JOIN food ON orders.food_id = food.id
+                   WHERE
+                       profiles.id IS NULL
+                       OR clients.id IS NULL
+                       OR food.id IS NULL"""
+
+    async def list_profiles(self, db):
+        """Return names of all profiles."""
+        async with db.execute("SELECT name FROM profiles ORDER BY id;") as cursor:
+            return [profile async for (profile,) in cursor]
+
+    async def create_orders_table(self, db, table):
+        """Create a table of orders of all profiles."""
+        # Deleting a profile, a client or a food deletes its orders as well
+        operation = f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id INTEGER PRIMARY KEY,
+                        profile_id INTEGER NOT NULL,
+                        client_id INTEGER NOT NULL,
+                        food_id INTEGER NOT NULL,
+                        food_quantity INTEGER NOT NULL,
+                        date INTEGER NOT NULL,
+                        FOREIGN KEY (profile_id) REFERENCES profiles(id) ON DELETE CASCADE,
+                        FOREIGN KEY (client_id) REFERENCES clients(id) ON DELETE CASCADE,
+                        FOREIGN KEY (food_id) REFERENCES food(id) ON DELETE CASCADE
+                    );"""
+        await db.execute(operation)
+
+    async def create_tables(self, db):
+        """Create profiles and orders tables, along with the search index of orders."""
+        operation = """
+                    CREATE TABLE IF NOT EXISTS profiles (
+                        id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL
+                    );"""
+        await db.execute(operation)
+        await self.create_orders_table(db, "orders")
+
+        # Orders of a profile are listed and expired by date
+        operation = "CREATE INDEX IF NOT EXISTS orders_profile_idx ON orders(profile_id, date);"
+        await db.execute(operation)
+
+        # Orders are looked up by client (when deleting a client)
+        operation = """
+                    CREATE INDEX IF NOT EXISTS orders_client_idx
+                    ON orders(client_id, food_id, date);"""
+        await db.execute(operation)
+
+        # Orders are looked up by food when deleting a food, and expired by date in all profiles
+        operation = "CREATE INDEX IF NOT EXISTS orders_food_idx ON orders(food_id);"
+        await db.execute(operation)
+
+        operation = "CREATE INDEX IF NOT EXISTS orders_date_idx ON orders(date);"
+        await db.execute(operation)
+
+        await create_search_index(db, "orders", "orders_search")
+        await self.update_search_triggers(db)
+        await self.create_rollup_triggers(db)
+
+    async def create_profile(self, db, profile_name):
+        """Add a profile."""
+        await db.execute("INSERT INTO profiles (name) VALUES (?);", (profile_name,))
+
+    async def drop_profile(self, db, profile_name):
+        """Delete a profile along with its orders."""
+        # Orders would be deleted along with the profile, but then their triggers couldn't tell
+        # which profile they belonged to
+        source = self.source(profile_name)
+        await db.execute(f"DELETE FROM orders {source.where()};", source.bind())
+        await db.execute("DELETE FROM profiles WHERE name = (?);", (profile_name,))
+
+    async def update_search_triggers(self, db):
+        """(Re)create triggers that keep the search index of orders up to date."""
+        await update_search_triggers(db, [("orders", "orders_search")])
+
+    async def create_order_keys(self, db):
+        """Merge orders that are the same, and keep the same order from being added again."""
+        # Orders of different profiles can be the same
+        key = ("profile_id", *ORDER_KEY)
+        await merge_same_orders(db, "orders", key)
+        operation = f"""
+                    CREATE UNIQUE INDEX IF NOT EXISTS orders_order_idx
+                    ON orders({', '.join(key)});"""
+        await db.execute(operation)
+
+    async def create_rollup_triggers(self, db):
+        """Create triggers that keep the rollups up to date with the orders table."""
+        await create_rollup_triggers(db, "orders", self.PROFILE_NAME)
+
+    async def rebuild_tables(self, db):
+        """Rebuild the orders table after its definition changed, dropping orphaned orders."""
+        # Triggers on clients and food refer to the table, which would make renaming it fail
+        await update_search_triggers(db, [])
+        # SQLite can't alter constraints of a table, so it's copied into a new one instead
+        await self.create_orders_table(db, "orders_rebuilt")
+        indexes = await table_indexes(db, "orders")
+        operation = """
+                    INSERT INTO orders_rebuilt
+                    SELECT
+                        id, profile_id, client_id, food_id, food_quantity, date
+                    FROM
+                        orders
+                    WHERE
+                        profile_id IN (SELECT id FROM profiles)
+                        AND client_id IN (SELECT id FROM clients)
+                        AND food_id IN (SELECT id FROM food);"""
+        await db.execute(operation)
+        await db.execute("DROP TABLE orders;")
+        await db.execute("ALTER TABLE orders_rebuilt RENAME TO orders;")
+        # Indexes and triggers were dropped along with the old table, the table gets back the
+        # indexes it had, which depend on the migrations it went through
+        for operation in indexes:
+            await db.execute(operation)
+        await self.create_tables(db)
+        await rebuild_rollups(db, self)
+
+
+async def detect_storage(db):
+    """Return the storage that the database uses."""
+    operation = "SELECT 1 FROM sqlite_master WHERE type='table' AND name='profiles';"
+    async with db.execute(operation) as cursor:
+        partitioned = await cursor.fetchone() is not None
+    return PartitionedStorage() if partitioned else TableStorage()
+
+
+async def table_indexes(db, table):
+    """Return statements that create the indexes of a table."""
+    # Indexes of constraints have no statement, they're created along with the table
+    operation = """
+                SELECT sql FROM sqlite_master
+                WHERE type='index' AND tbl_name = ? AND sql IS NOT NULL;"""
+    async with db.execute(operation, (table,)) as cursor:
+        return [operation async for (operation,) in cursor]
+
+
+async def merge_same_orders(db, table, key, condition="true", values=()):
+    """Merge orders of a table that have the same key into the first one, adding up quantities.
+
+    Only orders that meet the condition are merged. Return how many orders were merged away.
+    """
+    same = " AND ".join(f"same.{column} = {table}.{column}" for column in key)
+    operation = f"""
+                UPDATE {table}
+                SET
+                    food_quantity = (
+                        SELECT
+                            sum(food_quantity)
+                        FROM
+                            {table} AS same
+                        WHERE
+                            {same} AND ({condition})
+                    )
+                WHERE
+                    id IN (
+                        SELECT
+                            min(id)
+                        FROM
+                            {table}
+                        WHERE
+                            {condition}
+                        GROUP BY
+                            {', '.join(key)}
+                        HAVING
+                            count(*) > 1
+                    );"""
+    await db.execute(operation, (*values, *values))
+    operation = f"""
+                DELETE FROM {table}
+                WHERE
+                    ({condition})
+                    AND id NOT IN (
+                        SELECT min(id) FROM {table} WHERE {condition} GROUP BY {', '.join(key)}
+                    );"""
+    cursor = await db.execute(operation, (*values, *values))
+    return cursor.rowcount
+
+
+async def count_orders(db, storage, condition, *values):
+    """Return the number of orders (of all profiles) that meet a condition."""
+    count = 0
+    for source in await storage.sources(db):
+        operation = f"SELECT count(*) FROM {source.table} {source.where(condition)};"
+        async with db.execute(operation, source.bind(*values)) as cursor:
+            (found,) = await cursor.fetchone()
+        count += found
+    return count
+
+
+async def renumber_orders(db, profile, offset):
+    """Add an offset to ids of orders of a profile wherever they're referred to."""
+    # Imported here, since the audit module needs the database, which needs this module
+    from audit import record
+
+    if offset == 0:
+        return
+    # Made negative first, so that no id collides with one that hasn't been renumbered yet
+    operation = """
+                UPDATE restored_orders
+                SET order_id = -(order_id + (?))
+                WHERE profile = (?);"""
+    await db.execute(operation, (offset, profile))
+    operation = """
+                UPDATE restored_orders
+                SET order_id = -order_id
+                WHERE profile = (?) AND order_id < 0;"""
+    await db.execute(operation, (profile,))
+    operation = """
+                UPDATE audit
+                SET entity_id = entity_id + (?)
+                WHERE entity = 'order' AND profile = (?);"""
+    await db.execute(operation, (offset, profile))
+    # Events that were sealed already and archived orders keep their old ids, which the
+    # offset maps to the new ones
+    await record(db, "orders_renumbered", profile=profile, offset=offset)
+
+
+async def partition(db, logger):
+    """Move orders of every profile table into one partitioned orders table."""
+    tables = TableStorage()
+    partitioned = PartitionedStorage()
+
+    await db.execute("BEGIN;")
+    await partitioned.create_tables(db)
+    await partitioned.create_order_keys(db)
+    for profile in await tables.list_profiles(db):
+        await partitioned.create_profile(db, profile)
+        # Ids of orders of different profiles collide, so orders of every profile are moved
+        # past those of the profiles moved before (the first profile keeps its ids)
+        async with db.execute("SELECT coalesce(max(id), 0) FROM orders;") as cursor:
+            (offset,) = await cursor.fetchone()
+        operation = f"""
+                    INSERT INTO orders (
+                        id, profile_id, client_id, food_id, food_quantity, date
+                    )
+                    SELECT
+                        id + (?), {partitioned.PROFILE_ID}, client_id, food_id, food_quantity, date
+                    FROM
+                        {profile};"""
+        await db.execute(operation, (offset, profile))
+        await renumber_orders(db, profile, offset)
+        await db.execute(f"DROP TABLE {profile};")
+        await drop_search_index(db, tables.search_table(profile))
+        logger.info(f"Moved orders of the '{profile}' table into the 'orders' table.")
+    await partitioned.update_search_triggers(db)
+    # Orders were added to the rollups once more while they were moved
+    await rebuild_rollups(db, partitioned)
+
+    # Give the query planner statistics of the new tables
+    await db.execute("ANALYZE;")
+    await db.commit()
+    return partitioned
@@ -0,0 +1,136 @@
+# Storage profiles are named sets of pragmas applied to every connection. All of them use WAL,
+# so that readers don't block the writer; they differ in how much durability is traded for
+# speed. Pragmas in the [pragmas] section of config.ini override those of the chosen profile.
+
+PROFILES = {
+    # Every commit is synced to disk before it returns
+    "safe": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": "-16000",
+        "mmap_size": "0",
+        "temp_store": "MEMORY",
+        "busy_timeout": "5000",
+    },
+    # Commits are synced at checkpoints: a power loss may undo the last ones, never corrupt
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": "-32000",
+        "mmap_size": "134217728",
+        "temp_store": "MEMORY",
+        "busy_timeout": "5000",
+    },
+    # Nothing is synced: an OS crash or power loss may corrupt the database
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": "-64000",
+        "mmap_size": "268435456",
+        "temp_store": "MEMORY",
+        "busy_timeout": "5000",
+    },
+}
+
+
+def get_pragmas(config):
+    """Return pragmas of the storage profile chosen in the configuration."""
+    profile = config.get("database", "storage_profile")
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Storage profile ({profile}) doesn't exist, choose one of: {', '.join(PROFILES)}."
+        )
+    return {**PROFILES[profile], **config["pragmas"]}
+
+
+async def benchmark_profile(path, pragmas, commits, reads):
+    """Return commit latencies (in seconds) and read throughput (in queries per second)."""
+    import asyncio
+    import random
+    import time
+
+    from database import Database
+    from logger import get_logger
+    from migrations import migrate
+
+    database = Database(path, readers=2, pragmas=pragmas)
+    try:
+        async with database.writer() as db:
+            await migrate(db, get_logger("storage_profiles.py"))
+            await db.execute("BEGIN;")
+            await database.storage.create_profile(db, "Benchmark")
+            await db.executemany(
+                "INSERT INTO clients (first_name, last_name, address, phone_number) VALUES (?, ?, '', '');",
+                ((f"Client{i}", "Benchmark") for i in range(1000)),
+            )
+            await db.execute("INSERT INTO food (food_name) VALUES ('Benchmark');")
+            await db.commit()
+        source = database.storage.source("Benchmark")
+        insert = source.upsert(("client_id", "food_id", "food_quantity", "date"))
+        page = f"""SELECT
+                       client_id, food_id, food_quantity, date
+                   FROM
+                       {source.table}
+                   {source.where("client_id = (?)")}
+                   ORDER BY
+                       date DESC
+                   LIMIT 50;"""
+
+        # Orders are added one by one and committed each time, as the dialogs do
+        latencies = []
+        for i in range(commits):
+            start = time.perf_counter()
+            async with database.writer() as db:
+                values = source.bind(i % 1000 + 1, 1, 1, f"2026-01-{i % 28 + 1:02}")
+                await db.execute(insert, values)
+                await db.commit()
+            latencies.append(time.perf_counter() - start)
+
+        async def read(count):
+            for _ in range(count):
+                async with database.reader() as db:
+                    async with db.execute(page, source.bind(random.randint(1, 1000))) as cursor:
+                        await cursor.fetchall()
+
+        async def write_while_reading():
+            for i in range(reads // 10):
+                async with database.writer() as db:
+                    await db.execute(insert, source.bind(i % 1000 + 1, 1, 1, "2026-02-01"))
+                    await db.commit()
+
+        # Readers query pages of orders while the writer keeps committing
+        start = time.perf_counter()
+        await asyncio.gather(read(reads // 2), read(reads - reads // 2), write_while_reading())
+        throughput = reads / (time.perf_counter() - start)
+        return (latencies, throughput)
+    finally:
+        await database.close()
+
+
+if __name__ == "__main__":
+    """Measure commit latency and read throughput of every storage profile on this machine."""
+    import argparse
+    import asyncio
+    import os
+    import statistics
+    import tempfile
+
+    from config import get_config
+
+    parser = argparse.ArgumentParser(description="Benchmark the storage profiles.")
+    parser.add_argument("--commits", type=int, default=200, help="commits to time")
+    parser.add_argument("--reads", type=int, default=2000, help="queries to time")
+    args = parser.parse_args()
+
+    # Benchmark on the same disk as the database, since that's what commit latency depends on
+    directory = os.path.dirname(os.path.abspath(get_config().get("database", "path")))
+    print(f"{'profile':<10}{'commit p50':>12}{'commit p95':>12}{'reads/s':>12}")
+    for name, pragmas in PROFILES.items():
+        with tempfile.TemporaryDirectory(dir=directory) as temporary:
+            (latencies, throughput) = asyncio.run(
+                benchmark_profile(
+                    os.path.join(temporary, "benchmark.db"), pragmas, args.commits, args.reads
+                )
+            )
+        (p50, p95) = (statistics.quantiles(latencies, n=20)[i] * 1000 for i in (9, 18))
+        print(f"{name:<10}{p50:>10.2f}ms{p95:>10.2f}ms{throughput:>12.0f}")
@@ -0,0 +1,125 @@
+import asyncio
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication, QMessageBox, QProgressDialog
+
+from logger import get_logger
+
+# The event loop only keeps weak references to tasks, so keep them alive until they finish
+_tasks = set()
+
+
+def run_task(coro, busy_widget=None, label=None):
+    """Run a coroutine in the background of the Qt event loop and return its task.
+
+    While the task runs, the busy cursor is shown and busy_widget (if any) is disabled.
+    If a label is given, a progress dialog that allows to cancel the task appears
+    when the task takes a while.
+    """
+    name = coro.__qualname__
+    task = asyncio.ensure_future(coro)
+    _tasks.add(task)
+
+    QApplication.setOverrideCursor(Qt.BusyCursor)
+    if busy_widget is not None:
+        busy_widget.setEnabled(False)
+
+    progress = None
+    if label is not None:
+        progress = QProgressDialog(label, "Annuler", 0, 0, busy_widget)
+        progress.setWindowTitle("pyfncm - Python Food and Clientèle Manager")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(500)
+        progress.canceled.connect(task.cancel)
+
+    def done(task):
+        _tasks.discard(task)
+
+        QApplication.restoreOverrideCursor()
+        if busy_widget is not None:
+            busy_widget.setEnabled(True)
+        if progress is not None:
+            # Closing the dialog emits canceled, which is meaningless now
+            progress.canceled.disconnect(task.cancel)
+            progress.close()
+            progress.deleteLater()
+
+        log_outcome(name, task)
+        # The user is waiting for the task, so they're told it has failed, not only the log
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            run_in_background(
+                warning(
+                    busy_widget,
+                    "Une erreur s'est produite!",
+                    f"L'opération n'a pas pu être effectuée ({str(error) or type(error).__name__}).",
+                )
+            )
+
+    task.add_done_callback(done)
+    return task
+
+
+def run_in_background(coro):
+    """Run a coroutine in the background of the Qt event loop, without showing the user."""
+    name = coro.__qualname__
+    task = asyncio.ensure_future(coro)
+    _tasks.add(task)
+
+    def done(task):
+        _tasks.discard(task)
+        log_outcome(name, task)
+
+    task.add_done_callback(done)
+    return task
+
+
+async def wait_for_tasks():
+    """Wait until every task that runs in the background has finished."""
+    while _tasks:
+        await asyncio.wait(list(_tasks))
+
+
+def log_outcome(name, task):
+    """Log a task that has been cancelled or has failed."""
+    if task.cancelled():
+        get_logger("tasks.py").info(f"Task ({name}) has been cancelled.")
+    elif task.exception() is not None:
+        get_logger("tasks.py").error(
+            f"Task ({name}) has failed.", exc_info=task.exception()
+        )
+
+
+async def show_message_box(box):
+    """Show a message box and wait until it's closed, without blocking the event loop."""
+    # QMessageBox.exec() would start a nested event loop inside of the running task
+    future = asyncio.get_running_loop().create_future()
+
+    def finished(_):
+        if not future.done():
+            future.set_result(box.standardButton(box.clickedButton()))
+        box.deleteLater()
+
+    box.finished.connect(finished)
+    box.open()
+    return await future
+
+
+async def information(parent, title, text):
+    """Show an information message box."""
+    box = QMessageBox(QMessageBox.Information, title, text, QMessageBox.Ok, parent)
+    return await show_message_box(box)
+
+
+async def warning(parent, title, text):
+    """Show a warning message box."""
+    box = QMessageBox(QMessageBox.Warning, title, text, QMessageBox.Ok, parent)
+    return await show_message_box(box)
+
+
+async def question(parent, title, text):
+    """Show a Yes/No question message box and return the chosen button."""
+    box = QMessageBox(
+        QMessageBox.Question, title, text, QMessageBox.Yes | QMessageBox.No, parent
+    )
+    return await show_message_box(box)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules of the application are imported by their bare names, as they import each other
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,286 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+import config
+import database
+from logger import get_logger
+
+# Schema of databases made before migrations existed (main.py and add_profile_dialog.py)
+LEGACY_SCHEMA = """
+CREATE TABLE clients (
+    id INTEGER PRIMARY KEY, first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL, address TEXT NOT NULL,
+    phone_number TEXT NOT NULL
+);
+CREATE INDEX first_name_idx ON clients(first_name);
+CREATE INDEX last_name_idx ON clients(last_name);
+CREATE INDEX phone_number_idx ON clients(phone_number);
+CREATE TABLE food (
+    id INTEGER PRIMARY KEY, food_name TEXT UNIQUE NOT NULL,
+    red_color INTEGER, green_color INTEGER,
+    blue_color INTEGER
+);
+"""
+
+LEGACY_PROFILE = """
+CREATE TABLE {profile} (
+    id INTEGER PRIMARY KEY,
+    client_id INTEGER NOT NULL,
+    food_id INTEGER NOT NULL,
+    food_quantity INTEGER NOT NULL,
+    date INTEGER NOT NULL,
+    FOREIGN KEY (client_id) REFERENCES clients(id),
+    FOREIGN KEY (food_id) REFERENCES food(id)
+);
+"""
+
+# (client id, food id, quantity, date) of orders of every profile
+LEGACY_ORDERS = {
+    "Cuisine": [
+        (1, 1, 2, "2001-01-01"),
+        (1, 1, 1, "2030-01-01"),
+        # The same order twice, which only a key added by a migration keeps from happening
+        (2, 1, 1, "2030-01-02"),
+        (2, 1, 4, "2030-01-02"),
+        # Its client was deleted before deleting a client deleted its orders
+        (9, 2, 1, "2030-01-03"),
+    ],
+    "Bar": [
+        (2, 2, 3, "2001-02-01"),
+        (1, 2, 1, "2030-02-01"),
+    ],
+}
+
+
+@pytest.fixture
+def legacy_database(tmp_path, monkeypatch):
+    """Make a database of the schema that came before migrations, return the config.ini path."""
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "config.ini"
+    path.write_text("[retention]\ndays = 365\n")
+    monkeypatch.setattr(config, "_config", None)
+    monkeypatch.setattr(database, "_database", None)
+
+    connection = sqlite3.connect(tmp_path / "data.db")
+    connection.executescript(LEGACY_SCHEMA)
+    connection.executemany(
+        "INSERT INTO clients (first_name, last_name, address, phone_number) VALUES (?, ?, ?, ?);",
+        [("Jean", "Dupont", "1 rue", "01"), ("Marie", "Durand", "2 rue", "02")],
+    )
+    connection.executemany("INSERT INTO food (food_name) VALUES (?);", [("Pain",), ("Lait",)])
+    for profile, orders in LEGACY_ORDERS.items():
+        connection.executescript(LEGACY_PROFILE.format(profile=profile))
+        connection.executemany(
+            f"INSERT INTO {profile} (client_id, food_id, food_quantity, date) VALUES (?, ?, ?, ?);",
+            orders,
+        )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def run(coro):
+    """Run a coroutine with the database of the test, closing it afterwards."""
+
+    async def main():
+        try:
+            return await coro
+        finally:
+            await database.get_database().close()
+
+    return asyncio.run(main())
+
+
+async def initialize():
+    from migrations import initialize_database
+
+    await initialize_database(get_logger("test_database.py"))
+
+
+async def read(operation, parameters=()):
+    """Return rows of a statement."""
+    async with database.get_database().reader() as db:
+        async with db.execute(operation, parameters) as cursor:
+            return await cursor.fetchall()
+
+
+async def profile_orders(profile):
+    """Return (client id, food id, quantity, date) of orders of a profile, by date."""
+    source = database.get_database().storage.source(profile)
+    operation = f"""SELECT
+                        client_id, food_id, food_quantity, date
+                    FROM
+                        {source.table}
+                    {source.where()}
+                    ORDER BY
+                        date, client_id;"""
+    return await read(operation, source.bind())
+
+
+async def rollup_mismatches():
+    from rollups import verify_rollups
+
+    async with database.get_database().reader() as db:
+        return await verify_rollups(db, database.get_database().storage)
+
+
+def test_migrations_bring_legacy_database_up_to_date(legacy_database):
+    from migrations import MIGRATIONS
+    from retention import read_archive
+
+    async def check():
+        await initialize()
+        assert await read("PRAGMA user_version;") == [(len(MIGRATIONS),)]
+        assert len(MIGRATIONS) == 10
+        # The same orders were merged, and the orphaned one was archived
+        assert await profile_orders("Cuisine") == [
+            (1, 1, 2, "2001-01-01"),
+            (1, 1, 1, "2030-01-01"),
+            (2, 1, 5, "2030-01-02"),
+        ]
+        assert await profile_orders("Bar") == [(2, 2, 3, "2001-02-01"), (1, 2, 1, "2030-02-01")]
+        assert set((await rollup_mismatches()).values()) == {0}
+
+        # Applying them again changes nothing
+        await initialize()
+        assert len(await profile_orders("Cuisine")) == 3
+
+    run(check())
+    [orphan] = read_archive()
+    assert (orphan["profile"], orphan["client_id"], orphan["first_name"]) == ("Cuisine", 9, None)
+
+
+def test_partitioning_keeps_orders_and_what_refers_to_them(legacy_database):
+    from operations import add_order, make
+    from retention import get_retention, restore_orders
+
+    async def prepare():
+        await initialize()
+        # Restored orders and audit events refer to orders by id
+        assert await get_retention().run() == 2
+        assert await restore_orders("Bar") == 1
+        await make(add_order, "Bar", (1, 1, 7, "2030-02-02"))
+
+    async def check():
+        await initialize()
+        assert database.get_database().storage.partitioned
+        assert await profile_orders("Cuisine") == [(1, 1, 1, "2030-01-01"), (2, 1, 5, "2030-01-02")]
+        assert await profile_orders("Bar") == [
+            (2, 2, 3, "2001-02-01"),
+            (1, 2, 1, "2030-02-01"),
+            (1, 1, 7, "2030-02-02"),
+        ]
+        # Orders of Bar were moved past those of Cuisine, what refers to them was moved as well
+        operation = """SELECT
+                           date
+                       FROM
+                           restored_orders
+                           INNER JOIN orders ON restored_orders.order_id = orders.id
+                           INNER JOIN profiles ON orders.profile_id = profiles.id
+                       WHERE
+                           restored_orders.profile = profiles.name;"""
+        assert await read(operation) == [("2001-02-01",)]
+        operation = """SELECT
+                           audit.profile, date
+                       FROM
+                           audit
+                           INNER JOIN orders ON audit.entity_id = orders.id
+                           INNER JOIN profiles ON orders.profile_id = profiles.id
+                       WHERE
+                           audit.profile = profiles.name
+                           AND audit.event = 'order_added';"""
+        assert await read(operation) == [("Bar", "2030-02-02")]
+        assert set((await rollup_mismatches()).values()) == {0}
+
+    run(prepare())
+    with open(legacy_database, "a") as file:
+        file.write("[database]\nstorage = partitioned\n")
+    config._config = None
+    database._database = None
+    run(check())
+
+
+def test_archived_orders_are_restored(legacy_database):
+    from retention import get_retention, read_archive, restore_orders
+
+    async def archive():
+        await initialize()
+        return await get_retention().run()
+
+    async def restore():
+        restored = await restore_orders("Cuisine")
+        # Restored orders are kept for a retention window, whatever their date
+        archived = await get_retention().run()
+        return (restored, archived, await profile_orders("Cuisine"))
+
+    assert run(archive()) == 2
+    assert {(order["profile"], order["date"]) for order in read_archive()} == {
+        ("Cuisine", "2001-01-01"),
+        ("Bar", "2001-02-01"),
+        ("Cuisine", "2030-01-03"),
+    }
+    (restored, archived, orders) = run(restore())
+    assert (restored, archived) == (1, 0)
+    assert orders[0] == (1, 1, 2, "2001-01-01")
+
+
+def test_importer(legacy_database, tmp_path):
+    from importer import import_csv
+
+    clients = tmp_path / "clients.csv"
+    clients.write_text(
+        "first_name;last_name;address;phone_number\n"
+        "paul;petit;3 rue;03\n"
+        "Jean;Dupont;4 rue;04\n"
+        ";Vide;5 rue;05\n",
+        encoding="utf-8",
+    )
+    orders = tmp_path / "orders.csv"
+    orders.write_text(
+        "first_name,last_name,food_name,food_quantity,date\n"
+        "Paul,Petit,Pain,2,2030-03-01\n"
+        "Paul,Petit,Pain,1,2030-03-01\n"
+        "Paul,Petit,Beurre,1,2030-03-01\n",
+        encoding="utf-8",
+    )
+
+    async def check():
+        await initialize()
+        report = await import_csv("clients", str(clients), on_duplicate="update")
+        assert (report.read, report.imported, report.updated, report.rejected) == (3, 1, 1, 1)
+        assert await read("SELECT address FROM clients WHERE first_name = 'Jean';") == [("4 rue",)]
+
+        report = await import_csv("orders", str(orders), "Cuisine")
+        assert (report.read, report.imported, report.duplicates, report.rejected) == (3, 1, 1, 1)
+        assert (3, 1, 3, "2030-03-01") in await profile_orders("Cuisine")
+        assert set((await rollup_mismatches()).values()) == {0}
+
+    run(check())
+
+
+def test_client_search_pages(legacy_database):
+    from client_search import search_clients
+    from operations import add_client, make
+
+    async def check():
+        await initialize()
+        for number in range(250):
+            await make(add_client, ("Jean", f"Martin{number:03}", "rue", f"06{number:08}"))
+
+        found = []
+        after = None
+        while True:
+            (clients, after) = await search_clients("jean", after, limit=100)
+            if not clients:
+                break
+            assert len(clients) <= 100
+            found += clients
+        return found
+
+    found = run(check())
+    # Every Jean, each of them once
+    assert len(found) == 251
+    assert len({client[0] for client in found}) == 251
+    assert all(client[1] == "Jean" for client in found)
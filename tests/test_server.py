@@ -0,0 +1,197 @@
+import asyncio
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+import config
+import database
+
+TOKEN = "secret"
+HEADERS = {"Authorization": f"Bearer {TOKEN}", "Content-Type": "application/json"}
+
+
+@pytest.fixture
+def port(tmp_path, monkeypatch):
+    """Serve a new database in a thread of its own, return the port it listens on."""
+    from server import serve
+
+    monkeypatch.chdir(tmp_path)
+    # Archiving waits long enough not to start before the server is stopped
+    (tmp_path / "config.ini").write_text(f"[server]\ntoken = {TOKEN}\n[retention]\ndelay = 3600\n")
+    monkeypatch.setattr(config, "_config", None)
+    monkeypatch.setattr(database, "_database", None)
+
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    ports = []
+
+    def on_started(host, port):
+        ports.append(port)
+        started.set()
+
+    async def run():
+        try:
+            await serve("127.0.0.1", 0, on_started=on_started)
+        finally:
+            await database.get_database().close()
+
+    def run_until_cancelled():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+
+    task = loop.create_task(run())
+    thread = threading.Thread(target=run_until_cancelled)
+    thread.start()
+    assert started.wait(10), "the server didn't start"
+    yield ports[0]
+
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(10)
+    loop.close()
+
+
+def request(connection, method, path, body=None, headers=HEADERS):
+    """Make a request on a connection, return the status and the JSON response."""
+    connection.request(method, path, None if body is None else json.dumps(body), headers)
+    response = connection.getresponse()
+    return (response.status, json.loads(response.read()))
+
+
+def read_response(file):
+    """Read a response from a socket's file, return the status and the JSON response."""
+    status = int(file.readline().split()[1])
+    length = 0
+    while (line := file.readline()) not in (b"\r\n", b""):
+        (name, _, value) = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return (status, json.loads(file.read(length)))
+
+
+def add_client_and_food(connection):
+    """Add a profile, a client and a food, return ids of the client and the food."""
+    assert request(connection, "POST", "/profiles", {"name": "Cuisine"})[0] == 201
+    client = {"first_name": "Jean", "last_name": "Dupont", "address": "1 rue", "phone_number": "01"}
+    (status, client) = request(connection, "POST", "/clients", client)
+    assert status == 201
+    (status, food) = request(connection, "POST", "/food", {"food_name": "Pain"})
+    assert status == 201
+    return (client["id"], food["id"])
+
+
+def test_token_is_required(port):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    assert request(connection, "GET", "/profiles", headers={})[0] == 401
+    wrong = {"Authorization": "Bearer wrong"}
+    assert request(connection, "GET", "/profiles", headers=wrong)[0] == 401
+    assert request(connection, "GET", "/profiles") == (200, {"profiles": []})
+
+
+def test_keep_alive(port):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    assert request(connection, "GET", "/profiles")[0] == 200
+    sock = connection.sock
+    assert request(connection, "POST", "/profiles", {"name": "Cuisine"})[0] == 201
+    assert request(connection, "GET", "/profiles") == (200, {"profiles": ["Cuisine"]})
+    # All of them were answered on the same connection
+    assert connection.sock is sock
+
+
+def test_pipelined_requests_are_answered_in_order(port):
+    body = json.dumps({"name": "Cuisine"}).encode()
+    head = f"Authorization: Bearer {TOKEN}\r\nHost: localhost\r\n"
+    requests = (
+        f"GET /profiles HTTP/1.1\r\n{head}\r\n".encode()
+        + f"POST /profiles HTTP/1.1\r\n{head}Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+        + f"GET /profiles HTTP/1.1\r\n{head}Connection: close\r\n\r\n".encode()
+    )
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        # Sent all at once, before any of them has been answered
+        sock.sendall(requests)
+        file = sock.makefile("rb")
+        assert read_response(file) == (200, {"profiles": []})
+        assert read_response(file) == (201, {"name": "Cuisine"})
+        assert read_response(file) == (200, {"profiles": ["Cuisine"]})
+        # The last one asked to close the connection
+        assert file.read() == b""
+
+
+def test_orders_are_committed_or_rolled_back_together(port):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    (client_id, food_id) = add_client_and_food(connection)
+    order = {"client_id": client_id, "food_id": food_id, "food_quantity": 2}
+
+    orders = [order | {"date": "2030-01-01"}, order | {"date": "2030-01-02"}]
+    (status, content) = request(connection, "POST", "/profiles/Cuisine/orders", orders)
+    assert status == 201
+    assert len(content["ids"]) == 2
+
+    # The second order's food doesn't exist, so the first one isn't added either
+    orders = [
+        order | {"date": "2030-01-03"},
+        order | {"food_id": food_id + 1, "date": "2030-01-04"},
+    ]
+    (status, content) = request(connection, "POST", "/profiles/Cuisine/orders", orders)
+    assert (status, content["type"]) == (400, "IntegrityError")
+
+    (status, content) = request(connection, "GET", "/profiles/Cuisine/orders")
+    assert [order["date"] for order in content["orders"]] == ["2030-01-02", "2030-01-01"]
+    # The writer wasn't left in the transaction that failed
+    path = f"/profiles/Cuisine/orders/{content['orders'][0]['id']}"
+    assert request(connection, "DELETE", path)[0] == 200
+    (status, content) = request(connection, "GET", "/profiles/Cuisine/orders")
+    assert [order["date"] for order in content["orders"]] == ["2030-01-01"]
+
+
+def test_statements_can_only_read(port, tmp_path):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    add_client_and_food(connection)
+
+    body = {"operation": "SELECT first_name FROM clients WHERE id = (?);", "parameters": [1]}
+    (status, content) = request(connection, "POST", "/sql", body)
+    assert (status, content["rows"]) == (200, [["Jean"]])
+
+    for operation in (
+        "ATTACH DATABASE 'copy.db' AS copy;",
+        "VACUUM INTO 'copy.db';",
+        "PRAGMA query_only = OFF;",
+        "DROP TABLE clients;",
+        "CREATE TABLE stolen (value);",
+        "DELETE FROM clients;",
+        "INSERT INTO food (food_name) VALUES ('Lait');",
+    ):
+        (status, content) = request(connection, "POST", "/sql", {"operation": operation})
+        assert status == 400, operation
+    assert not (tmp_path / "copy.db").exists()
+
+    body = {"operation": "SELECT count(*) FROM clients;"}
+    assert request(connection, "POST", "/sql", body)[1]["rows"] == [[1]]
+
+
+def test_orders_are_paged_by_key(port):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    (client_id, food_id) = add_client_and_food(connection)
+    order = {"client_id": client_id, "food_id": food_id, "food_quantity": 1}
+    orders = [order | {"date": f"2030-01-{day:02}"} for day in range(1, 6)]
+    assert request(connection, "POST", "/profiles/Cuisine/orders", orders)[0] == 201
+
+    dates = []
+    path = "/profiles/Cuisine/orders?limit=2"
+    while True:
+        (status, content) = request(connection, "GET", path)
+        assert status == 200
+        if not content["orders"]:
+            break
+        dates += [order["date"] for order in content["orders"]]
+        (after_date, after_id) = content["after"]
+        path = f"/profiles/Cuisine/orders?limit=2&after_date={after_date}&after_id={after_id}"
+    assert dates == [f"2030-01-{day:02}" for day in range(5, 0, -1)]
+
+    assert request(connection, "GET", "/profiles/Cuisine/orders?limit=-1")[0] == 400
+    assert request(connection, "GET", "/profiles/Cuisine/orders?after_id=x")[0] == 400
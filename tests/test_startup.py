@@ -0,0 +1,20 @@
+import pytest
+
+from benchmark import first_window, measure_startup
+
+# Seconds the window may take to appear (it takes a fraction of that on a station)
+STARTUP_BUDGET = 1.0
+
+
+def test_window_appears_within_budget(tmp_path):
+    pytest.importorskip("PySide6")
+    path = tmp_path / "empty.db"
+    path.touch()
+
+    # The fastest of a few starts, so that a machine that's busy for a moment doesn't fail it
+    trace = min((measure_startup(str(path)) for _ in range(3)), key=first_window)
+    assert first_window(trace) < STARTUP_BUDGET, trace["phases"]
+    # Phases are written in the order they ended, the window being painted before the database
+    # is prepared
+    phases = list(trace["phases"])
+    assert phases.index("first paint") < phases.index("database")